@@ -2,8 +2,10 @@ import streamlit as st
 from pathlib import Path
 import os
 from dotenv import load_dotenv
-from data_loader import DataLoader
-from rag_engine import RAGEngine
+from preload import BackgroundPreload
+from utils.conversation import ConversationMemory
+from utils.startup import STARTUP
+from utils.tracing import METRICS
 import config
 
 load_dotenv()
@@ -86,10 +88,17 @@ def load_custom_css():
 def initialize_session_state():
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'rag_engine' not in st.session_state:
-        st.session_state.rag_engine = None
-    if 'use_fast_model' not in st.session_state:
-        st.session_state.use_fast_model = True
+    if 'memory' not in st.session_state:
+        st.session_state.memory = ConversationMemory()
+    if 'questions_asked' not in st.session_state:
+        st.session_state.questions_asked = 0
+    if 'model' not in st.session_state:
+        st.session_state.model = config.DEFAULT_MODEL
+    if 'sources' not in st.session_state:
+        st.session_state.sources = []
+
+def built_sources():
+    return [shard['source'] for shard in config.SHARDS.values() if Path(shard['vectorstore_path']).exists()]
 
 def setup_sidebar():
     with st.sidebar:
@@ -97,18 +106,40 @@ def setup_sidebar():
         st.markdown("---")
         
         st.subheader("🎯 Model Selection")
-        use_pro = st.toggle(
-            "Use Pro Mode",
-            value=not st.session_state.use_fast_model,
-            help="Toggle ON for Gemini 2.5 Pro (best quality) or OFF for Flash (faster)"
+        model_labels = {
+            config.LLM_MODEL_AUTO: "🧠 Auto",
+            config.LLM_MODEL: "🚀 Pro",
+            config.LLM_MODEL_FAST: "⚡ Flash"
+        }
+        st.session_state.model = st.radio(
+            "Model",
+            list(model_labels),
+            index=list(model_labels).index(st.session_state.model),
+            format_func=model_labels.get,
+            horizontal=True,
+            label_visibility="collapsed",
+            help="Auto answers simple questions with Flash and harder ones with Pro"
         )
-        st.session_state.use_fast_model = not use_pro
         
-        if use_pro:
+        if st.session_state.model == config.LLM_MODEL_AUTO:
+            st.success("🧠 Auto - Flash for simple questions, Pro when it matters")
+        elif st.session_state.model == config.LLM_MODEL:
             st.success("🚀 Gemini 2.5 Pro - Best Quality")
         else:
             st.info("⚡ Gemini 2.5 Flash - Fast Responses")
         
+        sources = built_sources()
+        if len(sources) > 1:
+            st.markdown("---")
+            st.subheader("📚 Sources")
+            # Nothing selected searches every source.
+            st.session_state.sources = st.multiselect(
+                "Search only",
+                sources,
+                default=[source for source in st.session_state.sources if source in sources],
+                placeholder="All sources"
+            )
+        
         st.markdown("---")
         st.subheader("💡 Try These Questions")
         st.markdown("*Click any question to ask it*")
@@ -120,12 +151,34 @@ def setup_sidebar():
         
         if st.session_state.messages:
             st.subheader("📊 Session Stats")
-            st.metric("Questions Asked", len([m for m in st.session_state.messages if m['role'] == 'user']))
+            st.metric("Questions Asked", st.session_state.questions_asked)
             st.metric("Knowledge Base", "100+ Essays")
         
+        latency = METRICS.summary()
+        if latency:
+            st.subheader("⏱️ Latency (recent queries)")
+            st.dataframe(
+                [{'stage': stage, 'p50 ms': stats['p50_ms'], 'p95 ms': stats['p95_ms'], 'n': stats['count']}
+                 for stage, stats in latency.items()],
+                hide_index=True,
+                use_container_width=True
+            )
+        
+        startup = STARTUP.summary()
+        if startup:
+            st.subheader("🧊 Startup (this process)")
+            st.dataframe(
+                [{'stage': stage['stage'], 'ms': stage['ms'], 'modules': stage['modules'], 'packages': stage['top_packages']}
+                 for stage in startup],
+                hide_index=True,
+                use_container_width=True
+            )
+        
         st.markdown("---")
         if st.button("🗑️ Clear Chat", use_container_width=True):
             st.session_state.messages = []
+            st.session_state.memory.clear()
+            st.session_state.questions_asked = 0
             st.rerun()
         
         st.markdown("---")
@@ -137,42 +190,53 @@ def setup_sidebar():
         - Product-Market Fit Insights
         """)
 
-def load_rag_engine():
+@st.cache_resource
+def get_preload(api_key):
+    # Once per process: imports, index, model clients and a warm-up query
+    # load in the background while the first page renders.
+    return BackgroundPreload(api_key, warm_up_in_background=True)
+
+def get_api_key():
     try:
-        api_key = st.secrets["GOOGLE_API_KEY"]
+        return st.secrets["GOOGLE_API_KEY"]
     except:
-        api_key = os.getenv('GOOGLE_API_KEY')
-    
+        return os.getenv('GOOGLE_API_KEY')
+
+def load_rag_engine():
+    api_key = get_api_key()
     if not api_key:
         st.error("⚠️ GOOGLE_API_KEY not found. Please configure it in Streamlit Cloud secrets.")
         st.info("Local development: Add GOOGLE_API_KEY to your .env file")
         return None
     
-    if st.session_state.rag_engine is None or st.session_state.get('last_model') != st.session_state.use_fast_model:
-        vectorstore_path = 'data/processed/vectorstore'
-        
-        if not Path(vectorstore_path).exists():
-            st.error("⚠️ Knowledge base not found. Run: `python data_loader.py`")
-            return None
-        
-        with st.spinner("🔄 Loading..."):
-            try:
-                loader = DataLoader(api_key)
-                vectorstore = loader.load_vectorstore(vectorstore_path)
-                st.session_state.rag_engine = RAGEngine(
-                    vectorstore, 
-                    api_key, 
-                    use_fast_model=st.session_state.use_fast_model
-                )
-                st.session_state.last_model = st.session_state.use_fast_model
-                return st.session_state.rag_engine
-            except Exception as e:
-                st.error(f"❌ Error: {e}")
-                return None
+    if not built_sources():
+        st.error("⚠️ Knowledge base not found. Run: `python data_loader.py`")
+        return None
     
-    return st.session_state.rag_engine
+    model = st.session_state.model
+    preload = get_preload(api_key)
+    
+    try:
+        if preload.is_loaded(model):
+            return preload.resources.get_engine(model)
+        with st.spinner("🔄 Loading..."):
+            return preload.get_resources().get_engine(model)
+    except Exception as e:
+        st.error(f"❌ Error: {e}")
+        return None
+
+def add_message(message):
+    # Only the last SESSION_MAX_MESSAGES stay on screen; what the assistant
+    # remembers of older turns lives in the bounded ConversationMemory.
+    messages = st.session_state.messages
+    messages.append(message)
+    del messages[:-config.SESSION_MAX_MESSAGES]
 
 def main():
+    # Start loading before anything is drawn.
+    api_key = get_api_key()
+    if api_key and built_sources():
+        get_preload(api_key)
     load_custom_css()
     initialize_session_state()
     
@@ -199,7 +263,8 @@ def main():
     prompt = st.session_state.pop('example_query', None) or st.chat_input("💬 Ask anything about startups...")
     
     if prompt:
-        st.session_state.messages.append({'role': 'user', 'content': prompt})
+        add_message({'role': 'user', 'content': prompt})
+        st.session_state.questions_asked += 1
         
         with st.chat_message("user"):
             st.markdown(prompt)
@@ -209,37 +274,46 @@ def main():
             thinking_placeholder.markdown("🤔 **Thinking...**")
             
             try:
-                result = rag_engine.query(prompt)
-                thinking_placeholder.empty()
-                
-                # Stream the answer word by word
                 answer_placeholder = st.empty()
+                sources_container = st.container()
+                result = {}
                 full_answer = ""
-                words = result['answer'].split()
                 
-                for i, word in enumerate(words):
-                    full_answer += word + " "
-                    answer_placeholder.markdown(full_answer + "▌")
-                    if i % 3 == 0:  # Update every 3 words for smooth effect
-                        import time
-                        time.sleep(0.05)
+                for frame in rag_engine.stream_query(prompt, st.session_state.memory, st.session_state.sources):
+                    if frame['type'] == 'token':
+                        full_answer += frame['content']
+                        answer_placeholder.markdown(full_answer + "▌")
+                        continue
+                    if frame['type'] == 'upgrade':
+                        # The Pro answer arrived in time and replaces Flash's.
+                        answer_placeholder.markdown(frame['answer'])
+                    
+                    result.update(frame)
+                    if frame['type'] != 'meta':
+                        continue
+                    
+                    # Sources arrive before the first token, so show them
+                    # below the answer while it is still being written.
+                    thinking_placeholder.empty()
+                    with sources_container:
+                        if result.get('sources'):
+                            st.markdown("**📚 Sources:**")
+                            for src in result['sources']:
+                                st.markdown(f"""<div class='source-box'><strong>{src['title']}</strong><br>
+                                <a href="{src['url']}" target="_blank">📖 Read essay →</a></div>""", unsafe_allow_html=True)
+                        
+                        if result.get('confidence'):
+                            confidence_color = "🟢" if result['confidence'] > 85 else "🟡" if result['confidence'] > 70 else "🟠"
+                            st.markdown(f"<div class='confidence-badge'>{confidence_color} Confidence: {result['confidence']:.1f}%</div>", unsafe_allow_html=True)
                 
                 answer_placeholder.markdown(result['answer'])
+                if st.session_state.model == config.LLM_MODEL_AUTO and result.get('model'):
+                    st.caption(f"Answered by {result['model']}")
                 
-                if result.get('sources'):
-                    st.markdown("**📚 Sources:**")
-                    for src in result['sources']:
-                        st.markdown(f"""<div class='source-box'><strong>{src['title']}</strong><br>
-                        <a href="{src['url']}" target="_blank">📖 Read essay →</a></div>""", unsafe_allow_html=True)
-                
-                if result.get('confidence'):
-                    confidence_color = "🟢" if result['confidence'] > 85 else "🟡" if result['confidence'] > 70 else "🟠"
-                    st.markdown(f"<div class='confidence-badge'>{confidence_color} Confidence: {result['confidence']:.1f}%</div>", unsafe_allow_html=True)
-                
-                st.session_state.messages.append({
+                add_message({
                     'role': 'assistant',
                     'content': result['answer'],
-                    'sources': result.get('sources'),
+                    'sources': [{'title': src['title'], 'url': src['url']} for src in result.get('sources') or []],
                     'confidence': result.get('confidence')
                 })
             except Exception as e:
@@ -0,0 +1,195 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from benchmarks.stubs import HashEmbeddings, StubChatModel
+from data_loader import DataLoader
+from rag_engine import RAGEngine
+from utils.tracing import Trace
+import config
+
+TOPIC_WORDS = [
+    'startup', 'founder', 'users', 'growth', 'investors', 'funding', 'product', 'market', 'fit',
+    'ramen', 'profitable', 'default', 'alive', 'cofounder', 'hiring', 'equity', 'launch', 'ideas',
+    'schlep', 'wealth', 'determination', 'relentlessly', 'resourceful', 'seed', 'round', 'scale',
+]
+
+QUESTION_TEMPLATES = [
+    "How do I {} my {}?",
+    "What should a founder know about {} and {}?",
+    "When is the right time for {} {}?",
+    "Why do most startups fail at {} {}?",
+]
+
+def synthetic_corpus(num_essays, words_per_essay, seed=0):
+    rng = random.Random(seed)
+    filler = [f"w{i}" for i in range(5000)]
+    for i in range(num_essays):
+        words = [rng.choice(TOPIC_WORDS) if rng.random() < 0.2 else rng.choice(filler) for _ in range(words_per_essay)]
+        sentences = [' '.join(words[j:j + 15]).capitalize() + '.' for j in range(0, len(words), 15)]
+        yield {
+            'title': f"Synthetic Essay {i}",
+            'url': f"https://example.com/essay-{i}.html",
+            'source': 'Benchmark Corpus',
+            'content': '\n\n'.join(' '.join(sentences[j:j + 6]) for j in range(0, len(sentences), 6))
+        }
+
+def synthetic_questions(num_questions, seed=1):
+    rng = random.Random(seed)
+    return [rng.choice(QUESTION_TEMPLATES).format(rng.choice(TOPIC_WORDS), rng.choice(TOPIC_WORDS))
+            for _ in range(num_questions)]
+
+def percentiles(values):
+    return {
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'mean_ms': round(float(np.mean(values)), 3)
+    }
+
+def max_rss_mb():
+    # Peak of the whole process; bench_size gives every corpus size a process
+    # of its own so the figure is that size's, not the largest run so far.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def bench_corpus(num_essays, args, workdir):
+    embeddings = HashEmbeddings(dim=args.dim, latency_ms=args.embed_latency_ms)
+    loader = DataLoader(None, embeddings=embeddings, embedding_cache_dir=str(workdir / f"cache-{num_essays}"))
+    essays = synthetic_corpus(num_essays, args.words_per_essay)
+
+    start = time.perf_counter()
+    vectorstore, manifest = loader.ingest(essays)
+    ingest_seconds = time.perf_counter() - start
+    num_chunks = vectorstore.index.ntotal
+
+    start = time.perf_counter()
+    loader.optimize_index(vectorstore)
+    loader.save_vectorstore(vectorstore, str(workdir / f"index-{num_essays}"), manifest)
+    index_build_seconds = time.perf_counter() - start
+
+    # Searches run against the index as it is served: memory-mapped from
+    # disk, not the in-memory copy built during ingest.
+    start = time.perf_counter()
+    vectorstore = loader.load_vectorstore(str(workdir / f"index-{num_essays}"))
+    load_ms = (time.perf_counter() - start) * 1000
+
+    questions = synthetic_questions(args.queries)
+    engine = RAGEngine(vectorstore, None, llm=StubChatModel())
+
+    query_vectors = [embeddings.embed_query(question) for question in questions]
+    search_latencies = []
+    for vector in query_vectors:
+        trace = Trace(engine.model_name)
+        engine.search(vector, trace)
+        search_latencies.append(trace.timings['search_ms'])
+
+    overheads = []
+    for question in questions:
+        timings = engine.query(question)['timings']
+        overheads.append(timings['total_ms'] - timings['llm_total_ms'])
+
+    # A fresh engine (and query-embedding cache) with a model that takes
+    # time to answer, measured from the caller's side of stream_query().
+    engine = RAGEngine(vectorstore, None, llm=StubChatModel(
+        first_token_latency_ms=args.llm_first_token_ms,
+        token_latency_ms=args.llm_token_ms
+    ))
+    first_tokens = []
+    for question in questions[:args.llm_queries]:
+        start = time.perf_counter()
+        for frame in engine.stream_query(question):
+            if frame['type'] == 'token':
+                first_tokens.append((time.perf_counter() - start) * 1000)
+                break
+
+    return {
+        'essays': num_essays,
+        'chunks': num_chunks,
+        'ingest_s': round(ingest_seconds, 3),
+        'ingest_chunks_per_s': round(num_chunks / ingest_seconds, 1),
+        'index_build_s': round(index_build_seconds, 3),
+        'load_ms': round(load_ms, 2),
+        'search': percentiles(search_latencies),
+        'query_overhead': percentiles(overheads),
+        'time_to_first_token': percentiles(first_tokens),
+        'max_rss_mb': max_rss_mb()
+    }
+
+def bench_size(num_essays, args, workdir):
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(bench_corpus, num_essays, args, workdir).result()
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {row['essays']: row for row in json.load(f)['results']}
+
+    print(f"\nChange vs {baseline_path} (positive = slower / bigger):")
+    for row in results:
+        before = baseline.get(row['essays'])
+        if before is None:
+            continue
+        deltas = {
+            'ingest_s': (row['ingest_s'], before['ingest_s']),
+            'search p99': (row['search']['p99_ms'], before['search']['p99_ms']),
+            'overhead p50': (row['query_overhead']['p50_ms'], before['query_overhead']['p50_ms']),
+            'max_rss_mb': (row['max_rss_mb'], before['max_rss_mb']),
+        }
+        changes = ', '.join(
+            f"{name} {((now - then) / then * 100 if then else 0):+.0f}%" for name, (now, then) in deltas.items()
+        )
+        print(f"  {row['essays']} essays: {changes}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingest, search and query benchmarks with stub Gemini backends")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[25, 100, 400], help="corpus sizes in essays")
+    parser.add_argument('--words-per-essay', type=int, default=2000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--embed-latency-ms', type=float, default=0.0)
+    parser.add_argument('--llm-first-token-ms', type=float, default=300.0)
+    parser.add_argument('--llm-token-ms', type=float, default=5.0)
+    parser.add_argument('--llm-queries', type=int, default=10)
+    parser.add_argument('--output', help="defaults to benchmarks/results/bench-<timestamp>.json")
+    parser.add_argument('--compare', help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for num_essays in sorted(args.sizes):
+            print(f"Benchmarking {num_essays} essays...")
+            row = bench_size(num_essays, args, Path(workdir))
+            results.append(row)
+            print(f"  {row['chunks']} chunks, {row['ingest_chunks_per_s']} chunks/s, "
+                  f"search p50 {row['search']['p50_ms']}ms p99 {row['search']['p99_ms']}ms, "
+                  f"overhead p50 {row['query_overhead']['p50_ms']}ms, rss {row['max_rss_mb']}MB")
+
+    output = Path(args.output or f"benchmarks/results/bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'faiss_index_type': config.FAISS_INDEX_TYPE,
+                'top_k': config.TOP_K_RESULTS,
+                'args': vars(args)
+            },
+            'results': results
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import asyncio
+import hashlib
+import re
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Offline stand-ins for GoogleGenerativeAIEmbeddings and
+# ChatGoogleGenerativeAI, so the pipeline can be measured without an API key
+# and without network noise in the numbers.
+
+class HashEmbeddings(Embeddings):
+    # Feature-hashed bag of words: deterministic, and texts sharing words get
+    # similar vectors, so retrieval results are meaningful enough to
+    # exercise ranking code paths.
+    def __init__(self, dim=768, latency_ms=0.0):
+        self.dim = dim
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text, **kwargs):
+        return self.embed_documents([text])[0]
+
+class StubChatModel(BaseChatModel):
+    response: str = "Talk to your users, launch early and iterate on what they tell you."
+    first_token_latency_ms: float = 0.0
+    token_latency_ms: float = 0.0
+    words_per_chunk: int = 3
+
+    @property
+    def _llm_type(self):
+        return 'stub'
+
+    def _chunks(self):
+        words = self.response.split(' ')
+        for i in range(0, len(words), self.words_per_chunk):
+            text = ' '.join(words[i:i + self.words_per_chunk])
+            yield text if i == 0 else ' ' + text
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep((self.first_token_latency_ms + self.token_latency_ms * len(list(self._chunks()))) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_latency_ms / 1000)
+        for i, text in enumerate(self._chunks()):
+            if i:
+                time.sleep(self.token_latency_ms / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token_latency_ms / 1000)
+        for i, text in enumerate(self._chunks()):
+            if i:
+                await asyncio.sleep(self.token_latency_ms / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
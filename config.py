@@ -1,16 +1,167 @@
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 TOP_K_RESULTS = 4
-SIMILARITY_THRESHOLD = 0.7
+SIMILARITY_THRESHOLD = 0.7  # cosine similarity below which chunks are left out of the prompt
 EMBEDDING_MODEL = "models/text-embedding-004"
 
+ESSAYS_PATH = "data/raw/essays.jsonl"
+LEGACY_ESSAYS_PATH = "data/raw/essays.json"
+VECTORSTORE_PATH = "data/processed/vectorstore"
+
+# One shard per corpus, each built and refreshed on its own (see
+# `python data_loader.py --shard NAME`). Chunks carry the shard's source;
+# shards whose index has not been built yet are skipped at load time.
+SHARDS = {
+    "pg": {
+        "source": "Paul Graham Essays",
+        "essays_path": ESSAYS_PATH,
+        "vectorstore_path": VECTORSTORE_PATH,
+    },
+    "startup_school": {
+        "source": "YC Startup School",
+        "essays_path": "data/raw/startup_school.jsonl",
+        "vectorstore_path": "data/processed/shards/startup_school",
+    },
+    "yc_blog": {
+        "source": "YC Blog",
+        "essays_path": "data/raw/yc_blog.jsonl",
+        "vectorstore_path": "data/processed/shards/yc_blog",
+    },
+    "internal": {
+        "source": "Internal Notes",
+        "essays_path": "data/raw/internal.jsonl",
+        "vectorstore_path": "data/processed/shards/internal",
+    },
+}
+SHARD_TOP_K = None  # candidates per shard before merging, None uses the engine's k
+SEARCH_WORKERS = 4  # shards searched at once
+
+EMBEDDING_CACHE_DIR = "data/processed/embedding_cache"
+EMBEDDING_BATCH_SIZE = 100  # texts per embedding request
+INGEST_BATCH_SIZE = 256  # chunks per embedding job / index add
+EMBEDDING_WORKERS = 4  # embedding jobs in flight at once
+EMBEDDING_REQUESTS_PER_MINUTE = 1500
+EMBEDDING_RETRIES = 5
+EMBEDDING_RETRY_DELAY = 2.0  # seconds, doubled on each retry
+SPLIT_WORKERS = 4  # processes splitting essays into chunks, 1 splits in-process
+SPLIT_WINDOW = 64  # essays handed to the splitting pool at a time
+
+# Near-duplicate chunks are dropped before embedding: MinHash over word
+# shingles, DEDUP_BANDS LSH bands of DEDUP_NUM_PERM / DEDUP_BANDS rows.
+DEDUP_CHUNKS = True
+DEDUP_THRESHOLD = 0.85  # estimated Jaccard similarity of shingle sets
+DEDUP_NUM_PERM = 64
+DEDUP_BANDS = 16
+DEDUP_SHINGLE_SIZE = 5  # words
+
+# FAISS index layout: "flat" (exact), "ivf_flat", "hnsw" or "ivf_pq".
+# Use `python -m utils.index_tuner` to compare recall and latency.
+FAISS_INDEX_TYPE = "flat"
+FAISS_NLIST = 256  # IVF cells
+FAISS_NPROBE = 16  # IVF cells visited per query
+FAISS_HNSW_M = 32  # HNSW graph degree
+FAISS_EF_SEARCH = 64  # HNSW candidate list size per query
+FAISS_PQ_M = 16  # PQ sub-quantizers, must divide the embedding dimension
+FAISS_PQ_BITS = 8
+FAISS_TRAIN_SIZE = 50000  # vectors sampled to train IVF/PQ
+
+# Hybrid retrieval: BM25 over chunk text fused with the dense results via
+# reciprocal-rank fusion.
+BM25_K1 = 1.5
+BM25_B = 0.75
+LEXICAL_TOP_K = 10  # BM25 candidates fed into fusion
+HYBRID_CANDIDATES = 10  # dense candidates fed into fusion and context selection
+RRF_K = 60
+LEXICAL_MIN_COVERAGE = 0.5  # share of query terms a keyword-only chunk must contain
+LEXICAL_SKIP_RATIO = 2.0  # top/second BM25 score at which the query embedding is skipped
+
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+QUERY_BATCH_WINDOW_MS = 5  # how long to wait for concurrent questions to batch
+QUERY_BATCH_MAX_SIZE = 32
+
 LLM_MODEL = "gemini-2.5-pro"
 LLM_MODEL_FAST = "gemini-2.5-flash-lite"
+LLM_MODEL_AUTO = "auto"  # route each question to LLM_MODEL or LLM_MODEL_FAST
+DEFAULT_MODEL = LLM_MODEL_AUTO
+
+# Routing: short questions whose best chunk is a close, clear match go to the
+# fast model; the rest go to the strong model. With ROUTER_SPECULATIVE the
+# fast model answers right away and the strong model's answer replaces it if
+# it is ready within ROUTER_UPGRADE_DEADLINE_MS of the question arriving.
+ROUTER_CONFIDENT_SCORE = 0.8  # cosine similarity of the best chunk
+ROUTER_MIN_SPREAD = 0.05  # best chunk's lead over the mean of the rest
+ROUTER_LONG_QUESTION_WORDS = 25
+ROUTER_SPECULATIVE = True
+ROUTER_UPGRADE_DEADLINE_MS = 8000
+ROUTER_UPGRADE_WORKERS = 8  # strong-model answers running alongside in the sync API
 
 TEMPERATURE = 0.7
 
+# Prompt context: chunks are picked by maximal marginal relevance (1.0 = pure
+# relevance, lower favours diversity) until TOP_K_RESULTS chunks or the
+# model's token budget is reached.
+MMR_LAMBDA = 0.7
+CONTEXT_TOKEN_BUDGET = {
+    LLM_MODEL: 2000,
+    LLM_MODEL_FAST: 1000,
+}
+CONTEXT_TOKEN_BUDGET_DEFAULT = 1000
+
+# Related questions: generated offline per essay with the fast model and
+# looked up by nearest neighbour around the retrieved essays.
+ESSAY_QUESTIONS_PATH = "data/processed/essay_questions.jsonl"
+QUESTIONS_PER_ESSAY = 5
+QUESTION_GENERATION_WORKERS = 4
+QUESTION_GENERATION_WINDOW = 16  # essays submitted for question generation at a time
+QUESTION_PROMPT_CHARS = 6000  # essay text shown to the model per essay
+RELATED_QUESTIONS = 3
+RELATED_QUESTION_MAX_SIMILARITY = 0.9  # closer than this to the asked question counts as a paraphrase
+
+# Conversation memory per chat session: the last MEMORY_MAX_TURNS turns with
+# clipped answers plus one summary line per older turn, capped in tokens and
+# bytes. Follow-ups are rewritten into standalone retrieval queries.
+MEMORY_MAX_TURNS = 3
+MEMORY_TOKEN_BUDGET = 600  # conversation block added to follow-up prompts
+MEMORY_MAX_BYTES = 8192
+MEMORY_ANSWER_CHARS = 600
+MEMORY_SUMMARY_CHARS = 800
+MEMORY_STANDALONE_TERMS = 3  # content words that make a question stand on its own
+SESSION_MAX_MESSAGES = 40  # chat messages kept on screen
+
+ANSWER_CACHE_SIZE = 1000
+ANSWER_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+ANSWER_CACHE_SIMILARITY = 0.95  # cosine similarity for near-duplicate questions
+ANSWER_CACHE_PATH = "data/processed/answer_cache.json"  # None keeps it in memory only
+
+# Precomputed answers for EXAMPLE_QUERIES plus the top questions from logs
+# (one per line), regenerated for every new index version.
+WARM_ANSWERS_PATH = "data/processed/warm_answers.json"
+TOP_QUESTIONS_PATH = "data/processed/top_questions.txt"
+WARMUP_MAX_QUESTIONS = 50
+WARMUP_MODELS = [LLM_MODEL, LLM_MODEL_FAST]
+WARMUP_RETRY_SECONDS = 600  # after a failed background warm-up
+
+# Preloading (`python preload.py`, server start-up, each new app process):
+# index, one engine per model and a warm-up query before the first user.
+PRELOAD_MODELS = [DEFAULT_MODEL]
+PRELOAD_QUESTION = "How do I find product-market fit?"
+
+TRACE_LOG_PATH = None  # e.g. "data/processed/traces.jsonl" to write one JSON line per question
+
+SERVER_PORT = 8000
+SERVER_MAX_CONCURRENCY = 32  # questions in retrieval + generation at once
+SERVER_MAX_QUEUE = 256  # waiting questions before new ones get a 503
+SERVER_MAX_QUESTION_CHARS = 2000
+
 PG_ESSAYS_URL = "http://www.paulgraham.com/articles.html"
 
+CRAWL_STATE_PATH = "data/raw/crawl_state.jsonl"
+CRAWL_MAX_AGE = 24 * 60 * 60  # seconds before a stored page is revalidated
+SCRAPER_WORKERS = 8
+SCRAPER_RATE_PER_SECOND = 4
+SCRAPER_RETRIES = 3
+EXTRACT_WORKERS = 4  # processes parsing fetched HTML, 1 parses in the crawler threads
+
 SYSTEM_PROMPT = """You are an expert startup advisor trained on Y Combinator's knowledge base, including Paul Graham's essays and YC Startup School content.
 
 Your role:
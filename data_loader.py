@@ -1,80 +1,578 @@
+import hashlib
 import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
+from utils.bm25 import BM25Index
+from utils.dedup import NearDuplicateFilter
+from utils.chunk_store import ChunkDocstore, ChunkIds, ChunkStore, has_chunk_store, write_chunk_store
+from utils.embedding_cache import EmbeddingCache
+from utils.gemini import RetryableGeminiError, chat_model, embedding_model, retryable
+from utils.faiss_index import (
+    build_index, describe_index, index_memory_bytes, min_train_size, set_search_params, supports_remove
+)
+from utils.question_bank import (
+    QUESTION_PROMPT, QuestionBank, append_essay_questions, load_essay_questions, parse_questions
+)
+from utils.rate_limit import RateLimiter, retry_with_backoff
 import config
 
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def make_text_splitter():
+    # Only building needs the splitter; serving processes never import it.
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=config.CHUNK_SIZE,
+        chunk_overlap=config.CHUNK_OVERLAP,
+        length_function=len,
+    )
+
+def hash_essay(essay):
+    key = '\0'.join([essay['title'], essay['source'], essay['content']])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def essay_key(essay, essay_hash):
+    # Chunk ids are per URL: the same text at two URLs (mirrors, reposts)
+    # is two manifest entries, each owning its own chunks.
+    key = '\0'.join([essay['url'], essay_hash])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+def essay_document(essay):
+    return Document(
+        page_content=essay['content'],
+        metadata={
+            'title': essay['title'],
+            'url': essay['url'],
+            'source': essay['source']
+        }
+    )
+
+_text_splitter = None
+
+def split_essay(essay):
+    # Runs in the splitting worker processes, each with its own splitter.
+    global _text_splitter
+    if _text_splitter is None:
+        _text_splitter = make_text_splitter()
+    
+    essay_hash = hash_essay(essay)
+    key = essay_key(essay, essay_hash)
+    chunks = _text_splitter.split_documents([essay_document(essay)])
+    for i, chunk in enumerate(chunks):
+        chunk.id = f"{key}-{i}"
+    return essay_hash, chunks
+
 class DataLoader:
-    def __init__(self, google_api_key):
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model=config.EMBEDDING_MODEL,
-            google_api_key=google_api_key
-        )
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.CHUNK_SIZE,
-            chunk_overlap=config.CHUNK_OVERLAP,
-            length_function=len,
-        )
+    def __init__(self, google_api_key, embeddings=None, embedding_cache_dir=config.EMBEDDING_CACHE_DIR,
+                 llm=None, questions_path=config.ESSAY_QUESTIONS_PATH):
+        self.google_api_key = google_api_key
+        self.embeddings = embeddings or embedding_model(google_api_key)
+        self._text_splitter = None
+        self.embedding_cache = EmbeddingCache(embedding_cache_dir, config.EMBEDDING_MODEL)
+        self.rate_limiter = RateLimiter(config.EMBEDDING_REQUESTS_PER_MINUTE / 60)
+        self.llm = llm
+        self.questions_path = questions_path
+        self._questions_lock = threading.Lock()
     
-    def load_essays(self, json_path='data/raw/essays.json'):
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    @property
+    def text_splitter(self):
+        if self._text_splitter is None:
+            self._text_splitter = make_text_splitter()
+        return self._text_splitter
     
-    def create_documents(self, essays_data):
-        documents = []
+    def resolve_essays_path(self, json_path):
+        # Corpora scraped before the JSONL format are still a single
+        # essays.json array.
+        if json_path == config.ESSAYS_PATH and not Path(json_path).exists() and Path(config.LEGACY_ESSAYS_PATH).exists():
+            return config.LEGACY_ESSAYS_PATH
+        return json_path
+    
+    def iter_essays(self, json_path=config.ESSAYS_PATH, source=None):
+        # `source` fills in the metadata source of a shard's documents that
+        # do not set their own.
+        for essay in self._iter_essays(json_path):
+            if source is not None:
+                essay.setdefault('source', source)
+            yield essay
+    
+    def _iter_essays(self, json_path):
+        json_path = self.resolve_essays_path(json_path)
         
+        with open(json_path, 'r', encoding='utf-8') as f:
+            if not str(json_path).endswith('.jsonl'):
+                yield from json.load(f)
+                return
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    
+    def load_essays(self, json_path=config.ESSAYS_PATH):
+        return list(self.iter_essays(json_path))
+    
+    def iter_documents(self, essays_data):
         for essay in essays_data:
-            doc = Document(
-                page_content=essay['content'],
-                metadata={
-                    'title': essay['title'],
-                    'url': essay['url'],
-                    'source': essay['source']
-                }
-            )
-            documents.append(doc)
-        
-        return documents
+            yield essay_document(essay)
+    
+    def create_documents(self, essays_data):
+        return list(self.iter_documents(essays_data))
     
     def chunk_documents(self, documents):
         return self.text_splitter.split_documents(documents)
     
-    def create_vectorstore(self, chunks):
-        vectorstore = FAISS.from_documents(chunks, self.embeddings)
+    def essay_hash(self, essay):
+        return hash_essay(essay)
+    
+    def iter_split_essays(self, essays_data, workers=config.SPLIT_WORKERS):
+        if workers <= 1:
+            for essay in essays_data:
+                yield essay, split_essay(essay)
+            return
+        
+        # Essays are handed to the pool a window at a time, one window ahead
+        # of the consumer, so the corpus is never all in memory at once.
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            windows = deque()
+            for window in batched(essays_data, config.SPLIT_WINDOW):
+                windows.append((window, pool.map(split_essay, window, chunksize=max(1, len(window) // workers))))
+                if len(windows) > 1:
+                    yield from zip(*windows.popleft())
+            while windows:
+                yield from zip(*windows.popleft())
+    
+    def make_dedup_filter(self, vectorstore=None, owners=None):
+        if not config.DEDUP_CHUNKS:
+            return None
+        dedup = NearDuplicateFilter(
+            threshold=config.DEDUP_THRESHOLD,
+            num_perm=config.DEDUP_NUM_PERM,
+            bands=config.DEDUP_BANDS,
+            shingle_size=config.DEDUP_SHINGLE_SIZE
+        )
+        # On updates, new chunks are also checked against what is indexed;
+        # `owners` maps those chunk ids to the URL of the essay holding them.
+        if vectorstore is not None:
+            owners = owners or {}
+            for position in range(len(vectorstore.index_to_docstore_id)):
+                chunk_id = vectorstore.index_to_docstore_id[position]
+                dedup.add(vectorstore.docstore.search(chunk_id).page_content, owners.get(chunk_id))
+        return dedup
+    
+    def iter_chunks(self, essays_data, manifest, dedup=None):
+        for essay, (essay_hash, essay_chunks) in self.iter_split_essays(essays_data):
+            # Near-duplicates (quoted passages, repeated boilerplate, pages
+            # that republish an essay) are dropped before they are embedded.
+            # The manifest lists the chunks that were indexed and the other
+            # essays whose chunks stand in for the dropped ones, so the essay
+            # is re-ingested if one of those goes away.
+            kept = []
+            depends_on = set()
+            for chunk in essay_chunks:
+                row = dedup.find(chunk.page_content, essay['url']) if dedup is not None else None
+                if row is None:
+                    kept.append(chunk)
+                elif dedup.owners[row] != essay['url']:
+                    depends_on.add(dedup.owners[row])
+            depends_on.discard(None)
+            manifest[essay['url']] = {'hash': essay_hash, 'ids': [chunk.id for chunk in kept],
+                                      'depends_on': sorted(depends_on)}
+            yield from kept
+    
+    def ingest(self, essays_data, vectorstore=None, batch_size=config.INGEST_BATCH_SIZE, owners=None):
+        manifest = {}
+        num_chunks = 0
+        max_in_flight = 2 * config.EMBEDDING_WORKERS
+        dedup = self.make_dedup_filter(vectorstore, owners)
+        
+        # Batches are embedded concurrently but added to the index in order,
+        # as soon as each one is ready. At most max_in_flight batches of
+        # chunks are alive; the rest of the corpus stays on disk until the
+        # generator reaches it.
+        with ThreadPoolExecutor(max_workers=config.EMBEDDING_WORKERS) as pool:
+            in_flight = deque()
+            chunk_batches = batched(self.iter_chunks(essays_data, manifest, dedup), batch_size)
+            while True:
+                for batch in chunk_batches:
+                    in_flight.append((batch, pool.submit(self.embed_chunks, batch)))
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    break
+                
+                batch, vectors = in_flight.popleft()
+                if vectorstore is None:
+                    vectorstore = self.create_vectorstore(batch, vectors.result())
+                else:
+                    self.add_chunks(vectorstore, batch, vectors.result())
+                num_chunks += len(batch)
+                print(f"Indexed {num_chunks} chunks from {len(manifest)} essays")
+        
+        if dedup is not None and dedup.dropped:
+            saved_bytes = dedup.dropped * vectorstore.index.d * 4
+            print(f"Dedup: dropped {dedup.dropped} of {dedup.seen} chunks as near-duplicates, "
+                  f"{dedup.dropped} fewer embeddings and vectors ({saved_bytes / 1e6:.1f} MB)")
+        return vectorstore, manifest
+    
+    def embed_batch(self, texts):
+        def request():
+            self.rate_limiter.wait()
+            return self.embeddings.embed_documents(texts)
+        # Quota (429), server and transport errors back off and retry; other
+        # errors fail the build at once. Vectors from batches that already
+        # succeeded are in the embedding cache, so even a build that gives up
+        # resumes from there on the next run.
+        return retry_with_backoff(
+            retryable(request),
+            retries=config.EMBEDDING_RETRIES,
+            base_delay=config.EMBEDDING_RETRY_DELAY,
+            max_delay=60.0,
+            retry_on=(RetryableGeminiError,)
+        )
+    
+    def embed_chunks(self, chunks):
+        return self.embedding_cache.embed_documents(
+            [chunk.page_content for chunk in chunks],
+            self.embed_batch,
+            batch_size=config.EMBEDDING_BATCH_SIZE
+        )
+    
+    def create_vectorstore(self, chunks, vectors=None):
+        if vectors is None:
+            vectors = self.embed_chunks(chunks)
+        vectorstore = FAISS.from_embeddings(
+            [(chunk.page_content, vector) for chunk, vector in zip(chunks, vectors)],
+            self.embeddings,
+            metadatas=[chunk.metadata for chunk in chunks],
+            ids=[chunk.id for chunk in chunks]
+        )
         return vectorstore
     
-    def save_vectorstore(self, vectorstore, path='data/processed/vectorstore'):
-        Path(path).parent.mkdir(parents=True, exist_ok=True)
-        vectorstore.save_local(path)
+    def add_chunks(self, vectorstore, chunks, vectors=None):
+        if vectors is None:
+            vectors = self.embed_chunks(chunks)
+        vectorstore.add_embeddings(
+            [(chunk.page_content, vector) for chunk, vector in zip(chunks, vectors)],
+            metadatas=[chunk.metadata for chunk in chunks],
+            ids=[chunk.id for chunk in chunks]
+        )
+    
+    def optimize_index(self, vectorstore, index_type=config.FAISS_INDEX_TYPE):
+        flat_bytes = index_memory_bytes(vectorstore.index)
+        needed = min_train_size(index_type, config.FAISS_NLIST, config.FAISS_PQ_BITS)
+        
+        # Ingestion always fills a flat index; approximate indexes are built
+        # from it in one pass once every vector is known.
+        if index_type == describe_index(vectorstore.index):
+            pass
+        elif vectorstore.index.ntotal < needed:
+            print(f"{index_type} needs {needed} vectors to train, have {vectorstore.index.ntotal}; keeping a flat index")
+        else:
+            start = time.perf_counter()
+            vectorstore.index = build_index(
+                vectorstore.index,
+                index_type,
+                nlist=config.FAISS_NLIST,
+                hnsw_m=config.FAISS_HNSW_M,
+                pq_m=config.FAISS_PQ_M,
+                pq_bits=config.FAISS_PQ_BITS,
+                nprobe=config.FAISS_NPROBE,
+                ef_search=config.FAISS_EF_SEARCH,
+                train_size=config.FAISS_TRAIN_SIZE
+            )
+            print(f"Built {index_type} index in {time.perf_counter() - start:.1f}s")
+        
+        index_bytes = index_memory_bytes(vectorstore.index)
+        print(f"Index memory: {index_bytes / 1e6:.1f} MB ({describe_index(vectorstore.index)}), "
+              f"flat would be {flat_bytes / 1e6:.1f} MB")
+    
+    def save_vectorstore(self, vectorstore, path=config.VECTORSTORE_PATH, manifest=None):
+        # `path` is a symlink to the current version directory. Each save
+        # writes a new version next to it and repoints the link with a
+        # single os.replace, so readers, and a build that crashes at any
+        # point, only ever see a complete index.
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        staging = target.with_name(f"{target.name}.v{time.time_ns()}")
+        staging.mkdir()
+        faiss.write_index(vectorstore.index, str(staging / 'index.faiss'))
+        write_chunk_store(staging, vectorstore.index_to_docstore_id, vectorstore.docstore)
+        self.build_lexical_index(vectorstore).save(staging)
+        if manifest is not None:
+            question_bank = self.build_question_bank(manifest)
+            if question_bank is not None:
+                question_bank.save(staging)
+            with open(staging / 'manifest.json', 'w', encoding='utf-8') as f:
+                json.dump({'essays': manifest}, f)
+        
+        previous = self.swap_vectorstore(target, staging)
+        # The version before stays for readers that are still loading it;
+        # older ones and leftovers of interrupted builds go.
+        for version in target.parent.glob(f"{target.name}.v*"):
+            if version.name not in (staging.name, previous):
+                shutil.rmtree(version, ignore_errors=True)
         print(f"Vectorstore saved to {path}")
     
-    def load_vectorstore(self, path='data/processed/vectorstore'):
-        return FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+    def swap_vectorstore(self, target, version):
+        previous = os.readlink(target) if target.is_symlink() else None
+        if target.is_dir() and not target.is_symlink():
+            # Indexes saved before versioning are a plain directory, moved
+            # aside once so the link can take its place.
+            previous = f"{target.name}.v0"
+            os.replace(target, target.with_name(previous))
+        link = target.with_name(target.name + '.link')
+        if link.is_symlink():
+            link.unlink()
+        os.symlink(version.name, link)
+        os.replace(link, target)
+        return previous
     
-    def build_knowledge_base(self, json_path='data/raw/essays.json'):
-        print("Loading essays...")
-        essays = self.load_essays(json_path)
-        print(f"Loaded {len(essays)} essays")
+    def load_vectorstore(self, path=config.VECTORSTORE_PATH, writable=False):
+        if not has_chunk_store(path):
+            raise ValueError(f"{path} uses the old pickle format, run `python data_loader.py --migrate` once to convert it")
         
-        print("Creating documents...")
-        documents = self.create_documents(essays)
+        store = ChunkStore(path)
+        index_path = str(Path(path) / 'index.faiss')
+        if writable:
+            # Incremental updates add and delete in place, so they get
+            # ordinary in-memory copies.
+            index = faiss.read_index(index_path)
+            docs = [store.document(position) for position in range(len(store))]
+            docstore = InMemoryDocstore({doc.id: doc for doc in docs})
+            index_to_docstore_id = {position: doc.id for position, doc in enumerate(docs)}
+        else:
+            # Vectors and texts stay in the files and are paged in on demand.
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+            docstore = ChunkDocstore(store)
+            index_to_docstore_id = ChunkIds(store)
         
-        print("Chunking documents...")
-        chunks = self.chunk_documents(documents)
-        print(f"Created {len(chunks)} chunks")
+        vectorstore = FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+        set_search_params(vectorstore.index, nprobe=config.FAISS_NPROBE, ef_search=config.FAISS_EF_SEARCH)
+        return vectorstore
+    
+    def migrate_vectorstore(self, path=config.VECTORSTORE_PATH):
+        # The last time the pickled docstore is ever loaded.
+        print(f"Converting {path} from the pickle format...")
+        vectorstore = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+        self.save_vectorstore(vectorstore, path, self.load_manifest(path))
+        return vectorstore
+    
+    def build_lexical_index(self, vectorstore):
+        # Indexed in FAISS position order; the title is included so questions
+        # naming an essay match its chunks.
+        items = []
+        for position in range(len(vectorstore.index_to_docstore_id)):
+            chunk_id = vectorstore.index_to_docstore_id[position]
+            doc = vectorstore.docstore.search(chunk_id)
+            items.append((chunk_id, f"{doc.metadata.get('title', '')}\n{doc.page_content}"))
+        return BM25Index.build(items, k1=config.BM25_K1, b=config.BM25_B)
+    
+    def load_lexical_index(self, path=config.VECTORSTORE_PATH):
+        # None for knowledge bases saved before the lexical index existed.
+        return BM25Index.load(path)
+    
+    def question_llm(self):
+        if self.llm is None:
+            self.llm = chat_model(config.LLM_MODEL_FAST, config.TEMPERATURE, self.google_api_key)
+        return self.llm
+    
+    def generate_essay_questions(self, essay, essay_hash):
+        prompt = QUESTION_PROMPT.format(
+            count=config.QUESTIONS_PER_ESSAY,
+            title=essay['title'],
+            content=essay['content'][:config.QUESTION_PROMPT_CHARS]
+        )
+        response = retry_with_backoff(
+            retryable(lambda: self.question_llm().invoke(prompt)),
+            retries=config.EMBEDDING_RETRIES,
+            base_delay=config.EMBEDDING_RETRY_DELAY,
+            max_delay=60.0,
+            retry_on=(RetryableGeminiError,)
+        )
+        questions = parse_questions(response.content, config.QUESTIONS_PER_ESSAY)
+        with self._questions_lock:
+            append_essay_questions(self.questions_path, essay_hash, essay['title'], questions)
+        return questions
+    
+    def generate_questions(self, essays_data):
+        # Only essays whose text has never had questions generated cost a
+        # model call; everything else comes from the questions file. Essays
+        # are streamed through a bounded window of submissions, so only
+        # their hashes and the few in flight are held in memory.
+        known = set(load_essay_questions(self.questions_path))
+        seen = set()
+        in_flight = {}
+        generated = 0
+        with ThreadPoolExecutor(max_workers=config.QUESTION_GENERATION_WORKERS) as pool:
+            for essay in essays_data:
+                essay_hash = hash_essay(essay)
+                if essay_hash in known or essay_hash in seen:
+                    continue
+                if not seen:
+                    print("Generating related questions for new essays...")
+                seen.add(essay_hash)
+                if len(in_flight) >= config.QUESTION_GENERATION_WINDOW:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    generated += self.collect_questions(done, in_flight)
+                in_flight[pool.submit(self.generate_essay_questions, essay, essay_hash)] = essay['title']
+            generated += self.collect_questions(list(in_flight), in_flight)
+        if seen:
+            print(f"Generated questions for {generated} of {len(seen)} essays")
+        return generated
+    
+    def collect_questions(self, done, in_flight):
+        generated = 0
+        for future in done:
+            title = in_flight.pop(future)
+            try:
+                future.result()
+                generated += 1
+            except Exception as e:
+                print(f"Question generation failed for {title}: {e}")
+        return generated
+    
+    def build_question_bank(self, manifest):
+        # Questions are embedded once, through the same cache as the chunks,
+        # and keyed by the essay part of the chunk ids.
+        known = load_essay_questions(self.questions_path)
+        entries = [
+            (entry['ids'][0].rsplit('-', 1)[0], known[entry['hash']])
+            for entry in manifest.values() if entry['ids'] and known.get(entry['hash'])
+        ]
+        if not entries:
+            return None
         
+        texts = [question for _, questions in entries for question in questions]
+        vectors = self.embedding_cache.embed_documents(texts, self.embed_batch, batch_size=config.EMBEDDING_BATCH_SIZE)
+        print(f"Question bank: {len(texts)} questions from {len(entries)} essays")
+        return QuestionBank.build(entries, vectors)
+    
+    def load_question_bank(self, path=config.VECTORSTORE_PATH):
+        # None for knowledge bases saved before the question bank existed.
+        return QuestionBank.load(path)
+    
+    def load_manifest(self, path=config.VECTORSTORE_PATH):
+        manifest_path = Path(path) / 'manifest.json'
+        if not manifest_path.exists():
+            return None
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)['essays']
+    
+    def build_knowledge_base(self, json_path=config.ESSAYS_PATH, path=config.VECTORSTORE_PATH, questions=True,
+                             source=None):
         print("Creating vectorstore (this may take a few minutes)...")
-        vectorstore = self.create_vectorstore(chunks)
+        vectorstore, manifest = self.ingest(self.iter_essays(json_path, source))
+        if vectorstore is None:
+            raise ValueError(f"No essays found in {json_path}")
+        stats = self.embedding_cache.stats()
+        print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
+        self.optimize_index(vectorstore)
+        if questions:
+            self.generate_questions(self.iter_essays(json_path, source))
         
         print("Saving vectorstore...")
-        self.save_vectorstore(vectorstore)
+        self.save_vectorstore(vectorstore, path, manifest)
+        
+        return vectorstore
+    
+    def dependent_essays(self, indexed, stale):
+        # Essays whose dropped near-duplicate chunks are only indexed in a
+        # stale essay, directly or through another dependent one.
+        stale = set(stale)
+        dependents = []
+        while True:
+            found = [url for url, entry in indexed.items()
+                     if url not in stale and not stale.isdisjoint(entry.get('depends_on', ()))]
+            if not found:
+                return dependents
+            stale.update(found)
+            dependents.extend(found)
+    
+    def update_knowledge_base(self, json_path=config.ESSAYS_PATH, path=config.VECTORSTORE_PATH, questions=True,
+                              source=None):
+        indexed = self.load_manifest(path)
+        if indexed is None:
+            print("No manifest found, running a full build...")
+            return self.build_knowledge_base(json_path, path, questions, source)
+        
+        print("Diffing essays against the manifest...")
+        current = {essay['url']: self.essay_hash(essay) for essay in self.iter_essays(json_path, source)}
+        
+        removed = [url for url in indexed if url not in current]
+        changed = [url for url in indexed if url in current and indexed[url]['hash'] != current[url]]
+        added = [url for url in current if url not in indexed]
+        dependents = self.dependent_essays(indexed, removed + changed)
+        changed += dependents
+        print(f"{len(added)} new, {len(changed)} changed, {len(removed)} removed essays "
+              f"({len(dependents)} re-ingested for chunks deduplicated against them)")
+        
+        if not has_chunk_store(path) and (Path(path) / 'index.pkl').exists():
+            self.migrate_vectorstore(path)
+        vectorstore = self.load_vectorstore(path, writable=True)
+        stale_ids = [chunk_id for url in removed + changed for chunk_id in indexed[url]['ids']]
+        index_type = describe_index(vectorstore.index)
+        if index_type not in ('flat', config.FAISS_INDEX_TYPE):
+            print(f"Index type changed from {index_type} to {config.FAISS_INDEX_TYPE}, running a full build...")
+            return self.build_knowledge_base(json_path, path, questions, source)
+        if stale_ids and not supports_remove(vectorstore.index):
+            # Unchanged chunks come from the embedding cache, so this only
+            # costs local index construction.
+            print(f"{index_type} indexes cannot delete vectors in place, running a full build...")
+            return self.build_knowledge_base(json_path, path, questions, source)
+        
+        generated = self.generate_questions(self.iter_essays(json_path, source)) if questions else 0
+        if not (added or changed or removed):
+            # The index itself is current, but the question bank is stale or
+            # was never built for it.
+            missing_bank = not (Path(path) / 'questions.json').exists() and load_essay_questions(self.questions_path)
+            if generated or missing_bank:
+                print("Rebuilding the question bank...")
+                self.save_vectorstore(vectorstore, path, indexed)
+            else:
+                print("Knowledge base is up to date")
+            return vectorstore
+        
+        if stale_ids:
+            vectorstore.delete(stale_ids)
+            print(f"Removed {len(stale_ids)} stale chunks")
+        for url in removed + changed:
+            del indexed[url]
+        
+        pending = set(changed + added)
+        owners = {chunk_id: url for url, entry in indexed.items() for chunk_id in entry['ids']}
+        _, manifest = self.ingest(
+            (essay for essay in self.iter_essays(json_path, source) if essay['url'] in pending),
+            vectorstore,
+            owners=owners
+        )
+        stats = self.embedding_cache.stats()
+        print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
+        indexed.update(manifest)
+        if index_type != config.FAISS_INDEX_TYPE:
+            self.optimize_index(vectorstore)
+        
+        print("Saving vectorstore...")
+        self.save_vectorstore(vectorstore, path, indexed)
         
         return vectorstore
 
 if __name__ == "__main__":
-    import os
+    import sys
     from dotenv import load_dotenv
     
     load_dotenv()
@@ -85,4 +583,22 @@ if __name__ == "__main__":
         exit(1)
     
     loader = DataLoader(api_key)
-    loader.build_knowledge_base()
\ No newline at end of file
+    questions = '--no-questions' not in sys.argv
+    # Every shard with an essays file by default, or just `--shard NAME`.
+    if '--shard' in sys.argv:
+        names = [sys.argv[sys.argv.index('--shard') + 1]]
+    else:
+        names = [name for name, shard in config.SHARDS.items() if Path(loader.resolve_essays_path(shard['essays_path'])).exists()]
+    for name in names:
+        shard = config.SHARDS[name]
+        print(f"Shard {name} ({shard['source']})")
+        if '--rebuild' in sys.argv:
+            loader.build_knowledge_base(shard['essays_path'], shard['vectorstore_path'], questions, shard['source'])
+        elif '--migrate' in sys.argv:
+            loader.migrate_vectorstore(shard['vectorstore_path'])
+        else:
+            loader.update_knowledge_base(shard['essays_path'], shard['vectorstore_path'], questions, shard['source'])
+    
+    if '--no-warmup' not in sys.argv:
+        from utils.warmup import warm_up_knowledge_base
+        warm_up_knowledge_base(api_key)
\ No newline at end of file
@@ -0,0 +1,79 @@
+import argparse
+import os
+import threading
+from utils.startup import STARTUP
+import config
+
+# Cold start, front-loaded: the heavy imports behind resources, the index,
+# one engine per model (with its model clients) and a warm-up query, before
+# the first user asks anything. The server runs it before listening, each app
+# process on a background thread, and deploy hooks as `python preload.py`.
+
+def create_resources(google_api_key, vectorstore_path=None, warm_up_in_background=False):
+    # LangChain, FAISS and their dependencies are imported here, once, as a
+    # stage of their own.
+    with STARTUP.stage('import'):
+        from resources import ResourceCache
+    return ResourceCache(google_api_key, vectorstore_path, warm_up_in_background)
+
+def preload(resources, models=None, question=config.PRELOAD_QUESTION):
+    engine = None
+    for model in models or config.PRELOAD_MODELS:
+        engine = resources.get_engine(model)
+    if engine is not None and question:
+        with STARTUP.stage('warm-up query'):
+            engine.warm_up(question)
+    return engine
+
+# Runs create_resources and preload on a daemon thread so the first page
+# renders while the engine loads; callers that need it sooner just wait.
+class BackgroundPreload:
+    def __init__(self, google_api_key, **kwargs):
+        self.resources = None
+        self.error = None
+        self.created = threading.Event()
+        self.done = threading.Event()
+        threading.Thread(target=self.run, args=(google_api_key, kwargs), daemon=True).start()
+
+    def run(self, google_api_key, kwargs):
+        try:
+            self.resources = create_resources(google_api_key, **kwargs)
+            self.created.set()
+            preload(self.resources)
+        except Exception as e:
+            print(f"Preload failed: {e}")
+            self.error = e
+        finally:
+            self.created.set()
+            self.done.set()
+
+    def is_loaded(self, model):
+        return self.resources is not None and self.resources.is_loaded(model)
+
+    def get_resources(self):
+        self.created.wait()
+        if self.resources is None:
+            raise self.error
+        return self.resources
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Load the knowledge base and models and report where start-up time goes")
+    parser.add_argument('--path', help="a single index directory, by default every shard in config.SHARDS")
+    parser.add_argument('--models', nargs='+', default=config.PRELOAD_MODELS)
+    parser.add_argument('--question', default=config.PRELOAD_QUESTION, help="warm-up query, empty to skip it")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv('GOOGLE_API_KEY')
+    if not api_key:
+        print("Please set GOOGLE_API_KEY environment variable")
+        exit(1)
+
+    preload(create_resources(api_key, args.path), args.models, args.question)
+    for stage in STARTUP.summary():
+        print(f"{stage['stage']:<28} {stage['ms']:>9.1f} ms  {stage['modules']:>5} modules  {stage['top_packages']}")
+
+if __name__ == "__main__":
+    main()
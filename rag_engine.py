@@ -1,47 +1,91 @@
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.callbacks.base import BaseCallbackHandler
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+from langchain_community.vectorstores.utils import DistanceStrategy
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from utils.context_builder import ContextBuilder, chunk_position
+from utils.gemini import chat_model, is_gemini_embeddings
+from utils.query_embedder import QueryEmbedder
+from utils.router import ModelRouter
+from utils.shards import ShardedLexicalIndex
+from utils.tracing import METRICS, Trace
+from utils.tracing_callback import TracingCallbackHandler
 import config
 
-class ReasoningCallbackHandler(BaseCallbackHandler):
-    def __init__(self):
-        self.steps = []
-    
-    def on_chain_start(self, serialized, inputs, **kwargs):
-        self.steps.append("🔍 Analyzing query...")
-    
-    def on_retriever_start(self, serialized, query, **kwargs):
-        self.steps.append("📚 Searching knowledge base...")
-    
-    def on_retriever_end(self, documents, **kwargs):
-        self.steps.append(f"✓ Found {len(documents)} relevant sources")
+def make_query_embedder(embeddings):
+    embed_kwargs = {}
+    if is_gemini_embeddings(embeddings):
+        # Batched questions go through embed_documents, which would
+        # otherwise embed them as documents rather than queries.
+        embed_kwargs['task_type'] = 'RETRIEVAL_QUERY'
+    return QueryEmbedder(
+        embeddings,
+        cache_size=config.QUERY_EMBEDDING_CACHE_SIZE,
+        batch_window_ms=config.QUERY_BATCH_WINDOW_MS,
+        max_batch_size=config.QUERY_BATCH_MAX_SIZE,
+        embed_kwargs=embed_kwargs
+    )
 
 class RAGEngine:
-    def __init__(self, vectorstore, google_api_key, use_fast_model=False):
+    def __init__(self, vectorstore, google_api_key, use_fast_model=False, model=None,
+                 answer_cache=None, index_version='', query_embedder=None, llm=None, lexical_index=None,
+                 warm_answers=None, question_bank=None, rewrite_llm=None, fast_llm=None):
         self.vectorstore = vectorstore
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model=config.EMBEDDING_MODEL,
-            google_api_key=google_api_key
+        self.question_bank = question_bank
+        self.warm_answers = warm_answers
+        self.lexical_index = lexical_index
+        self.answer_cache = answer_cache
+        self.index_version = index_version
+        # Queries are embedded with the index's own embeddings client.
+        self.query_embedder = query_embedder or make_query_embedder(vectorstore.embeddings)
+        if model is None:
+            model = config.LLM_MODEL_FAST if use_fast_model else config.LLM_MODEL
+        self.model_name = model
+        # "auto" holds a client for both models and picks one per question.
+        self.routing = model == config.LLM_MODEL_AUTO
+        self.router = ModelRouter(
+            config.LLM_MODEL,
+            config.LLM_MODEL_FAST,
+            confident_score=config.ROUTER_CONFIDENT_SCORE,
+            min_spread=config.ROUTER_MIN_SPREAD,
+            long_question_words=config.ROUTER_LONG_QUESTION_WORDS,
+            speculative=config.ROUTER_SPECULATIVE
         )
-        model = config.LLM_MODEL_FAST if use_fast_model else config.LLM_MODEL
-        self.llm = ChatGoogleGenerativeAI(
-            model=model,
-            temperature=config.TEMPERATURE,
-            google_api_key=google_api_key
-        )
-        self.retriever = vectorstore.as_retriever(
-            search_kwargs={"k": config.TOP_K_RESULTS}
+        self.context_builder = ContextBuilder(
+            vectorstore,
+            token_budget=config.CONTEXT_TOKEN_BUDGET.get(model, config.CONTEXT_TOKEN_BUDGET_DEFAULT),
+            max_chunks=config.TOP_K_RESULTS,
+            mmr_lambda=config.MMR_LAMBDA,
+            max_overlap=config.CHUNK_OVERLAP
         )
+        self.llms = {}
+        for name in self.models:
+            injected = fast_llm if name == config.LLM_MODEL_FAST and fast_llm is not None else llm
+            self.llms[name] = injected or chat_model(name, config.TEMPERATURE, google_api_key)
+        self.llm = self.llms[self.models[0]]
+        # Follow-ups the heuristics cannot resolve are rewritten by the fast
+        # model, whichever model answers.
+        if rewrite_llm is None:
+            rewrite_llm = self.llms.get(config.LLM_MODEL_FAST, llm)
+        self.rewrite_llm = rewrite_llm or chat_model(config.LLM_MODEL_FAST, 0, google_api_key)
+        self._upgrade_pool = None
         self._setup_chain()
     
+    @property
+    def models(self):
+        if self.routing:
+            return [config.LLM_MODEL, config.LLM_MODEL_FAST]
+        return [self.model_name]
+    
     def _setup_chain(self):
         prompt_template = """You are an expert startup advisor trained on Y Combinator wisdom.
 
 Context from knowledge base:
 {context}
-
+{conversation}
 Question: {question}
 
 Instructions:
@@ -52,50 +96,383 @@ Instructions:
 
 Answer:"""
 
-        prompt = ChatPromptTemplate.from_template(prompt_template)
+        self.prompt = ChatPromptTemplate.from_template(prompt_template)
         
-        def format_docs(docs):
-            return "\n\n".join(doc.page_content for doc in docs)
-        
-        self.qa_chain = (
-            {"context": self.retriever | format_docs, "question": RunnablePassthrough()}
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        # Retrieval happens once in retrieve(); the chain only sees the
+        # already formatted context so it never hits the index again.
+        self.chains = {name: self.prompt | llm | StrOutputParser() for name, llm in self.llms.items()}
+        self.qa_chain = self.chains[self.models[0]]
     
-    def get_reasoning_steps(self, query):
-        steps = [
-            "🤔 Understanding your question...",
-            "🔍 Searching YC knowledge base...",
-            "📊 Analyzing relevant essays...",
-            "💡 Synthesizing answer..."
-        ]
-        return steps
+    def rewrite_query(self, question, memory, trace):
+        # (kind, standalone query retrieval runs on); the question itself
+        # when there is no conversation or it does not depend on it.
+        if not memory:
+            return 'standalone', question
+        with trace.span('rewrite') as span:
+            kind, query = memory.classify(question)
+            if kind == 'ambiguous':
+                try:
+                    response = self.rewrite_llm.invoke(memory.rewrite_prompt(question))
+                    kind, query = 'model', memory.clean_rewrite(response.content, question)
+                except Exception as e:
+                    print(f"Query rewrite failed: {e}")
+                    kind, query = 'heuristic', memory.fallback_query(question)
+            span['kind'] = kind
+        return kind, query
     
-    def calculate_confidence(self, source_docs):
-        if not source_docs:
-            return 0.0
+    async def arewrite_query(self, question, memory, trace):
+        if not memory:
+            return 'standalone', question
+        with trace.span('rewrite') as span:
+            kind, query = memory.classify(question)
+            if kind == 'ambiguous':
+                try:
+                    response = await self.rewrite_llm.ainvoke(memory.rewrite_prompt(question))
+                    kind, query = 'model', memory.clean_rewrite(response.content, question)
+                except Exception as e:
+                    print(f"Query rewrite failed: {e}")
+                    kind, query = 'heuristic', memory.fallback_query(question)
+            span['kind'] = kind
+        return kind, query
+    
+    def remember(self, memory, question, query, answer, sources):
+        if memory is not None and answer:
+            memory.add_turn(question, answer, query, sources or ())
+    
+    def build_context(self, results, query_vector, trace, model=None):
+        token_budget = config.CONTEXT_TOKEN_BUDGET.get(model, config.CONTEXT_TOKEN_BUDGET_DEFAULT) if model else None
+        with trace.span('context') as span:
+            context = self.context_builder.build(results, query_vector, token_budget)
+            span.update(candidates=len(results), chunks=len(context['results']),
+                        tokens=context['tokens'], tokens_saved=context['tokens_saved'])
+        trace.attributes['prompt_tokens'] = context['tokens']
+        return context
+    
+    def embed_query(self, question, trace):
+        with trace.span('embed'):
+            return self.query_embedder.embed_query(question)
+    
+    async def aembed_query(self, question, trace):
+        with trace.span('embed'):
+            return await self.query_embedder.aembed_query(question)
+    
+    def similarity(self, distance):
+        if self.vectorstore.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+            return float(distance)
+        # FAISS reports squared L2 distances; for the unit-length Gemini
+        # embeddings that is 2 - 2 * cosine similarity.
+        return 1.0 - float(distance) / 2
+    
+    # Optional source filters: a sharded store only searches the shards of
+    # those sources, a single store drops the other sources' chunks.
+    def search_filter(self, sources):
+        return {'filter': {'source': list(sources)}} if sources else {}
+    
+    def search(self, query_vector, trace, sources=None):
+        with trace.span('search') as span:
+            results = self.vectorstore.similarity_search_with_score_by_vector(
+                query_vector, k=config.HYBRID_CANDIDATES, **self.search_filter(sources)
+            )
+            span['hits'] = len(results)
         
-        num_sources = len(source_docs)
-        base_confidence = min(num_sources / config.TOP_K_RESULTS, 1.0)
+        return [(doc, self.similarity(distance)) for doc, distance in results]
+    
+    async def asearch(self, query_vector, trace, sources=None):
+        with trace.span('search') as span:
+            results = await self.vectorstore.asimilarity_search_with_score_by_vector(
+                query_vector, k=config.HYBRID_CANDIDATES, **self.search_filter(sources)
+            )
+            span['hits'] = len(results)
         
-        if source_docs and hasattr(source_docs[0], 'metadata'):
-            has_metadata = any(doc.metadata.get('title') for doc in source_docs)
-            if has_metadata:
-                base_confidence = min(base_confidence * 1.1, 1.0)
+        return [(doc, self.similarity(distance)) for doc, distance in results]
+    
+    def lexical_search(self, question, trace, sources=None):
+        if self.lexical_index is None:
+            return []
+        with trace.span('lexical') as span:
+            if isinstance(self.lexical_index, ShardedLexicalIndex):
+                hits = self.lexical_index.search(question, k=config.LEXICAL_TOP_K, sources=sources)
+            else:
+                hits = self.lexical_index.search(question, k=config.LEXICAL_TOP_K)
+                if sources:
+                    docstore = self.vectorstore.docstore
+                    hits = [hit for hit in hits if docstore.search(hit['id']).metadata.get('source') in sources]
+            span['hits'] = len(hits)
+        return hits
+    
+    def is_confident_lexical_hit(self, hits):
+        # Every query term appears in the best chunk and it clearly beats the
+        # runner-up: the dense side would not change the answer much, so the
+        # remote query embedding is skipped.
+        if not hits or hits[0]['coverage'] < 1.0:
+            return False
+        return len(hits) == 1 or hits[0]['score'] >= config.LEXICAL_SKIP_RATIO * hits[1]['score']
+    
+    # Retrieval results are (doc, similarity) pairs; chunks that only came
+    # from the keyword side have no similarity and carry None.
+    def lexical_docs(self, hits):
+        docstore = self.vectorstore.docstore
+        return [(docstore.search(hit['id']), None) for hit in hits if hit['coverage'] >= config.LEXICAL_MIN_COVERAGE]
+    
+    def fuse(self, lexical_hits, dense_results):
+        # Weak matches are dropped before fusion so they never reach the
+        # prompt: dense chunks below the similarity threshold, keyword chunks
+        # matching too few of the query terms.
+        dense_results = [(doc, score) for doc, score in dense_results if score >= config.SIMILARITY_THRESHOLD]
+        lexical_hits = [hit for hit in lexical_hits if hit['coverage'] >= config.LEXICAL_MIN_COVERAGE]
         
-        unique_titles = len(set(doc.metadata.get('title', '') for doc in source_docs))
-        unique_titles = len(set(doc.metadata.get('title', '') for doc in source_docs))
-        diversity_factor = min(unique_titles / max(num_sources, 1), 1.0)
+        # Reciprocal-rank fusion: only ranks are combined, so BM25 scores and
+        # vector distances never have to be put on the same scale.
+        fused = defaultdict(float)
+        results = {}
+        for rank, (doc, score) in enumerate(dense_results):
+            fused[doc.id] += 1.0 / (config.RRF_K + rank + 1)
+            results[doc.id] = (doc, score)
+        for rank, hit in enumerate(lexical_hits):
+            fused[hit['id']] += 1.0 / (config.RRF_K + rank + 1)
         
-        final_confidence = (base_confidence * 0.7 + diversity_factor * 0.3) * 100
+        # The context builder makes the final top-k cut.
+        ranked = sorted(fused, key=fused.get, reverse=True)
+        return [results.get(doc_id) or (self.vectorstore.docstore.search(doc_id), None) for doc_id in ranked]
+    
+    def retrieve(self, question, trace, sources=None):
+        hits = self.lexical_search(question, trace, sources)
+        if self.is_confident_lexical_hit(hits):
+            return self.lexical_docs(hits)
+        return self.fuse(hits, self.search(self.embed_query(question, trace), trace, sources))
+    
+    async def aretrieve(self, question, trace, sources=None):
+        hits = self.lexical_search(question, trace, sources)
+        if self.is_confident_lexical_hit(hits):
+            return self.lexical_docs(hits)
+        return self.fuse(hits, await self.asearch(await self.aembed_query(question, trace), trace, sources))
+    
+    def warm_up(self, question):
+        # Everything a first question touches, outside the answer cache and
+        # the metrics: both retrieval paths, context selection and a one-line
+        # call to each model, so index pages are in memory and the embedding
+        # and model connections are open.
+        trace = Trace(self.model_name, question)
+        hits = self.lexical_search(question, trace)
+        query_vector = self.embed_query(question, trace)
+        results = self.fuse(hits, self.search(query_vector, trace))
+        self.build_context(results, query_vector, trace, self.models[0])
+        for llm in {id(llm): llm for llm in self.llms.values()}.values():
+            llm.invoke("Reply with OK.")
+        return trace.finish()
+    
+    def namespace(self, model):
+        return (model, self.index_version)
+    
+    @property
+    def cache_namespace(self):
+        return self.namespace(self.model_name)
+    
+    def cached_answer(self, question, query_vector=None):
+        # When routing, an answer either model already gave is served as is,
+        # the strong model's first.
+        for model in self.models:
+            cached = self.cached_answer_for(question, query_vector, model)
+            if cached is not None:
+                return {**cached, 'model': model}
+        return None
+    
+    def cached_answer_for(self, question, query_vector, model):
+        if query_vector is None and self.warm_answers is not None:
+            warm = self.warm_answers.lookup(question, self.namespace(model))
+            if warm is not None:
+                return warm
+        if self.answer_cache is None:
+            return None
+        if query_vector is None:
+            return self.answer_cache.lookup(question, self.namespace(model))
+        return self.answer_cache.lookup_similar(query_vector, self.namespace(model))
+    
+    def cached_frames(self, cached, kind, trace):
+        trace.model = cached['model']
+        trace.attributes['cached'] = kind
+        if self.routing:
+            trace.attributes['route'] = {'model': cached['model'], 'reason': 'cached'}
+        meta = {key: value for key, value in cached.items() if key != 'answer'}
+        return [
+            {'type': 'meta', **meta},
+            {'type': 'token', 'content': cached['answer']},
+            {'type': 'done', 'answer': cached['answer'], 'timings': trace.finish(), 'cached': kind,
+             'model': cached['model'], 'trace_id': trace.trace_id}
+        ]
+    
+    def cache_miss(self):
+        if self.answer_cache is not None:
+            self.answer_cache.record_miss()
+    
+    def cache_answer(self, question, query_vector, metadata, answer, model):
+        if self.answer_cache is not None and answer:
+            metadata = {**metadata, 'model': model, 'answer': answer}
+            self.answer_cache.store(question, query_vector, metadata, self.namespace(model))
+            if self.answer_cache.save_due():
+                self.answer_cache.save()
+    
+    async def acache_answer(self, question, query_vector, metadata, answer, model):
+        if self.answer_cache is not None and answer:
+            metadata = {**metadata, 'model': model, 'answer': answer}
+            self.answer_cache.store(question, query_vector, metadata, self.namespace(model))
+            if self.answer_cache.save_due():
+                # The JSON dump would block every other request on the loop.
+                await asyncio.to_thread(self.answer_cache.save)
+    
+    def chain_inputs(self, question, context, memory=None):
+        # Only follow-ups carry the conversation; standalone questions get
+        # the same prompt (and cached answers) as without a session.
+        conversation = ''
+        if memory:
+            conversation = f"\nConversation so far:\n{memory.context_text()}\n"
+        return {
+            'context': context['text'],
+            'conversation': conversation,
+            'question': question
+        }
+    
+    def chain_config(self, trace, model, stage='llm'):
+        return {'callbacks': [TracingCallbackHandler(trace, stage, model)]}
+    
+    def route(self, question, results, trace, keyword_match=False):
+        if not self.routing:
+            decision = {'model': self.model_name, 'speculative': False}
+        else:
+            decision = self.router.route(question, results, keyword_match)
+            trace.attributes['route'] = decision
+        # The model streaming the first answer; with a speculative route the
+        # strong model may still replace it.
+        decision['answer_model'] = self.router.fast_model if decision['speculative'] else decision['model']
+        trace.model = decision['answer_model']
+        return decision
+    
+    def record_route(self, trace, decision, served_model):
+        # Queries are counted under the model whose answer was served.
+        trace.model = served_model
+        if not self.routing:
+            return
+        route = trace.attributes['route']
+        route['served'] = served_model
+        if decision['speculative']:
+            route['upgraded'] = served_model == decision['model']
+        # Time to first token saved against the strong model: measured when
+        # it ran alongside, otherwise its recent median.
+        if decision['answer_model'] == self.router.fast_model and 'llm_first_token_ms' in trace.timings:
+            strong_first_token = trace.timings.get('llm_upgrade_first_token_ms')
+            if strong_first_token is None:
+                strong_first_token = METRICS.percentile('llm_first_token', 50, model=self.router.strong_model)
+            if strong_first_token is not None:
+                route['saved_ms'] = round(strong_first_token - trace.timings['llm_first_token_ms'], 1)
+    
+    def upgrade_deadline(self, trace):
+        return trace.start + config.ROUTER_UPGRADE_DEADLINE_MS / 1000
+    
+    def start_upgrade(self, decision, inputs, trace):
+        # The strong model answers on a background thread while the fast
+        # one streams; its answer replaces the fast one only if it is done
+        # by the deadline.
+        if self._upgrade_pool is None:
+            self._upgrade_pool = ThreadPoolExecutor(max_workers=config.ROUTER_UPGRADE_WORKERS)
+        cancelled = threading.Event()
+        chain = self.chains[decision['model']]
+        deadline = self.upgrade_deadline(trace)
+        def run():
+            # Queued behind other upgrades past the deadline, or the stream
+            # is already over: the answer could not be used.
+            if cancelled.is_set() or time.perf_counter() >= deadline:
+                return None
+            parts = []
+            for token in chain.stream(inputs, config=self.chain_config(trace, decision['model'], 'llm_upgrade')):
+                if cancelled.is_set():
+                    return None
+                parts.append(token)
+            return ''.join(parts)
+        return self._upgrade_pool.submit(run), cancelled
+    
+    def finish_upgrade(self, upgrade, trace):
+        future, cancelled = upgrade
+        try:
+            return future.result(timeout=max(0.0, self.upgrade_deadline(trace) - time.perf_counter()))
+        except FutureTimeoutError:
+            return None
+        except Exception as e:
+            print(f"Upgrade answer failed: {e}")
+            return None
+        finally:
+            cancelled.set()
+    
+    def astart_upgrade(self, decision, inputs, trace):
+        chain = self.chains[decision['model']]
+        return asyncio.ensure_future(chain.ainvoke(inputs, config=self.chain_config(trace, decision['model'], 'llm_upgrade')))
+    
+    async def afinish_upgrade(self, task, trace):
+        try:
+            timeout = max(0.0, self.upgrade_deadline(trace) - time.perf_counter())
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            return None
+        except Exception as e:
+            print(f"Upgrade answer failed: {e}")
+            return None
+        finally:
+            task.cancel()
+    
+    def done_frame(self, answer, trace, context, model):
+        return {
+            'type': 'done',
+            'answer': answer,
+            'timings': trace.finish(),
+            'context': {key: context[key] for key in ('tokens', 'tokens_saved')},
+            'model': model,
+            'trace_id': trace.trace_id
+        }
+    
+    def get_reasoning_steps(self, trace):
+        # What retrieval actually did for this question, from its spans.
+        steps = []
+        for span in trace.spans:
+            if span['name'] == 'rewrite' and span['kind'] != 'standalone':
+                how = "the fast model" if span['kind'] == 'model' else "the previous question"
+                steps.append(f"🔁 Follow-up: retrieved with context from {how} ({span['duration_ms']} ms)")
+            elif span['name'] == 'lexical':
+                steps.append(f"🔤 Keyword search: {span['hits']} matching chunks ({span['duration_ms']} ms)")
+            elif span['name'] == 'embed':
+                steps.append(f"🧭 Embedded the question ({span['duration_ms']} ms)")
+            elif span['name'] == 'search':
+                steps.append(f"🔍 Vector search: {span['hits']} candidates ({span['duration_ms']} ms)")
+            elif span['name'] == 'context':
+                steps.append(f"📊 Picked {span['chunks']} of {span['candidates']} passages, "
+                             f"{span['tokens']} prompt tokens ({span['tokens_saved']} saved)")
+        if 'embed_ms' not in trace.timings and 'lexical_ms' in trace.timings:
+            steps.append("⚡ Confident keyword match, skipped the query embedding")
+        route = trace.attributes.get('route')
+        if route:
+            steps.append(f"🧠 Routed to {route['model']} ({route['reason'].replace('_', ' ')})"
+                         + (", fast model answers first" if route['speculative'] else ""))
+        steps.append("💡 Synthesizing answer...")
+        return steps
+    
+    def calculate_confidence(self, results, lexical_hits=(), keyword_match=False):
+        if not results:
+            return 0.0
         
-        import random
-        variance = random.uniform(-3, 3)
-        final_confidence = max(70, min(98, final_confidence + variance))
+        scores = [score for _, score in results if score is not None]
+        if scores:
+            # Mostly the best match, pulled down when the rest of the
+            # context is much weaker than it.
+            final_confidence = (max(scores) * 0.7 + sum(scores) / len(scores) * 0.3) * 100
+        elif keyword_match:
+            # Confident keyword hit: every query term matched the top chunk,
+            # scaled by how far it leads the runner-up.
+            runner_up = lexical_hits[1]['score'] / lexical_hits[0]['score'] if len(lexical_hits) > 1 else 0.0
+            final_confidence = (0.5 + 0.4 * (1 - runner_up)) * 100
+        else:
+            # Every dense hit fell below the similarity threshold and only
+            # partial keyword matches are left: low by construction.
+            final_confidence = 40 * max((hit['coverage'] for hit in lexical_hits), default=0.0)
         
-        return round(final_confidence, 1)
+        return round(max(0.0, min(100.0, final_confidence)), 1)
     
     def format_sources(self, source_docs):
         sources = []
@@ -113,7 +490,24 @@ Answer:"""
         
         return sources
     
-    def generate_related_questions(self, original_question, source_docs):
+    def generate_related_questions(self, original_question, source_docs, query_vector=None):
+        # Nearest neighbours in the precomputed question bank, around the
+        # essays the answer draws on; no model call.
+        if self.question_bank is not None:
+            essays = [position[0] for position in map(chunk_position, source_docs) if position]
+            related = self.question_bank.related(
+                original_question,
+                essays,
+                query_vector,
+                k=config.RELATED_QUESTIONS,
+                max_similarity=config.RELATED_QUESTION_MAX_SIMILARITY
+            )
+            if related:
+                return related
+        return self.topic_related_questions(original_question)
+    
+    def topic_related_questions(self, original_question):
+        # For knowledge bases built before the question bank existed.
         question_lower = original_question.lower()
         
         # Topic-based related questions
@@ -154,50 +548,175 @@ Answer:"""
                 "What are the most common startup mistakes?"
             ]
     
-    def query(self, question):
-        reasoning_steps = self.get_reasoning_steps(question)
+    def build_metadata(self, question, results, trace, lexical_hits=(), query_vector=None, keyword_match=False):
+        source_docs = [doc for doc, _ in results]
+        with trace.span('related'):
+            related_questions = self.generate_related_questions(question, source_docs, query_vector)
+        return {
+            'sources': self.format_sources(source_docs),
+            'confidence': self.calculate_confidence(results, lexical_hits, keyword_match),
+            'reasoning_steps': self.get_reasoning_steps(trace),
+            'related_questions': related_questions
+        }
+    
+    def query(self, question, memory=None, sources=None, record=True):
+        result = {}
+        for frame in self.stream_query(question, memory, sources, record):
+            if frame['type'] != 'token':
+                result.update(frame)
+        result.pop('type', None)
+        return result
+    
+    async def aquery(self, question, memory=None, sources=None):
+        result = {}
+        async for frame in self.astream_query(question, memory, sources):
+            if frame['type'] != 'token':
+                result.update(frame)
+        result.pop('type', None)
+        return result
+    
+    # Frames: one 'meta' frame (sources, confidence, ...) as soon as retrieval
+    # is done, then a 'token' frame per model chunk, then a final 'done' frame
+    # carrying the full answer, the stage timings and the trace id. When a
+    # speculative route's strong model finishes in time, an 'upgrade' frame
+    # with its full answer comes before 'done' and replaces the streamed one.
+    #
+    # With a ConversationMemory, follow-up questions are rewritten into a
+    # standalone query for retrieval, answered with the conversation in the
+    # prompt (and so never served from or stored in the answer cache), and
+    # every answered turn is added to the memory.
+    #
+    # `sources` restricts retrieval to those corpora (metadata source
+    # values); filtered answers are not cached either. Synthetic questions
+    # (warm-up) pass record=False to stay out of METRICS, the trace log and
+    # the answer cache and its hit rate.
+    def stream_query(self, question, memory=None, sources=None, record=True):
+        trace = Trace(self.model_name, question)
+        if not record:
+            yield from self._stream_query(question, trace, memory, sources, use_cache=False)
+            return
+        with trace.recording():
+            yield from self._stream_query(question, trace, memory, sources)
+    
+    async def astream_query(self, question, memory=None, sources=None):
+        trace = Trace(self.model_name, question)
+        with trace.recording():
+            async for frame in self._astream_query(question, trace, memory, sources):
+                yield frame
+    
+    def _stream_query(self, question, trace, memory, sources, use_cache=True):
+        kind, query = self.rewrite_query(question, memory, trace)
+        follow_up = kind != 'standalone'
+        use_cache = use_cache and not follow_up and not sources
         
-        # Get source documents first
-        source_docs = self.retriever.invoke(question)
+        # Exact hits skip everything; near-duplicates still pay for the
+        # query embedding but not for search or the model.
+        cached = self.cached_answer(question) if use_cache else None
+        if cached is not None:
+            yield from self.cached_frames(cached, 'exact', trace)
+            self.remember(memory, question, query, cached['answer'], cached.get('sources'))
+            return
         
-        # Run the chain
-        answer = self.qa_chain.invoke(question)
+        query_vector = None
+        lexical_hits = self.lexical_search(query, trace, sources)
+        keyword_match = self.is_confident_lexical_hit(lexical_hits)
+        if keyword_match:
+            results = self.lexical_docs(lexical_hits)
+        else:
+            query_vector = self.embed_query(query, trace)
+            cached = self.cached_answer(question, query_vector) if use_cache else None
+            if cached is not None:
+                yield from self.cached_frames(cached, 'semantic', trace)
+                self.remember(memory, question, query, cached['answer'], cached.get('sources'))
+                return
+            results = self.fuse(lexical_hits, self.search(query_vector, trace, sources))
         
-        sources = self.format_sources(source_docs)
-        confidence = self.calculate_confidence(source_docs)
-        related_questions = self.generate_related_questions(question, source_docs)
+        if use_cache:
+            self.cache_miss()
+        decision = self.route(query, results, trace, keyword_match)
+        context = self.build_context(results, query_vector, trace, decision['model'])
+        metadata = self.build_metadata(query, context['results'], trace, lexical_hits, query_vector, keyword_match)
+        yield {'type': 'meta', **metadata, 'model': decision['answer_model']}
         
-        return {
-            'answer': answer,
-            'sources': sources,
-            'confidence': confidence,
-            'reasoning_steps': reasoning_steps,
-            'related_questions': related_questions
-        }
+        answer_parts = []
+        chain_inputs = self.chain_inputs(question, context, memory if follow_up else None)
+        upgrade = self.start_upgrade(decision, chain_inputs, trace) if decision['speculative'] else None
+        try:
+            for token in self.chains[decision['answer_model']].stream(chain_inputs, config=self.chain_config(trace, decision['answer_model'])):
+                if token:
+                    answer_parts.append(token)
+                    yield {'type': 'token', 'content': token}
+            
+            answer, model = ''.join(answer_parts), decision['answer_model']
+            upgraded = self.finish_upgrade(upgrade, trace) if upgrade is not None else None
+            if upgraded:
+                answer, model = upgraded, decision['model']
+                yield {'type': 'upgrade', 'answer': answer, 'model': model}
+        finally:
+            if upgrade is not None:
+                upgrade[1].set()
+        
+        self.record_route(trace, decision, model)
+        if use_cache:
+            self.cache_answer(question, query_vector, metadata, answer, model)
+        self.remember(memory, question, query, answer, metadata['sources'])
+        yield self.done_frame(answer, trace, context, model)
     
-    def stream_query(self, question, callback=None):
-        reasoning_steps = self.get_reasoning_steps(question)
+    async def _astream_query(self, question, trace, memory, sources):
+        kind, query = await self.arewrite_query(question, memory, trace)
+        follow_up = kind != 'standalone'
+        use_cache = not follow_up and not sources
+        
+        cached = self.cached_answer(question) if use_cache else None
+        if cached is not None:
+            for frame in self.cached_frames(cached, 'exact', trace):
+                yield frame
+            self.remember(memory, question, query, cached['answer'], cached.get('sources'))
+            return
         
-        source_docs = self.retriever.invoke(question)
+        query_vector = None
+        lexical_hits = self.lexical_search(query, trace, sources)
+        keyword_match = self.is_confident_lexical_hit(lexical_hits)
+        if keyword_match:
+            results = self.lexical_docs(lexical_hits)
+        else:
+            query_vector = await self.aembed_query(query, trace)
+            cached = self.cached_answer(question, query_vector) if use_cache else None
+            if cached is not None:
+                for frame in self.cached_frames(cached, 'semantic', trace):
+                    yield frame
+                self.remember(memory, question, query, cached['answer'], cached.get('sources'))
+                return
+            results = self.fuse(lexical_hits, await self.asearch(query_vector, trace, sources))
         
-        context = "\n\n".join([doc.page_content for doc in source_docs[:config.TOP_K_RESULTS]])
+        if use_cache:
+            self.cache_miss()
+        decision = self.route(query, results, trace, keyword_match)
+        context = self.build_context(results, query_vector, trace, decision['model'])
+        metadata = self.build_metadata(query, context['results'], trace, lexical_hits, query_vector, keyword_match)
+        yield {'type': 'meta', **metadata, 'model': decision['answer_model']}
         
-        prompt = f"""{config.SYSTEM_PROMPT}
-
-Context from knowledge base:
-{context}
-
-Question: {question}
-
-Provide a detailed, actionable answer based on the context above. Cite specific essays when relevant."""
-
-        sources = self.format_sources(source_docs)
-        confidence = self.calculate_confidence(source_docs)
+        answer_parts = []
+        chain_inputs = self.chain_inputs(question, context, memory if follow_up else None)
+        upgrade = self.astart_upgrade(decision, chain_inputs, trace) if decision['speculative'] else None
+        try:
+            chain = self.chains[decision['answer_model']]
+            async for token in chain.astream(chain_inputs, config=self.chain_config(trace, decision['answer_model'])):
+                if token:
+                    answer_parts.append(token)
+                    yield {'type': 'token', 'content': token}
+            
+            answer, model = ''.join(answer_parts), decision['answer_model']
+            upgraded = await self.afinish_upgrade(upgrade, trace) if upgrade is not None else None
+            if upgraded:
+                answer, model = upgraded, decision['model']
+                yield {'type': 'upgrade', 'answer': answer, 'model': model}
+        finally:
+            if upgrade is not None:
+                upgrade.cancel()
         
-        return {
-            'prompt': prompt,
-            'sources': sources,
-            'confidence': confidence,
-            'reasoning_steps': reasoning_steps,
-            'source_docs': source_docs
-        }
+        self.record_route(trace, decision, model)
+        if use_cache:
+            await self.acache_answer(question, query_vector, metadata, answer, model)
+        self.remember(memory, question, query, answer, metadata['sources'])
+        yield self.done_frame(answer, trace, context, model)
@@ -0,0 +1,200 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from data_loader import DataLoader
+from rag_engine import RAGEngine, make_query_embedder
+from utils.answer_cache import AnswerCache
+from utils.question_bank import QuestionBank
+from utils.shards import Shard, ShardedLexicalIndex, ShardedVectorStore
+from utils.startup import STARTUP
+from utils.warmup import WarmAnswers, load_warmup_questions, warm_up
+import config
+
+# One instance per process: every session (and every model) shares the same
+# read-only FAISS indexes and docstores instead of unpickling its own copy.
+#
+# By default the knowledge base is every shard in config.SHARDS whose index
+# has been built; with a path it is that one index. Each shard is reloaded on
+# its own when its version link is repointed.
+class ResourceCache:
+    def __init__(self, google_api_key, vectorstore_path=None, warm_up_in_background=False):
+        self.google_api_key = google_api_key
+        if vectorstore_path is None:
+            self.shard_paths = {
+                name: (shard['source'], Path(shard['vectorstore_path'])) for name, shard in config.SHARDS.items()
+            }
+        else:
+            self.shard_paths = {Path(vectorstore_path).name: (None, Path(vectorstore_path))}
+        self._lock = threading.RLock()
+        self._shards = {}
+        self._vectorstore = None
+        self._lexical_index = None
+        self._question_bank = None
+        self._signature = None
+        self.search_pool = ThreadPoolExecutor(max_workers=config.SEARCH_WORKERS, thread_name_prefix='search')
+        self._engines = {}
+        self.query_embedder = None
+        self.answer_cache = AnswerCache(
+            max_entries=config.ANSWER_CACHE_SIZE,
+            ttl=config.ANSWER_CACHE_TTL,
+            similarity_threshold=config.ANSWER_CACHE_SIMILARITY,
+            path=config.ANSWER_CACHE_PATH
+        )
+        self.warm_answers = WarmAnswers(config.WARM_ANSWERS_PATH)
+        self.warm_up_in_background = warm_up_in_background
+        self._warm_up_retry_at = {}
+
+    def shard_signature(self, path):
+        # A saved index is a symlink to a version directory that is never
+        # written again, so the link target alone identifies its contents.
+        try:
+            return os.readlink(path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            pass  # a plain directory saved before versioning
+
+        if not path.is_dir():
+            return None
+
+        signature = []
+        for file in sorted(path.iterdir()):
+            if file.is_file():
+                stat = file.stat()
+                signature.append((file.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def shard_signatures(self):
+        signatures = {name: self.shard_signature(path) for name, (_, path) in self.shard_paths.items()}
+        return {name: signature for name, signature in signatures.items() if signature is not None}
+
+    def index_signature(self):
+        signatures = self.shard_signatures()
+        return tuple(sorted(signatures.items())) or None
+
+    def load_shard(self, loader, name, signature):
+        source, path = self.shard_paths[name]
+        # Resolved once, so a save repointing the link mid-load cannot mix
+        # files from two versions.
+        path = path.resolve()
+        print(f"Loading shard {name} from {path}")
+        with STARTUP.stage(f'load shard {name}'):
+            return Shard(
+                name,
+                source,
+                path,
+                loader.load_vectorstore(str(path)),
+                loader.load_lexical_index(str(path)),
+                loader.load_question_bank(str(path)),
+                signature
+            )
+
+    def combine_shards(self):
+        # A single shard is served as is; several are searched in parallel
+        # on the shared search pool.
+        shards = list(self._shards.values())
+        if len(shards) == 1:
+            shard = shards[0]
+            self._vectorstore = shard.vectorstore
+            self._lexical_index = shard.lexical_index
+            self._question_bank = shard.question_bank
+            return
+        self._vectorstore = ShardedVectorStore(shards, self.search_pool, config.SHARD_TOP_K)
+        self._lexical_index = ShardedLexicalIndex(shards) if any(shard.lexical_index for shard in shards) else None
+        banks = [shard.question_bank for shard in shards if shard.question_bank is not None]
+        self._question_bank = QuestionBank.merge(banks) if banks else None
+
+    def is_loaded(self, model=None):
+        # No lock: the server calls this on its event loop, and a reload
+        # holds the lock for as long as the shards take to load. A reload
+        # swaps both attributes for new objects, so this sees one or the other.
+        signature, engines = self._signature, self._engines
+        if signature is None or signature != self.index_signature():
+            return False
+        return model is None or model in engines
+
+    def get_vectorstore(self):
+        signatures = self.shard_signatures()
+
+        with self._lock:
+            if not signatures:
+                # The index was deleted or moved away; keep serving the copy
+                # already in memory.
+                if self._vectorstore is not None:
+                    return self._vectorstore
+                paths = ', '.join(str(path) for _, path in self.shard_paths.values())
+                raise FileNotFoundError(f"Knowledge base not found at {paths}")
+            signature = tuple(sorted(signatures.items()))
+            if self._vectorstore is None or signature != self._signature:
+                with STARTUP.stage('embedding client'):
+                    loader = DataLoader(self.google_api_key)
+                shards = {}
+                for name, shard_signature in sorted(signatures.items()):
+                    shard = self._shards.get(name)
+                    if shard is None or shard.signature != shard_signature:
+                        shard = self.load_shard(loader, name, shard_signature)
+                    shards[name] = shard
+                # A shard mid-swap keeps its loaded copy.
+                for name, shard in self._shards.items():
+                    shards.setdefault(name, shard)
+                self._shards = shards
+                self.combine_shards()
+                self._signature = signature
+                # Query vectors only depend on the embedding model, so the
+                # cache survives index reloads.
+                if self.query_embedder is None:
+                    self.query_embedder = make_query_embedder(self._vectorstore.embeddings)
+                # Engines hold a reference to the old index, drop them too.
+                self._engines = {}
+            return self._vectorstore
+
+    @property
+    def index_version(self):
+        return hashlib.sha1(repr(self._signature).encode('utf-8')).hexdigest()[:12]
+
+    def get_engine(self, model=config.DEFAULT_MODEL):
+        with self._lock:
+            vectorstore = self.get_vectorstore()
+            engine = self._engines.get(model)
+            if engine is None:
+                with STARTUP.stage(f'engine {model}'):
+                    engine = RAGEngine(
+                        vectorstore,
+                        self.google_api_key,
+                        model=model,
+                        answer_cache=self.answer_cache,
+                        index_version=self.index_version,
+                        query_embedder=self.query_embedder,
+                        lexical_index=self._lexical_index,
+                        warm_answers=self.warm_answers,
+                        question_bank=self._question_bank
+                    )
+                self._engines[model] = engine
+            if self.warm_up_in_background:
+                self.start_warm_up()
+            return engine
+    
+    def start_warm_up(self):
+        # After a rebuild the offline job may not have run yet: regenerate
+        # the missing answers for the new index version on a daemon thread
+        # while the old version's answers simply stop matching.
+        # Each version is warmed once; after a failure the next request may
+        # only try again once WARMUP_RETRY_SECONDS have passed.
+        with self._lock:
+            version = self.index_version
+            if time.monotonic() < self._warm_up_retry_at.get(version, 0):
+                return
+            self._warm_up_retry_at[version] = float('inf')
+        
+        questions = load_warmup_questions()
+        def run():
+            try:
+                warm_up(self, self.warm_answers, questions)
+            except Exception as e:
+                print(f"Background warm-up failed, retrying in {config.WARMUP_RETRY_SECONDS}s: {e}")
+                with self._lock:
+                    self._warm_up_retry_at[version] = time.monotonic() + config.WARMUP_RETRY_SECONDS
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+from contextlib import asynccontextmanager
+import tornado.web
+from tornado.iostream import StreamClosedError
+from dotenv import load_dotenv
+from preload import create_resources, preload
+from utils.conversation import ConversationMemory
+from utils.startup import STARTUP
+from utils.tracing import METRICS
+import config
+
+class Overloaded(Exception):
+    pass
+
+# Caps how many questions are in the retrieval + model stage at once and how
+# many may wait for a slot. Past that, requests are turned away immediately
+# with 503 so a load balancer can retry elsewhere instead of piling up.
+class ConcurrencyLimiter:
+    def __init__(self, max_concurrency, max_queue):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.active >= self.max_concurrency and self.waiting >= self.max_queue:
+            raise Overloaded()
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, resources, limiter):
+        self.resources = resources
+        self.limiter = limiter
+
+    def write_error(self, status_code, **kwargs):
+        # send_error() clears the headers set before the error was raised.
+        if status_code == 503:
+            self.set_header('Retry-After', '1')
+        self.finish({'error': self._reason})
+
+    def parse_request(self):
+        try:
+            body = json.loads(self.request.body or b'{}')
+        except json.JSONDecodeError:
+            raise tornado.web.HTTPError(400, reason="Request body must be JSON")
+
+        question = str(body.get('question', '')).strip()
+        if not question:
+            raise tornado.web.HTTPError(400, reason="Missing 'question'")
+        if len(question) > config.SERVER_MAX_QUESTION_CHARS:
+            raise tornado.web.HTTPError(400, reason="Question is too long")
+
+        model = body.get('model', config.DEFAULT_MODEL)
+        if model not in (config.LLM_MODEL_AUTO, config.LLM_MODEL, config.LLM_MODEL_FAST):
+            raise tornado.web.HTTPError(400, reason=f"Unknown model {model!r}")
+
+        # Earlier turns of the conversation, [{"question": ..., "answer": ...}],
+        # oldest first; follow-ups are answered in their context.
+        history = body.get('history') or []
+        if not isinstance(history, list) or not all(isinstance(turn, dict) for turn in history):
+            raise tornado.web.HTTPError(400, reason="'history' must be a list of {question, answer} objects")
+        memory = ConversationMemory.from_history(history[-config.SESSION_MAX_MESSAGES:]) if history else None
+
+        # Optional list of sources (e.g. ["YC Blog"]) to search; all by default.
+        sources = body.get('sources') or None
+        if sources is not None and (not isinstance(sources, list) or not all(isinstance(source, str) for source in sources)):
+            raise tornado.web.HTTPError(400, reason="'sources' must be a list of source names")
+
+        return question, model, memory, sources
+
+    async def get_engine(self, model):
+        if self.resources.is_loaded(model):
+            return self.resources.get_engine(model)
+        return await asyncio.to_thread(self.resources.get_engine, model)
+
+    def reject_overloaded(self):
+        raise tornado.web.HTTPError(503, reason="Server is at capacity, retry shortly")
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write({
+            'status': 'ok',
+            'active': self.limiter.active,
+            'waiting': self.limiter.waiting,
+            'answer_cache': self.resources.answer_cache.stats(),
+            'startup': STARTUP.summary()
+        })
+
+class MetricsHandler(BaseHandler):
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(METRICS.render())
+        self.write(f'rag_requests_active {self.limiter.active}\nrag_requests_waiting {self.limiter.waiting}\n')
+
+class QueryHandler(BaseHandler):
+    async def post(self):
+        question, model, memory, sources = self.parse_request()
+        engine = await self.get_engine(model)
+
+        try:
+            async with self.limiter.slot():
+                result = await engine.aquery(question, memory, sources)
+        except Overloaded:
+            self.reject_overloaded()
+
+        self.write(result)
+
+class StreamHandler(BaseHandler):
+    def write_frame(self, frame):
+        self.write(f"event: {frame['type']}\ndata: {json.dumps(frame)}\n\n")
+
+    async def post(self):
+        question, model, memory, sources = self.parse_request()
+        engine = await self.get_engine(model)
+
+        self.set_header('Content-Type', 'text/event-stream')
+        self.set_header('Cache-Control', 'no-cache')
+        self.set_header('X-Accel-Buffering', 'no')
+
+        started = False
+        try:
+            async with self.limiter.slot():
+                frames = engine.astream_query(question, memory, sources)
+                try:
+                    async for frame in frames:
+                        self.write_frame(frame)
+                        # flush() resolves once the bytes reach the socket, so
+                        # a slow client slows its own generator down instead of
+                        # buffering the whole answer in memory.
+                        await self.flush()
+                        started = True
+                finally:
+                    await frames.aclose()
+        except Overloaded:
+            self.reject_overloaded()
+        except StreamClosedError:
+            return  # client went away; the model stream was closed above
+        except Exception as e:
+            if not started:
+                raise
+            # The 200 and part of the answer are already out, so an HTTP
+            # error is no longer possible: end the stream with an error frame
+            # instead of cutting the chunked response off.
+            print(f"Stream failed: {e}")
+            self.write_frame({'type': 'error', 'error': "Answer generation failed"})
+
+        self.finish()
+
+def make_app(resources, limiter):
+    handler_args = {'resources': resources, 'limiter': limiter}
+    return tornado.web.Application([
+        (r"/health", HealthHandler, handler_args),
+        (r"/metrics", MetricsHandler, handler_args),
+        (r"/query", QueryHandler, handler_args),
+        (r"/stream", StreamHandler, handler_args),
+    ])
+
+async def serve(port, api_key):
+    print("Loading knowledge base...")
+    resources = await asyncio.to_thread(create_resources, api_key)
+    await asyncio.to_thread(preload, resources)
+
+    limiter = ConcurrencyLimiter(config.SERVER_MAX_CONCURRENCY, config.SERVER_MAX_QUEUE)
+    app = make_app(resources, limiter)
+    app.listen(port)
+    print(f"Serving on http://0.0.0.0:{port} (POST /query, POST /stream, GET /health, GET /metrics)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+    print("Shutting down, saving the answer cache...")
+    await asyncio.to_thread(resources.answer_cache.save)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP/SSE server for the YC Startup Assistant")
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT)
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv('GOOGLE_API_KEY')
+    if not api_key:
+        print("Please set GOOGLE_API_KEY environment variable")
+        exit(1)
+
+    asyncio.run(serve(args.port, api_key))
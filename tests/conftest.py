@@ -0,0 +1,55 @@
+import json
+import random
+import sys
+from pathlib import Path
+import pytest
+
+# The modules live at the repository root (`import config`, `from utils...`).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+WORDS = ['startup', 'founder', 'users', 'growth', 'investors', 'funding', 'product', 'market', 'ramen',
+         'profitable', 'cofounder', 'hiring', 'equity', 'launch', 'ideas', 'seed', 'round', 'scale']
+
+def make_essay(i, paragraphs=4, url=None):
+    # Distinct vocabulary per essay (w<i>_<n>) mixed with shared topic words,
+    # long enough to split into several chunks.
+    rng = random.Random(i)
+    content = '\n\n'.join(
+        ' '.join(rng.choice(WORDS) if rng.random() < 0.3 else f"w{i}_{rng.randrange(40)}" for _ in range(90)) + '.'
+        for _ in range(paragraphs)
+    )
+    return {'title': f"Essay {i}", 'url': url or f"http://essays.test/{i}.html", 'source': 'Paul Graham Essays',
+            'content': content}
+
+@pytest.fixture
+def write_essays(tmp_path):
+    def write(essays, name='essays.jsonl'):
+        path = tmp_path / name
+        with open(path, 'w', encoding='utf-8') as f:
+            for essay in essays:
+                f.write(json.dumps(essay) + '\n')
+        return str(path)
+    return write
+
+@pytest.fixture
+def loader(tmp_path):
+    from benchmarks.stubs import HashEmbeddings
+    from data_loader import DataLoader
+    return DataLoader(None, embeddings=HashEmbeddings(dim=32), embedding_cache_dir=str(tmp_path / 'embedding_cache'),
+                      questions_path=str(tmp_path / 'essay_questions.jsonl'))
+
+@pytest.fixture
+def knowledge_base(loader, write_essays, tmp_path):
+    path = str(tmp_path / 'index')
+    loader.build_knowledge_base(write_essays([make_essay(i) for i in range(6)]), path, questions=False)
+    return path
+
+@pytest.fixture
+def metrics(monkeypatch):
+    # A fresh METRICS per test, seen by the traces and by routing.
+    import rag_engine
+    from utils import tracing
+    fresh = tracing.Metrics()
+    monkeypatch.setattr(tracing, 'METRICS', fresh)
+    monkeypatch.setattr(rag_engine, 'METRICS', fresh)
+    return fresh
@@ -0,0 +1,80 @@
+import numpy as np
+from utils.answer_cache import AnswerCache, normalize_question
+
+NAMESPACE = ('gemini-2.5-pro', 'v1')
+VECTOR = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+
+def test_normalize_question():
+    assert normalize_question("  How do I RAISE a Seed round?! ") == "how do i raise a seed round"
+
+def test_exact_and_semantic_hits():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.store("How do I raise?", VECTOR, {'answer': "a"}, NAMESPACE)
+    assert cache.lookup("how do i RAISE", NAMESPACE) == {'answer': "a"}
+    assert cache.lookup_similar([0.99, 0.05, 0.0], NAMESPACE) == {'answer': "a"}
+    assert cache.lookup_similar([0.0, 1.0, 0.0], NAMESPACE) is None
+    stats = cache.stats()
+    assert (stats['hits_exact'], stats['hits_semantic']) == (1, 1)
+
+def test_namespaces_are_separate():
+    cache = AnswerCache()
+    cache.store("q", VECTOR, {'answer': "a"}, NAMESPACE)
+    assert cache.lookup("q", ('gemini-2.5-pro', 'v2')) is None
+    assert cache.lookup_similar(VECTOR, ('gemini-2.5-flash-lite', 'v1')) is None
+
+def test_misses_are_counted_once_per_question():
+    cache = AnswerCache()
+    assert cache.lookup("q", NAMESPACE) is None
+    assert cache.lookup_similar(VECTOR, NAMESPACE) is None
+    cache.record_miss()
+    cache.store("q", VECTOR, {'answer': "a"}, NAMESPACE)
+    cache.lookup("q", NAMESPACE)
+    assert cache.stats() == {'entries': 1, 'hits_exact': 1, 'hits_semantic': 0, 'misses': 1, 'hit_rate': 0.5}
+
+def test_expired_entries_are_not_served():
+    cache = AnswerCache(ttl=60)
+    cache.store("q", VECTOR, {'answer': "a"}, NAMESPACE)
+    next(iter(cache._entries.values()))['created_at'] -= 61
+    assert cache.lookup_similar(VECTOR, NAMESPACE) is None
+    assert cache.lookup("q", NAMESPACE) is None
+
+def test_lru_eviction():
+    cache = AnswerCache(max_entries=2)
+    for question in ("a", "b"):
+        cache.store(question, None, {'answer': question}, NAMESPACE)
+    cache.lookup("a", NAMESPACE)
+    cache.store("c", None, {'answer': "c"}, NAMESPACE)
+    assert cache.lookup("b", NAMESPACE) is None
+    assert cache.lookup("a", NAMESPACE) is not None
+
+def test_save_and_load(tmp_path):
+    path = tmp_path / 'answer_cache.json'
+    cache = AnswerCache(path=path, save_interval=0)
+    cache.store("q", VECTOR, {'answer': "a"}, NAMESPACE)
+    assert cache.save_due()
+    cache.save()
+    assert not cache.save_due()
+    loaded = AnswerCache(path=path)
+    assert loaded.lookup("q", NAMESPACE) == {'answer': "a"}
+    assert loaded.lookup_similar(VECTOR, NAMESPACE) == {'answer': "a"}
+
+def test_semantic_lookup_after_eviction_and_overwrite():
+    cache = AnswerCache(max_entries=3, similarity_threshold=0.95)
+    vectors = np.eye(4, dtype=np.float32)
+    for i in range(4):
+        cache.store(f"q{i}", vectors[i], {'answer': i}, NAMESPACE)
+    assert cache.lookup_similar(vectors[0], NAMESPACE) is None
+    assert [cache.lookup_similar(vectors[i], NAMESPACE) for i in (1, 2, 3)] == [{'answer': i} for i in (1, 2, 3)]
+
+    cache.store("q3", vectors[1], {'answer': "moved"}, NAMESPACE)
+    assert cache.lookup_similar(vectors[3], NAMESPACE) is None
+    assert cache.lookup_similar(vectors[1], NAMESPACE) in ({'answer': 1}, {'answer': "moved"})
+    cache.store("q2", None, {'answer': 2}, NAMESPACE)
+    assert cache.lookup_similar(vectors[2], NAMESPACE) is None
+
+def test_vectors_grow_past_initial_capacity():
+    cache = AnswerCache(max_entries=1000)
+    vectors = np.random.default_rng(0).normal(size=(200, 8)).astype(np.float32)
+    for i, vector in enumerate(vectors):
+        cache.store(f"q{i}", vector, {'answer': i}, NAMESPACE)
+    assert all(cache.lookup_similar(vector, NAMESPACE) == {'answer': i} for i, vector in enumerate(vectors))
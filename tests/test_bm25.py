@@ -0,0 +1,32 @@
+from utils.bm25 import BM25Index
+from utils.text import tokenize
+
+CHUNKS = [
+    ('a-0', "Ramen profitable startups can ignore investors."),
+    ('a-1', "Growth is the measure of a startup; weekly growth matters most."),
+    ('b-0', "Cofounders should split equity early and vest it."),
+]
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("What is the best way to get ramen-profitable?") == ['best', 'way', 'get', 'ramen', 'profitable']
+
+def test_search_ranks_matching_chunk_first():
+    index = BM25Index.build(CHUNKS)
+    hits = index.search("weekly growth")
+    assert hits[0]['id'] == 'a-1'
+    assert hits[0]['coverage'] == 1.0
+    assert all(hit['id'] != 'b-0' for hit in hits)
+
+def test_search_without_known_terms_returns_nothing():
+    assert BM25Index.build(CHUNKS).search("kubernetes blockchain") == []
+
+def test_coverage_counts_out_of_vocabulary_terms():
+    hits = BM25Index.build(CHUNKS).search("ramen profitable kubernetes blockchain")
+    assert hits[0]['id'] == 'a-0'
+    assert hits[0]['coverage'] == 0.5
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index.build(CHUNKS)
+    index.save(tmp_path)
+    loaded = BM25Index.load(tmp_path)
+    assert loaded.search("equity vest") == index.search("equity vest")
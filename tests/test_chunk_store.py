@@ -0,0 +1,63 @@
+from pathlib import Path
+import pytest
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from utils.chunk_store import ChunkDocstore, ChunkIds, ChunkStore, has_chunk_store, write_chunk_store
+
+DOCS = {
+    'ffff000000000000-0': Document(page_content="Make something people want.",
+                                   metadata={'title': 'Startup = Growth', 'source': 'Paul Graham Essays'}),
+    '0000ffff00000000-0': Document(page_content="Déjà vu: unicode survives the round trip ✓",
+                                   metadata={'title': 'Notes', 'source': 'Internal Notes', 'url': 'http://x/1'}),
+    '0000ffff00000000-1': Document(page_content="Second chunk of the same essay.",
+                                   metadata={'title': 'Notes', 'source': 'Internal Notes', 'url': 'http://x/1'}),
+}
+
+def write(path):
+    index_to_docstore_id = dict(enumerate(DOCS))
+    write_chunk_store(path, index_to_docstore_id, InMemoryDocstore(DOCS))
+    return index_to_docstore_id
+
+def test_round_trip(tmp_path):
+    index_to_docstore_id = write(tmp_path)
+    assert has_chunk_store(tmp_path)
+    store = ChunkStore(tmp_path)
+    assert len(store) == len(DOCS)
+    for position, chunk_id in index_to_docstore_id.items():
+        assert store.position(chunk_id) == position
+        doc = store.document(position)
+        assert doc.id == chunk_id
+        assert doc.page_content == DOCS[chunk_id].page_content
+        assert doc.metadata == DOCS[chunk_id].metadata
+
+def test_metadata_rows_are_shared(tmp_path):
+    write(tmp_path)
+    assert len(ChunkStore(tmp_path).metadata) == 2
+
+def test_unknown_id(tmp_path):
+    write(tmp_path)
+    store = ChunkStore(tmp_path)
+    assert store.position('1234567890abcdef-0') is None
+    assert ChunkDocstore(store).search('1234567890abcdef-0') == "ID 1234567890abcdef-0 not found."
+
+def test_chunk_ids_mapping(tmp_path):
+    index_to_docstore_id = write(tmp_path)
+    ids = ChunkIds(ChunkStore(tmp_path))
+    assert dict(ids) == index_to_docstore_id
+    assert 3 not in ids
+
+def test_saved_knowledge_base_has_no_pickle_and_loads_mapped(loader, knowledge_base, tmp_path):
+    assert not list(Path(knowledge_base).glob('*.pkl'))
+    mapped = loader.load_vectorstore(knowledge_base)
+    writable = loader.load_vectorstore(knowledge_base, writable=True)
+    assert isinstance(mapped.docstore, ChunkDocstore)
+
+    query = mapped.docstore.search(mapped.index_to_docstore_id[3]).page_content
+    vector = loader.embeddings.embed_query(query)
+    hits = mapped.similarity_search_with_score_by_vector(vector, k=4)
+    expected = writable.similarity_search_with_score_by_vector(vector, k=4)
+    assert [(doc.id, doc.page_content, doc.metadata) for doc, _ in hits] == \
+        [(doc.id, doc.page_content, doc.metadata) for doc, _ in expected]
+
+    with pytest.raises(ValueError):
+        loader.load_vectorstore(str(tmp_path))
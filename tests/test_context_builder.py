@@ -0,0 +1,46 @@
+import numpy as np
+from langchain_core.documents import Document
+from utils.context_builder import ContextBuilder, merge_text
+
+ESSAY_A, ESSAY_B = '0123456789abcdef', 'fedcba9876543210'
+
+class StubVectorStore:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def chunk_vectors(self, docs):
+        return np.array([self.vectors[doc.id] for doc in docs], dtype=np.float32)
+
+def doc(chunk_id, text="Talk to users."):
+    return Document(page_content=text, id=chunk_id)
+
+def test_merge_text_only_joins_whole_word_overlaps():
+    assert merge_text("alpha beta gamma", "beta gamma delta", 50) == "alpha beta gamma delta"
+    assert merge_text("alpha beta", "tabular data", 50) == "alpha beta tabular data"
+
+def test_neighbouring_chunks_are_stitched_per_essay():
+    builder = ContextBuilder(StubVectorStore({}), token_budget=1000, max_chunks=5)
+    docs = [
+        doc(f"{ESSAY_A}-1", "gamma delta epsilon"),
+        doc(f"{ESSAY_B}-0", "Another essay."),
+        doc(f"{ESSAY_A}-0", "alpha beta gamma delta"),
+        doc(f"{ESSAY_A}-3", "zeta eta"),
+        doc(f"{ESSAY_B}-4", "Another essay."),
+    ]
+    assert builder.merge(docs) == ["alpha beta gamma delta epsilon", "zeta eta", "Another essay."]
+
+def test_mmr_prefers_a_different_chunk_over_a_near_duplicate():
+    vectors = {'a': [0.9, 0.436, 0.0], 'b': [0.9, 0.436, 0.0], 'c': [0.8, -0.6, 0.0]}
+    builder = ContextBuilder(StubVectorStore(vectors), token_budget=1000, max_chunks=2)
+    docs = [doc(chunk_id) for chunk_id in ('a', 'b', 'c')]
+    assert builder.select(docs, [1.0, 0.0, 0.0]) == [0, 2]
+    # Without a query vector (keyword-only answers) rank order is kept.
+    assert builder.select(docs, None) == [0, 1]
+
+def test_chunks_over_the_token_budget_are_skipped():
+    builder = ContextBuilder(StubVectorStore({}), token_budget=20, max_chunks=5)
+    docs = [doc('a', "word " * 100), doc('b', "short"), doc('c', "also short")]
+    result = builder.build([(d, None) for d in docs])
+    assert [d.id for d, _ in result['results']] == ['b', 'c']
+    assert result['text'] == "short\n\nalso short"
+    assert result['tokens_saved'] > 0
@@ -0,0 +1,46 @@
+import json
+from utils.conversation import ConversationMemory
+
+def memory_with(question="How do I find product-market fit?", answer="Talk to users. Iterate fast."):
+    memory = ConversationMemory()
+    memory.add_turn(question, answer)
+    return memory
+
+def test_first_question_is_standalone():
+    assert ConversationMemory().classify("Is that true?") == ('standalone', "Is that true?")
+
+def test_follow_up_prefix_attaches_previous_question():
+    assert memory_with().classify("What about for B2B?") == ('heuristic', "How do I find product-market fit for B2B?")
+
+def test_full_question_after_follow_up_prefix_stays_standalone():
+    question = "So how should I price my enterprise SaaS product for large customers?"
+    assert memory_with().classify(question) == ('standalone', question)
+
+def test_question_without_content_words_is_about_previous_question():
+    assert memory_with().classify("Why?") == ('heuristic', "How do I find product-market fit Why?")
+
+def test_short_question_needs_model_rewrite():
+    assert memory_with().classify("How long does it take?") == ('ambiguous', None)
+
+def test_pronouns_do_not_make_a_full_question_a_follow_up():
+    question = "How do I know that my startup idea is good?"
+    assert memory_with().classify(question) == ('standalone', question)
+
+def test_clean_rewrite_falls_back_to_previous_query():
+    memory = memory_with()
+    assert memory.clean_rewrite('"How long does finding fit take?"\nextra', "How long?") == "How long does finding fit take?"
+    assert memory.clean_rewrite("", "How long?") == "How do I find product-market fit How long?"
+
+def test_old_turns_fold_into_bounded_summary():
+    memory = ConversationMemory(max_turns=2, summary_chars=200, max_bytes=4096)
+    for i in range(20):
+        memory.add_turn(f"Question number {i}?", "An answer. " * 30)
+    assert len(memory.turns) == 2
+    assert sum(len(line) + 1 for line in memory.summary) <= 200
+    assert len(json.dumps([list(memory.turns), list(memory.summary)]).encode('utf-8')) <= 4096
+    assert "Question number 19?" in memory.context_text()
+
+def test_from_history():
+    memory = ConversationMemory.from_history([{'question': "A?", 'answer': "a"}, {'question': "B?", 'answer': "b"}])
+    assert memory.last_query == "B?"
+    assert len(memory) == 2
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+import config
+from conftest import make_essay
+from utils.question_bank import append_essay_questions
+
+def chunk_texts(vectorstore):
+    return [vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]).page_content
+            for i in range(vectorstore.index.ntotal)]
+
+def quoting_essay(original):
+    return {'title': "Quoter", 'url': "http://essays.test/quoter.html", 'source': 'Paul Graham Essays',
+            'content': original['content']}
+
+def test_update_adds_modifies_and_deletes_essays(loader, write_essays, tmp_path):
+    essays = [make_essay(i) for i in range(3)]
+    path = str(tmp_path / 'index')
+    loader.build_knowledge_base(write_essays(essays), path, questions=False)
+    before = loader.load_manifest(path)
+
+    modified = dict(essays[1], content=essays[1]['content'] + "\n\nA new closing paragraph about ramen profitable seed rounds.")
+    current = [essays[0], modified, make_essay(3)]
+    embedded = len(loader.embedding_cache)
+    vectorstore = loader.update_knowledge_base(write_essays(current), path, questions=False)
+
+    manifest = loader.load_manifest(path)
+    assert sorted(manifest) == sorted(essay['url'] for essay in current)
+    assert manifest[essays[0]['url']] == before[essays[0]['url']]
+    assert manifest[modified['url']]['hash'] != before[modified['url']]['hash']
+    # Only the new closing chunk and the added essay are embedded.
+    assert len(loader.embedding_cache) - embedded == len(manifest[current[2]['url']]['ids']) + 1
+    assert sorted(vectorstore.index_to_docstore_id.values()) == sorted(
+        chunk_id for entry in manifest.values() for chunk_id in entry['ids'])
+
+    rebuilt = loader.build_knowledge_base(write_essays(current, 'rebuilt.jsonl'), str(tmp_path / 'rebuilt'), questions=False)
+    assert sorted(chunk_texts(loader.load_vectorstore(path))) == sorted(chunk_texts(rebuilt))
+
+def test_update_without_changes_keeps_the_version(loader, write_essays, tmp_path):
+    essays_path = write_essays([make_essay(i) for i in range(2)])
+    path = str(tmp_path / 'index')
+    loader.build_knowledge_base(essays_path, path, questions=False)
+    version = os.readlink(path)
+
+    loader.update_knowledge_base(essays_path, path, questions=False)
+    assert os.readlink(path) == version
+
+def test_near_duplicate_chunks_are_dropped_and_recorded(loader, write_essays, tmp_path):
+    essays = [make_essay(0), make_essay(1)]
+    quoter = quoting_essay(essays[0])
+    vectorstore = loader.build_knowledge_base(write_essays(essays + [quoter]), str(tmp_path / 'index'), questions=False)
+
+    manifest = loader.load_manifest(str(tmp_path / 'index'))
+    assert manifest[quoter['url']]['ids'] == []
+    assert manifest[quoter['url']]['depends_on'] == [essays[0]['url']]
+    assert vectorstore.index.ntotal == sum(len(entry['ids']) for entry in manifest.values())
+
+def test_removing_the_kept_copy_reingests_the_duplicate(loader, write_essays, tmp_path):
+    essays = [make_essay(0), make_essay(1)]
+    quoter = quoting_essay(essays[0])
+    path = str(tmp_path / 'index')
+    loader.build_knowledge_base(write_essays(essays + [quoter]), path, questions=False)
+
+    vectorstore = loader.update_knowledge_base(write_essays([essays[1], quoter]), path, questions=False)
+
+    manifest = loader.load_manifest(path)
+    assert essays[0]['url'] not in manifest
+    assert manifest[quoter['url']]['ids']
+    assert vectorstore.index.ntotal == sum(len(entry['ids']) for entry in manifest.values())
+    assert any(essays[0]['content'][:200] in text for text in chunk_texts(vectorstore))
+
+def test_question_generation_is_bounded_and_skips_known_essays(loader, monkeypatch):
+    monkeypatch.setattr(config, 'QUESTION_GENERATION_WINDOW', 2)
+    lock = threading.Lock()
+    active, calls = [0, 0], []
+
+    def generate(essay, essay_hash):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+            calls.append(essay['title'])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        if essay['title'] == "Essay 3":
+            raise RuntimeError("quota exceeded")
+        append_essay_questions(loader.questions_path, essay_hash, essay['title'], ["Why?"])
+    monkeypatch.setattr(loader, 'generate_essay_questions', generate)
+
+    essays = [make_essay(i) for i in range(6)]
+    assert loader.generate_questions(iter(essays + essays[:2])) == 5
+    assert sorted(calls) == sorted(essay['title'] for essay in essays)
+    assert active[1] <= 2
+
+    calls.clear()
+    assert loader.generate_questions(iter(essays)) == 0
+    assert calls == ["Essay 3"]
@@ -0,0 +1,31 @@
+import pytest
+from utils.dedup import NearDuplicateFilter
+
+TEXT = ("The best way to get startup ideas is not to try to think of startup ideas. It's to look for "
+        "problems, preferably problems you have yourself. The very best startup ideas tend to have three "
+        "things in common: they're something the founders themselves want, that they themselves can build, "
+        "and that few others realize are worth doing.")
+
+def test_exact_and_near_duplicates_are_found():
+    dedup = NearDuplicateFilter()
+    assert not dedup.is_duplicate(TEXT)
+    assert dedup.is_duplicate(TEXT)
+    assert dedup.is_duplicate(TEXT.replace("three", "3"))
+    assert (dedup.seen, dedup.dropped) == (3, 2)
+
+def test_different_text_is_kept():
+    dedup = NearDuplicateFilter()
+    dedup.add(TEXT)
+    assert not dedup.is_duplicate("Fundraising is brutal. Investors say no far more often than yes, "
+                                  "and most of them will not tell you why they passed on your round.")
+
+def test_find_returns_the_row_of_the_owner():
+    dedup = NearDuplicateFilter()
+    dedup.add("Completely unrelated text about hiring your first engineers carefully.", owner='other')
+    assert dedup.find(TEXT, owner='first') is None
+    row = dedup.find(TEXT, owner='second')
+    assert dedup.owners[row] == 'first'
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        NearDuplicateFilter(num_perm=64, bands=10)
@@ -0,0 +1,45 @@
+import numpy as np
+from utils.embedding_cache import EmbeddingCache
+
+def embedder(calls):
+    def embed_batch(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), float(i)] for i, text in enumerate(texts)]
+    return embed_batch
+
+def test_only_missing_texts_are_embedded_in_batches(tmp_path):
+    cache = EmbeddingCache(tmp_path, 'models/embedding-001')
+    calls = []
+    first = cache.embed_documents(["a", "bb", "a", "ccc"], embedder(calls), batch_size=2)
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert np.array_equal(first[0], first[2])
+
+    second = cache.embed_documents(["ccc", "dddd", "a"], embedder(calls), batch_size=2)
+    assert calls[2:] == [["dddd"]]
+    assert np.array_equal(second[0], first[3]) and np.array_equal(second[2], first[0])
+    assert cache.stats() == {'hits': 3, 'misses': 4, 'size': 4}
+
+def test_persists_per_model(tmp_path):
+    calls = []
+    vectors = EmbeddingCache(tmp_path, 'models/embedding-001').embed_documents(["a", "bb"], embedder(calls))
+
+    reopened = EmbeddingCache(tmp_path, 'models/embedding-001')
+    assert np.array_equal(reopened.embed_documents(["a", "bb"], embedder(calls)), vectors)
+    assert len(calls) == 1
+    EmbeddingCache(tmp_path, 'models/text-embedding-004').embed_documents(["a"], embedder(calls))
+    assert len(calls) == 2
+
+def test_torn_append_is_cut_back(tmp_path):
+    cache = EmbeddingCache(tmp_path, 'models/embedding-001')
+    cache.embed_documents(["a", "bb"], embedder([]))
+    with open(cache.vectors_path, 'ab') as f:
+        f.write(b'\0' * 3)
+    with open(cache.keys_path, 'a', encoding='utf-8') as f:
+        f.write(f"{cache.key('ccc')}\n")
+
+    reopened = EmbeddingCache(tmp_path, 'models/embedding-001')
+    assert len(reopened) == 2 and cache.key('ccc') not in reopened
+    assert reopened.vectors_path.stat().st_size == 2 * 2 * 4
+    calls = []
+    reopened.embed_documents(["ccc", "a"], embedder(calls))
+    assert calls == [["ccc"]]
@@ -0,0 +1,42 @@
+import pytest
+from benchmarks.stubs import HashEmbeddings
+from utils.query_embedder import QueryEmbedder
+
+class FailingEmbeddings(HashEmbeddings):
+    def embed_documents(self, texts, **kwargs):
+        raise RuntimeError("quota exceeded")
+
+def test_concurrent_questions_share_one_call():
+    embeddings = HashEmbeddings(dim=8, latency_ms=20)
+    embedder = QueryEmbedder(embeddings, batch_window_ms=50)
+    futures = [embedder.submit(question) for question in ("What is growth?", "How to hire?", " What is growth? ")]
+
+    vectors = [future.result() for future in futures]
+    assert embeddings.calls == 1
+    assert vectors[0] == vectors[2] == embeddings._embed("What is growth?")
+    assert embedder.stats() == {'hits': 1, 'misses': 2, 'api_calls': 1, 'cached': 2}
+
+def test_repeated_question_is_cached_and_lru_bounded():
+    embeddings = HashEmbeddings(dim=8)
+    embedder = QueryEmbedder(embeddings, cache_size=2, batch_window_ms=0)
+    for question in ("a", "b", "a", "c", "b"):
+        embedder.embed_query(question)
+    # "b" was evicted by "c" after "a" was used again.
+    assert embeddings.calls == 4
+    assert embedder.stats()['cached'] == 2
+
+def test_batches_are_capped():
+    embeddings = HashEmbeddings(dim=8, latency_ms=20)
+    embedder = QueryEmbedder(embeddings, batch_window_ms=50, max_batch_size=2)
+    futures = [embedder.submit(f"question {i}") for i in range(5)]
+    [future.result() for future in futures]
+    assert embeddings.calls == 3
+
+def test_errors_reach_every_waiting_caller():
+    embedder = QueryEmbedder(FailingEmbeddings(dim=8), batch_window_ms=20)
+    futures = [embedder.submit(question) for question in ("a", "b")]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result()
+    with pytest.raises(RuntimeError):
+        embedder.embed_query("a")
@@ -0,0 +1,165 @@
+import asyncio
+import config
+from benchmarks.stubs import StubChatModel
+from rag_engine import RAGEngine
+from utils.answer_cache import AnswerCache
+from utils.text import tokenize
+
+def make_engine(loader, path, **kwargs):
+    kwargs.setdefault('llm', StubChatModel(response="Strong answer."))
+    return RAGEngine(loader.load_vectorstore(path), None, lexical_index=loader.load_lexical_index(path), **kwargs)
+
+def first_chunk_text(engine):
+    vectorstore = engine.vectorstore
+    return vectorstore.docstore.search(vectorstore.index_to_docstore_id[0]).page_content
+
+def count_searches(engine, monkeypatch):
+    searches = []
+    search = engine.vectorstore.similarity_search_with_score_by_vector
+    def counted(*args, **kwargs):
+        searches.append(args[0])
+        return search(*args, **kwargs)
+    monkeypatch.setattr(engine.vectorstore, 'similarity_search_with_score_by_vector', counted)
+    return searches
+
+def test_question_is_embedded_and_searched_once(loader, knowledge_base, metrics, monkeypatch):
+    # Never answered from the keyword index alone, so the dense path runs.
+    monkeypatch.setattr(config, 'LEXICAL_SKIP_RATIO', float('inf'))
+    engine = make_engine(loader, knowledge_base)
+    searches = count_searches(engine, monkeypatch)
+    embeddings = engine.vectorstore.embeddings
+    calls = embeddings.calls
+
+    result = engine.query(first_chunk_text(engine))
+    assert embeddings.calls - calls == 1
+    assert len(searches) == 1
+    assert result['answer'] == "Strong answer."
+    assert result['sources'][0]['title'] == "Essay 0"
+
+def test_answer_streams_as_token_frames(loader, knowledge_base, metrics):
+    engine = make_engine(loader, knowledge_base, llm=StubChatModel(response="Launch early and talk to users.", words_per_chunk=2))
+    frames = list(engine.stream_query(first_chunk_text(engine)))
+
+    assert frames[0]['type'] == 'meta' and frames[0]['sources']
+    assert frames[-1]['type'] == 'done'
+    tokens = [frame['content'] for frame in frames[1:-1]]
+    assert len(tokens) > 1 and all(frame['type'] == 'token' for frame in frames[1:-1])
+    assert ''.join(tokens) == frames[-1]['answer'] == "Launch early and talk to users."
+    assert frames[-1]['timings']['llm_first_token_ms'] <= frames[-1]['timings']['llm_total_ms']
+
+def test_async_stream_yields_the_same_frames(loader, knowledge_base, metrics):
+    engine = make_engine(loader, knowledge_base)
+    question = first_chunk_text(engine)
+
+    async def collect():
+        return [frame async for frame in engine.astream_query(question)]
+
+    frames = asyncio.run(collect())
+    expected = list(make_engine(loader, knowledge_base).stream_query(question))
+    assert [frame['type'] for frame in frames] == [frame['type'] for frame in expected]
+    assert frames[-1]['answer'] == expected[-1]['answer']
+    assert frames[0]['sources'] == expected[0]['sources']
+
+def routed_engine(loader, knowledge_base, strong_latency_ms=0.0):
+    return make_engine(loader, knowledge_base, model=config.LLM_MODEL_AUTO,
+                       llm=StubChatModel(response="Strong answer.", first_token_latency_ms=strong_latency_ms),
+                       fast_llm=StubChatModel(response="Fast answer.", first_token_latency_ms=0.0))
+
+def test_speculative_upgrade_is_booked_under_the_strong_model(loader, knowledge_base, metrics, monkeypatch):
+    monkeypatch.setattr(config, 'ROUTER_UPGRADE_DEADLINE_MS', 5000)
+    engine = routed_engine(loader, knowledge_base, strong_latency_ms=50)
+    # A long question goes to the strong model with the fast one answering first.
+    frames = list(engine.stream_query(first_chunk_text(engine)))
+
+    assert [frame['type'] for frame in frames if frame['type'] != 'token'] == ['meta', 'upgrade', 'done']
+    assert frames[0]['model'] == config.LLM_MODEL_FAST
+    assert (frames[-1]['model'], frames[-1]['answer']) == (config.LLM_MODEL, "Strong answer.")
+
+    rendered = metrics.render()
+    assert f'rag_queries_total{{model="{config.LLM_MODEL}",outcome="generated"}} 1' in rendered
+    assert f'model="{config.LLM_MODEL_FAST}",outcome' not in rendered
+    assert f'rag_llm_tokens_total{{model="{config.LLM_MODEL_FAST}",direction="out"}}' in rendered
+    assert f'rag_llm_tokens_total{{model="{config.LLM_MODEL}",direction="out"}}' in rendered
+    assert f'model="{config.LLM_MODEL}",stage="llm_upgrade_first_token"' in rendered
+    assert f'model="{config.LLM_MODEL_FAST}",stage="llm_first_token"' in rendered
+    assert metrics.percentile('llm_first_token', 50, model=config.LLM_MODEL) >= 50
+
+def test_upgrade_past_its_deadline_never_calls_the_strong_model(loader, knowledge_base, metrics, monkeypatch):
+    monkeypatch.setattr(config, 'ROUTER_UPGRADE_DEADLINE_MS', 0)
+    engine = routed_engine(loader, knowledge_base)
+    result = engine.query(first_chunk_text(engine))
+
+    assert (result['model'], result['answer']) == (config.LLM_MODEL_FAST, "Fast answer.")
+    assert 'llm_upgrade_total_ms' not in result['timings']
+    assert f'rag_queries_total{{model="{config.LLM_MODEL_FAST}",outcome="generated"}} 1' in metrics.render()
+
+def test_question_with_no_context_goes_to_the_fast_model(loader, knowledge_base, metrics):
+    engine = routed_engine(loader, knowledge_base)
+    result = engine.query("kubernetes?")
+
+    assert result['sources'] == []
+    assert (result['model'], result['answer']) == (config.LLM_MODEL_FAST, "Fast answer.")
+    assert 'llm_upgrade_total_ms' not in result['timings']
+
+def test_unrecorded_queries_stay_out_of_the_answer_cache(loader, knowledge_base, metrics):
+    cache = AnswerCache()
+    engine = make_engine(loader, knowledge_base, answer_cache=cache)
+    question = first_chunk_text(engine)
+
+    engine.query(question, record=False)
+    assert cache.stats()['misses'] == 0 and cache.stats()['entries'] == 0
+    assert 'rag_queries_total{' not in metrics.render()
+
+    engine.query(question)
+    assert engine.query(question)['cached'] == 'exact'
+    assert cache.stats()['misses'] == 1
+
+def docs(engine, count):
+    docstore, ids = engine.vectorstore.docstore, engine.vectorstore.index_to_docstore_id
+    return [docstore.search(ids[position]) for position in range(count)]
+
+def test_fusion_drops_weak_matches_and_ranks_by_both_lists(loader, knowledge_base):
+    engine = make_engine(loader, knowledge_base)
+    d = docs(engine, 5)
+    dense = [(d[0], 0.9), (d[1], 0.8), (d[2], 0.5)]
+    lexical = [{'id': d[1].id, 'coverage': 1.0}, {'id': d[3].id, 'coverage': 0.6}, {'id': d[4].id, 'coverage': 0.3}]
+
+    fused = engine.fuse(lexical, dense)
+    assert [(doc.id, score) for doc, score in fused] == [(d[1].id, 0.8), (d[0].id, 0.9), (d[3].id, None)]
+
+def test_confident_lexical_hit_needs_full_coverage_and_a_clear_lead(loader, knowledge_base):
+    engine = make_engine(loader, knowledge_base)
+    assert engine.is_confident_lexical_hit([{'coverage': 1.0, 'score': 9.0}])
+    assert engine.is_confident_lexical_hit([{'coverage': 1.0, 'score': 9.0}, {'coverage': 1.0, 'score': 4.0}])
+    assert not engine.is_confident_lexical_hit([{'coverage': 1.0, 'score': 9.0}, {'coverage': 1.0, 'score': 5.0}])
+    assert not engine.is_confident_lexical_hit([{'coverage': 0.5, 'score': 9.0}])
+    assert not engine.is_confident_lexical_hit([])
+
+def test_confident_keyword_match_skips_the_query_embedding(loader, knowledge_base, metrics, monkeypatch):
+    monkeypatch.setattr(config, 'LEXICAL_SKIP_RATIO', 1.0)
+    engine = make_engine(loader, knowledge_base)
+    searches = count_searches(engine, monkeypatch)
+    calls = engine.vectorstore.embeddings.calls
+
+    result = engine.query(' '.join(tokenize(first_chunk_text(engine))[:2]))
+    assert engine.vectorstore.embeddings.calls == calls and searches == []
+    assert result['sources'][0]['title'] == "Essay 0"
+
+def test_confidence_follows_retrieval_scores(loader, knowledge_base):
+    engine = make_engine(loader, knowledge_base)
+    d = docs(engine, 2)
+    assert engine.calculate_confidence([(d[0], 0.9), (d[1], 0.7)]) == 87.0
+    hits = [{'coverage': 1.0, 'score': 10.0}, {'coverage': 1.0, 'score': 4.0}]
+    assert engine.calculate_confidence([(d[0], None)], hits, keyword_match=True) == 74.0
+    assert engine.calculate_confidence([(d[0], None)], [{'coverage': 0.5, 'score': 3.0}]) == 20.0
+    assert engine.calculate_confidence([]) == 0.0
+
+def test_distances_become_cosine_similarity(loader, knowledge_base, metrics, monkeypatch):
+    monkeypatch.setattr(config, 'LEXICAL_SKIP_RATIO', float('inf'))
+    engine = make_engine(loader, knowledge_base)
+    assert engine.similarity(0.0) == 1.0 and engine.similarity(2.0) == 0.0
+
+    # A chunk searched with its own text is the top hit at similarity ~1.
+    result = engine.query(first_chunk_text(engine))
+    assert result['confidence'] > 90
+    assert engine.query("kubernetes blockchain")['confidence'] == 0.0
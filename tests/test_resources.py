@@ -0,0 +1,54 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+import pytest
+import config
+from conftest import make_essay
+from resources import ResourceCache
+
+@pytest.fixture
+def resources(knowledge_base, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'ANSWER_CACHE_PATH', None)
+    monkeypatch.setattr(config, 'WARM_ANSWERS_PATH', str(tmp_path / 'warm_answers.jsonl'))
+    return ResourceCache(None, vectorstore_path=knowledge_base)
+
+def test_signature_is_the_current_version(resources, knowledge_base, loader, write_essays):
+    path = Path(knowledge_base)
+    signature = resources.shard_signature(path)
+    assert signature == os.readlink(path)
+
+    loader.build_knowledge_base(write_essays([make_essay(i) for i in range(3)]), knowledge_base, questions=False)
+    assert resources.shard_signature(path) not in (None, signature)
+
+def test_signature_of_unversioned_or_missing_index(resources, knowledge_base, tmp_path):
+    plain = tmp_path / 'plain'
+    shutil.copytree(Path(knowledge_base).resolve(), plain)
+    assert [name for name, _, _ in resources.shard_signature(plain)] == sorted(file.name for file in plain.iterdir())
+    assert resources.shard_signature(tmp_path / 'missing') is None
+
+def test_failed_warm_up_backs_off(resources, monkeypatch):
+    import resources as resources_module
+    attempts = []
+    def warm_up(*args):
+        attempts.append(1)
+        raise RuntimeError("quota exceeded")
+    monkeypatch.setattr(resources_module, 'warm_up', warm_up)
+    monkeypatch.setattr(resources_module, 'load_warmup_questions', lambda: [])
+
+    def start_and_wait():
+        threads = set(threading.enumerate())
+        resources.start_warm_up()
+        for thread in set(threading.enumerate()) - threads:
+            thread.join()
+
+    monkeypatch.setattr(config, 'WARMUP_RETRY_SECONDS', 600)
+    start_and_wait()
+    start_and_wait()
+    assert len(attempts) == 1
+
+    monkeypatch.setattr(config, 'WARMUP_RETRY_SECONDS', 0)
+    resources._warm_up_retry_at.clear()
+    start_and_wait()
+    start_and_wait()
+    assert len(attempts) == 3
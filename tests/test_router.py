@@ -0,0 +1,31 @@
+from langchain_core.documents import Document
+from utils.router import ModelRouter
+
+def results(*scores):
+    return [(Document(page_content=f"chunk {i}"), score) for i, score in enumerate(scores)]
+
+def router(**kwargs):
+    return ModelRouter('strong', 'fast', confident_score=0.8, min_spread=0.05, long_question_words=10, **kwargs)
+
+def test_clear_match_goes_to_fast_model():
+    decision = router().route("How do I find product-market fit?", results(0.9, 0.7, 0.7))
+    assert (decision['model'], decision['reason'], decision['speculative']) == ('fast', 'clear_match', False)
+
+def test_close_scores_go_to_strong_model():
+    decision = router().route("How do I find product-market fit?", results(0.85, 0.84, 0.83))
+    assert (decision['model'], decision['reason']) == ('strong', 'ambiguous_retrieval')
+    assert decision['speculative']
+
+def test_long_or_multi_part_questions_go_to_strong_model():
+    assert router().route("one two three four five six seven eight nine ten eleven", results(0.95))['reason'] == 'long_question'
+    assert router().route("Why? And how?", results(0.95))['reason'] == 'long_question'
+
+def test_keyword_match_only_when_flagged():
+    keyword_docs = results(None, None)
+    assert router().route("ramen profitable", keyword_docs, keyword_match=True)['reason'] == 'keyword_match'
+    decision = router().route("ramen profitable", keyword_docs)
+    assert (decision['model'], decision['reason']) == ('fast', 'no_context')
+
+def test_no_context_goes_to_fast_model_without_upgrade():
+    decision = router().route("anything?", [])
+    assert (decision['model'], decision['reason'], decision['speculative']) == ('fast', 'no_context', False)
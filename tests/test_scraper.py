@@ -0,0 +1,109 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from utils.scraper import CrawlState, EssayCrawler, extract_text
+
+PARAGRAPH = " ".join(["Startups are about growth."] * 20)
+PAGES = {
+    '/articles.html': ('<a href="growth.html">Startup = Growth</a> <a href="ideas.html">Startup Ideas</a>'
+                       '<a href="articles.html">Essays</a>'),
+    '/growth.html': f'<font>{PARAGRAPH}<br><br>Second paragraph.</font>',
+    '/ideas.html': f'<p>{PARAGRAPH}</p><p>Look for problems.</p>',
+}
+ETAG = '"v1"'
+LAST_MODIFIED = 'Wed, 01 Jan 2025 00:00:00 GMT'
+
+# Serves PAGES with an ETag on growth.html and a Last-Modified date on
+# ideas.html, answering matching conditional requests with 304.
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path not in PAGES:
+            self.send_response(404)
+            self.end_headers()
+            return
+        validator = ('ETag', ETAG) if self.path == '/growth.html' else ('Last-Modified', LAST_MODIFIED)
+        if self.headers.get('If-None-Match') == ETAG or self.headers.get('If-Modified-Since') == LAST_MODIFIED:
+            self.send_response(304)
+            self.send_header(*validator)
+            self.end_headers()
+            return
+        body = PAGES[self.path].encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header(*validator)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def crawler(server, state_path, max_age=None):
+    return EssayCrawler(
+        essays_url=f"http://127.0.0.1:{server.server_port}/articles.html",
+        state_path=state_path,
+        workers=2,
+        rate_per_second=None,
+        retries=0,
+        max_age=max_age,
+        extract_workers=1
+    )
+
+def essay_requests(server):
+    return [(path, headers) for path, headers in server.requests if path != '/articles.html']
+
+def test_first_crawl_fetches_and_records_every_essay(server, tmp_path):
+    state_path = tmp_path / 'crawl_state.jsonl'
+    essays = crawler(server, state_path).crawl()
+
+    assert sorted(essay['title'] for essay in essays) == ['Startup = Growth', 'Startup Ideas']
+    growth = next(essay for essay in essays if essay['title'] == 'Startup = Growth')
+    assert growth['content'].endswith("Startups are about growth.\n\nSecond paragraph.")
+    assert growth['source'] == 'Paul Graham Essays'
+
+    state = CrawlState(state_path)
+    assert state.get(growth['url'])['etag'] == ETAG
+    assert state.get(growth['url'].replace('growth', 'ideas'))['last_modified'] == LAST_MODIFIED
+
+def test_recrawl_revalidates_and_keeps_content_on_304(server, tmp_path):
+    state_path = tmp_path / 'crawl_state.jsonl'
+    first = crawler(server, state_path).crawl()
+    server.requests.clear()
+
+    second = crawler(server, state_path, max_age=0).crawl()
+
+    sent = {path: headers for path, headers in essay_requests(server)}
+    assert sent['/growth.html']['If-None-Match'] == ETAG
+    assert sent['/ideas.html']['If-Modified-Since'] == LAST_MODIFIED
+    assert sorted(essay['content'] for essay in second) == sorted(essay['content'] for essay in first)
+
+def test_resumed_crawl_reuses_fresh_pages(server, tmp_path):
+    state_path = tmp_path / 'crawl_state.jsonl'
+    crawler(server, state_path).crawl()
+    # An interrupted write leaves a torn last line behind.
+    with open(state_path, 'a', encoding='utf-8') as f:
+        f.write('{"url": "http://127.0.0.1/torn')
+    server.requests.clear()
+
+    essays = crawler(server, state_path, max_age=3600).crawl()
+
+    assert len(essays) == 2
+    assert essay_requests(server) == []
+    with open(state_path, 'r', encoding='utf-8') as f:
+        assert len([json.loads(line) for line in f]) == 2
+
+def test_extract_text_reads_nested_tags_once():
+    html = '<font><p>First paragraph.</p><p>Second <font>with nested</font> text.<br>Next line.</p></font>'
+    assert extract_text(html) == "First paragraph.\n\nSecond with nested text.\nNext line."
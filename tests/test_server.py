@@ -0,0 +1,102 @@
+import asyncio
+import json
+import pytest
+from tornado.testing import AsyncHTTPTestCase
+from server import ConcurrencyLimiter, Overloaded, make_app
+
+class StubEngine:
+    def __init__(self, frames, error=None):
+        self.frames = frames
+        self.error = error
+
+    async def astream_query(self, question, memory=None, sources=None):
+        for frame in self.frames:
+            yield frame
+        if self.error:
+            raise self.error
+
+class StubResources:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def is_loaded(self, model=None):
+        return True
+
+    def get_engine(self, model):
+        return self.engine
+
+FRAMES = [{'type': 'meta', 'model': 'm'}, {'type': 'token', 'text': 'Hi'}, {'type': 'done', 'answer': 'Hi'}]
+
+def parse_events(body):
+    events = []
+    for block in body.decode('utf-8').strip().split('\n\n'):
+        event, data = block.split('\n')
+        events.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+    return events
+
+def test_limiter_queues_then_rejects():
+    async def main():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        first = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert (limiter.active, limiter.waiting) == (1, 1)
+
+        with pytest.raises(Overloaded):
+            async with limiter.slot():
+                pass
+
+        release.set()
+        await asyncio.gather(first, queued)
+        assert (limiter.active, limiter.waiting) == (0, 0)
+
+    asyncio.run(main())
+
+class ServerTest(AsyncHTTPTestCase):
+    engine = StubEngine(FRAMES)
+    max_concurrency = 2
+
+    def get_app(self):
+        self.limiter = ConcurrencyLimiter(self.max_concurrency, max_queue=0)
+        return make_app(StubResources(self.engine), self.limiter)
+
+    def post(self, path, body):
+        return self.fetch(path, method='POST', body=json.dumps(body))
+
+class TestStream(ServerTest):
+    def test_streams_frames_as_events(self):
+        response = self.post('/stream', {'question': "What is default alive?"})
+        assert response.code == 200
+        assert response.headers['Content-Type'] == 'text/event-stream'
+        assert parse_events(response.body) == [(frame['type'], frame) for frame in FRAMES]
+        assert self.limiter.active == 0
+
+    def test_rejects_bad_requests(self):
+        assert self.post('/stream', {}).code == 400
+        assert self.post('/stream', {'question': "Hi", 'model': 'gpt'}).code == 400
+
+class TestStreamFailure(ServerTest):
+    engine = StubEngine(FRAMES[:2], error=RuntimeError("model went away"))
+
+    def test_failure_after_first_event_ends_with_error_event(self):
+        response = self.post('/stream', {'question': "What is default alive?"})
+        assert response.code == 200
+        events = parse_events(response.body)
+        assert [event for event, _ in events] == ['meta', 'token', 'error']
+        assert 'model went away' not in response.body.decode('utf-8')
+
+class TestOverloaded(ServerTest):
+    max_concurrency = 0
+
+    def test_rejects_with_retry_after(self):
+        response = self.post('/stream', {'question': "What is default alive?"})
+        assert response.code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert self.post('/query', {'question': "What is default alive?"}).code == 503
@@ -0,0 +1,64 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from conftest import make_essay
+from utils.shards import Shard, ShardedDocstore, ShardedLexicalIndex, ShardedVectorStore
+
+SOURCES = ['Paul Graham Essays', 'YC Blog']
+
+@pytest.fixture
+def corpus(loader, write_essays, tmp_path):
+    essays = [dict(make_essay(i), source=SOURCES[i % 2]) for i in range(6)]
+    shards = []
+    for source in SOURCES:
+        path = tmp_path / source.replace(' ', '_')
+        loader.build_knowledge_base(write_essays([e for e in essays if e['source'] == source], f"{path.name}.jsonl"),
+                                    str(path), questions=False)
+        shards.append(Shard(source, source, path, loader.load_vectorstore(str(path)), loader.load_lexical_index(str(path))))
+    combined = loader.build_knowledge_base(write_essays(essays, 'all.jsonl'), str(tmp_path / 'all'), questions=False)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield shards, combined, pool
+
+def query_vector(loader, store, position):
+    return loader.embeddings.embed_query(store.docstore.search(store.index_to_docstore_id[position]).page_content)
+
+def test_fan_out_matches_a_single_index(loader, corpus):
+    shards, combined, pool = corpus
+    sharded = ShardedVectorStore(shards, pool)
+    vector = query_vector(loader, combined, 5)
+
+    hits = sharded.similarity_search_with_score_by_vector(vector, k=5)
+    expected = combined.similarity_search_with_score_by_vector(vector, k=5)
+    assert [doc.id for doc, _ in hits] == [doc.id for doc, _ in expected]
+    assert np.allclose([score for _, score in hits], [score for _, score in expected], atol=1e-5)
+
+    async_hits = asyncio.run(sharded.asimilarity_search_with_score_by_vector(vector, k=5))
+    assert [doc.id for doc, _ in async_hits] == [doc.id for doc, _ in hits]
+
+    docs = [doc for doc, _ in hits]
+    assert [sharded.docstore.search(doc.id).page_content for doc in docs] == [doc.page_content for doc in docs]
+    assert sharded.chunk_vectors(docs).shape == (5, 32)
+
+def test_source_filter_skips_other_shards(loader, corpus, monkeypatch):
+    shards, combined, pool = corpus
+    def untouched(*args, **kwargs):
+        raise AssertionError("searched a shard outside the filter")
+    monkeypatch.setattr(shards[0].vectorstore, 'similarity_search_with_score_by_vector', untouched)
+    sharded = ShardedVectorStore(shards, pool)
+
+    hits = sharded.similarity_search_with_score_by_vector(query_vector(loader, combined, 0), k=4,
+                                                          filter={'source': ['YC Blog']})
+    assert hits and all(doc.metadata['source'] == 'YC Blog' for doc, _ in hits)
+
+def test_lexical_search_merges_and_filters_shards(corpus):
+    shards, _, _ = corpus
+    index, docstore = ShardedLexicalIndex(shards), ShardedDocstore(shards)
+    def titles(hits):
+        return {docstore.search(hit['id']).metadata['title'] for hit in hits}
+
+    # The w1_* and w2_* words only occur in essays 1 and 2, which are in different shards.
+    hits = index.search("w1 w2", k=20)
+    assert titles(hits) == {"Essay 1", "Essay 2"}
+    assert [hit['score'] for hit in hits] == sorted((hit['score'] for hit in hits), reverse=True)
+    assert titles(index.search("w1 w2", k=20, sources=['YC Blog'])) == {"Essay 1"}
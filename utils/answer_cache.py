@@ -0,0 +1,214 @@
+import atexit
+import base64
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+
+def normalize_question(question):
+    words = re.findall(r"[a-z0-9]+(?:['-][a-z0-9]+)*", question.lower())
+    return ' '.join(words)
+
+def encode_vector(vector):
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode('ascii')
+
+def decode_vector(data):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+# The normalized question vectors of one namespace as rows of a matrix that
+# doubles when full, so a semantic lookup is a single matrix-vector product.
+# A removed row is filled with the last one to keep the rows contiguous.
+class NamespaceVectors:
+    def __init__(self, dim, capacity=64):
+        self.matrix = np.empty((capacity, dim), dtype=np.float32)
+        self.keys = []
+        self.rows = {}
+
+    def add(self, key, vector):
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.matrix):
+                self.matrix = np.concatenate([self.matrix, np.empty_like(self.matrix)])
+            self.keys.append(key)
+            self.rows[key] = row
+        self.matrix[row] = vector
+
+    def remove(self, key):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        last_key = self.keys.pop()
+        if last_key != key:
+            self.matrix[row] = self.matrix[len(self.keys)]
+            self.keys[row] = last_key
+            self.rows[last_key] = row
+
+    def scores(self, vector):
+        return self.matrix[:len(self.keys)] @ vector
+
+# Two-level answer cache in front of RAGEngine. Entries live in a namespace
+# of (model, index version), so switching models or rebuilding the index
+# never serves an answer produced against something else.
+class AnswerCache:
+    def __init__(self, max_entries=1000, ttl=None, similarity_threshold=0.95, path=None, save_interval=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.path = Path(path) if path else None
+        self.save_interval = save_interval
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._vectors = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._last_save = time.monotonic()
+        self._dirty = False
+
+        if self.path and self.path.exists():
+            self.load()
+        if self.path:
+            # Entries stored since the last periodic save would otherwise be
+            # lost when the process exits.
+            atexit.register(self.save)
+
+    def _key(self, namespace, question):
+        return '\0'.join([*namespace, normalize_question(question)])
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry['created_at'] > self.ttl
+
+    def _add(self, key, entry):
+        namespace = tuple(entry['namespace'])
+        if entry['vector'] is not None:
+            vectors = self._vectors.get(namespace)
+            if vectors is None:
+                vectors = self._vectors[namespace] = NamespaceVectors(len(entry['vector']))
+            vectors.add(key, entry['vector'])
+        elif namespace in self._vectors:
+            self._vectors[namespace].remove(key)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        if entry['vector'] is not None:
+            self._vectors[tuple(entry['namespace'])].remove(key)
+
+    def lookup(self, question, namespace):
+        key = self._key(namespace, question)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits_exact += 1
+            return entry['result']
+
+    def lookup_similar(self, vector, namespace):
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        now = time.time()
+
+        with self._lock:
+            vectors = self._vectors.get(tuple(namespace))
+            if vectors is None or not vectors.keys:
+                return None
+            scores = vectors.scores(vector)
+            matches = np.flatnonzero(scores >= self.similarity_threshold)
+            keys = [vectors.keys[row] for row in matches[np.argsort(-scores[matches])]]
+            # The closest entry that has not expired; expired ones go.
+            for key in keys:
+                entry = self._entries[key]
+                if not self._expired(entry, now):
+                    self._entries.move_to_end(key)
+                    self.hits_semantic += 1
+                    return entry['result']
+                self._remove(key)
+            return None
+
+    # Called by the caller once per question that no lookup answered, so a
+    # question tried at both levels and for several models is one miss.
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def store(self, question, vector, result, namespace):
+        if vector is not None:
+            vector = np.asarray(vector, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+
+        with self._lock:
+            key = self._key(namespace, question)
+            self._add(key, {
+                'namespace': list(namespace),
+                'question': question,
+                'vector': vector,
+                'result': result,
+                'created_at': time.time()
+            })
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._dirty = True
+
+    # Saving is left to the caller so async callers can run it off the event
+    # loop.
+    def save_due(self):
+        return bool(self.path) and self._dirty and time.monotonic() - self._last_save >= self.save_interval
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            self._dirty = True
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        with self._lock:
+            for key, entry in data['entries']:
+                if entry['vector'] is not None:
+                    entry['vector'] = decode_vector(entry['vector'])
+                self._add(key, entry)
+
+    def save(self):
+        if not self.path:
+            return
+
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [
+                [key, dict(entry, vector=None if entry['vector'] is None else encode_vector(entry['vector']))]
+                for key, entry in self._entries.items()
+            ]
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        with self._save_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'entries': entries}, f, ensure_ascii=False)
+            tmp_path.replace(self.path)
+
+    def stats(self):
+        lookups = self.hits_exact + self.hits_semantic + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits_exact': self.hits_exact,
+            'hits_semantic': self.hits_semantic,
+            'misses': self.misses,
+            'hit_rate': round((self.hits_exact + self.hits_semantic) / lookups, 3) if lookups else 0.0
+        }
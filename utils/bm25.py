@@ -0,0 +1,117 @@
+import json
+from collections import Counter, defaultdict
+from pathlib import Path
+import numpy as np
+from utils.text import tokenize
+
+# Okapi BM25 over chunk texts, stored as CSR-style postings: the postings of
+# term t are doc_ids[offsets[t]:offsets[t + 1]] with matching term
+# frequencies in tfs. Scoring a query touches only the postings of its
+# terms, so lexical lookups stay local and sub-millisecond.
+class BM25Index:
+    def __init__(self, terms, chunk_ids, offsets, doc_ids, tfs, doc_lengths, k1=1.5, b=0.75):
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.chunk_ids = chunk_ids
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+
+        num_docs = len(chunk_ids)
+        doc_freqs = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        average_length = float(doc_lengths.mean()) if num_docs else 1.0
+        self.length_norm = (k1 * (1 - b + b * doc_lengths / average_length)).astype(np.float32)
+
+    @classmethod
+    def build(cls, items, k1=1.5, b=0.75):
+        chunk_ids = []
+        doc_lengths = []
+        postings = defaultdict(list)
+
+        for doc_id, (chunk_id, text) in enumerate(items):
+            counts = Counter(tokenize(text))
+            chunk_ids.append(chunk_id)
+            doc_lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                postings[term].append((doc_id, count))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+
+        doc_ids = np.empty(offsets[-1], dtype=np.uint32)
+        tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            entries = np.array(postings[term], dtype=np.int64)
+            doc_ids[offsets[i]:offsets[i + 1]] = entries[:, 0]
+            tfs[offsets[i]:offsets[i + 1]] = np.minimum(entries[:, 1], np.iinfo(np.uint16).max)
+
+        return cls(terms, chunk_ids, offsets, doc_ids, tfs, np.array(doc_lengths, dtype=np.uint32), k1, b)
+
+    def save(self, path):
+        path = Path(path)
+        np.savez(
+            path / 'bm25.npz',
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            doc_lengths=self.doc_lengths
+        )
+        with open(path / 'bm25_vocab.json', 'w', encoding='utf-8') as f:
+            json.dump({'terms': self.terms, 'chunk_ids': self.chunk_ids, 'k1': self.k1, 'b': self.b}, f)
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        if not (path / 'bm25.npz').exists():
+            return None
+
+        arrays = np.load(path / 'bm25.npz')
+        with open(path / 'bm25_vocab.json', 'r', encoding='utf-8') as f:
+            vocab = json.load(f)
+        return cls(
+            vocab['terms'],
+            vocab['chunk_ids'],
+            arrays['offsets'],
+            arrays['doc_ids'],
+            arrays['tfs'],
+            arrays['doc_lengths'],
+            vocab['k1'],
+            vocab['b']
+        )
+
+    def search(self, query, k=10):
+        # Coverage counts every distinct query term, so terms the corpus
+        # never uses (or misspellings) lower it instead of being ignored.
+        tokens = list(dict.fromkeys(tokenize(query)))
+        query_terms = [self.vocab[term] for term in tokens if term in self.vocab]
+        if not query_terms:
+            return []
+
+        scores = np.zeros(len(self.chunk_ids), dtype=np.float32)
+        matched = np.zeros(len(self.chunk_ids), dtype=np.uint8)
+        for term in query_terms:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            scores[docs] += self.idf[term] * tf * (self.k1 + 1) / (tf + self.length_norm[docs])
+            matched[docs] += 1
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        return [
+            {
+                'id': self.chunk_ids[doc],
+                'score': float(scores[doc]),
+                'coverage': float(matched[doc]) / len(tokens)
+            }
+            for doc in candidates
+        ]
@@ -0,0 +1,128 @@
+import json
+from collections.abc import Mapping
+from pathlib import Path
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+# On-disk layout, next to index.faiss:
+#   chunks.bin           every chunk text, UTF-8, back to back
+#   chunk_offsets.npy    byte offset of chunk i is offsets[i], ends at offsets[i + 1]
+#   chunk_ids.npy        chunk id per FAISS position
+#   chunk_id_order.npy   positions ordered by chunk id, for binary search
+#   chunk_metadata.npy   row of metadata.json each chunk uses
+#   metadata.json        distinct metadata rows, stored column by column
+# Everything is memory-mapped on load, so opening a store costs a few page
+# faults and all processes serving the same files share the page cache.
+
+def write_chunk_store(path, index_to_docstore_id, docstore):
+    path = Path(path)
+    offsets = [0]
+    chunk_ids = []
+    metadata_rows = {}
+    metadata_keys = []
+    chunk_metadata = []
+
+    with open(path / 'chunks.bin', 'wb') as f:
+        for position in range(len(index_to_docstore_id)):
+            chunk_id = index_to_docstore_id[position]
+            doc = docstore.search(chunk_id)
+            text = doc.page_content.encode('utf-8')
+            f.write(text)
+            offsets.append(offsets[-1] + len(text))
+            chunk_ids.append(chunk_id.encode('utf-8'))
+
+            for key in doc.metadata:
+                if key not in metadata_keys:
+                    metadata_keys.append(key)
+            row = tuple(sorted(doc.metadata.items()))
+            chunk_metadata.append(metadata_rows.setdefault(row, len(metadata_rows)))
+
+    ids = np.array(chunk_ids, dtype=bytes) if chunk_ids else np.array([], dtype='S1')
+    order = np.argsort(ids, kind='stable')
+    np.save(path / 'chunk_offsets.npy', np.array(offsets, dtype=np.int64))
+    np.save(path / 'chunk_ids.npy', ids)
+    np.save(path / 'chunk_id_order.npy', order.astype(np.int64))
+    np.save(path / 'chunk_metadata.npy', np.array(chunk_metadata, dtype=np.int32))
+
+    columns = {key: [] for key in metadata_keys}
+    for row in metadata_rows:
+        values = dict(row)
+        for key in metadata_keys:
+            columns[key].append(values.get(key))
+    with open(path / 'metadata.json', 'w', encoding='utf-8') as f:
+        json.dump({'columns': columns}, f)
+
+def has_chunk_store(path):
+    return (Path(path) / 'chunks.bin').exists()
+
+class ChunkStore:
+    def __init__(self, path):
+        path = Path(path)
+        self.offsets = np.load(path / 'chunk_offsets.npy', mmap_mode='r')
+        self.ids = np.load(path / 'chunk_ids.npy', mmap_mode='r')
+        self.id_order = np.load(path / 'chunk_id_order.npy', mmap_mode='r')
+        self.metadata_rows = np.load(path / 'chunk_metadata.npy', mmap_mode='r')
+        self.blob = np.memmap(path / 'chunks.bin', dtype=np.uint8, mode='r') if self.offsets[-1] else b''
+        with open(path / 'metadata.json', 'r', encoding='utf-8') as f:
+            columns = json.load(f)['columns']
+        self.metadata = [
+            {key: values[row] for key, values in columns.items() if values[row] is not None}
+            for row in range(len(next(iter(columns.values()), [])))
+        ]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def chunk_id(self, position):
+        return self.ids[position].decode('utf-8')
+
+    def position(self, chunk_id):
+        key = chunk_id.encode('utf-8')
+        # Binary search over the ids in sorted order without materializing them.
+        low, high = 0, len(self.id_order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.ids[self.id_order[middle]] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.id_order) and self.ids[self.id_order[low]] == key:
+            return int(self.id_order[low])
+        return None
+
+    def document(self, position):
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return Document(
+            id=self.chunk_id(position),
+            page_content=bytes(self.blob[start:end]).decode('utf-8'),
+            metadata=dict(self.metadata[self.metadata_rows[position]])
+        )
+
+# Read-only views LangChain's FAISS wrapper can use in place of its
+# InMemoryDocstore and index_to_docstore_id dict: Documents are only built
+# for the hits a search actually returns.
+class ChunkDocstore(Docstore):
+    def __init__(self, store):
+        self.store = store
+
+    def search(self, search):
+        position = self.store.position(search)
+        if position is None:
+            return f"ID {search} not found."
+        return self.store.document(position)
+
+class ChunkIds(Mapping):
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self.store):
+            raise KeyError(position)
+        return self.store.chunk_id(position)
+
+    def __len__(self):
+        return len(self.store)
+
+    def __iter__(self):
+        return iter(range(len(self.store)))
@@ -0,0 +1,124 @@
+import re
+import numpy as np
+from utils.chunk_store import ChunkDocstore
+from utils.faiss_index import reconstruct_vectors
+from utils.text import estimate_tokens
+
+CHUNK_ID_RE = re.compile(r'^(?P<essay>[0-9a-f]{16})-(?P<seq>\d+)$')
+
+def chunk_position(doc):
+    # Chunk ids are "<essay key>-<chunk number>" (see data_loader.split_essay).
+    match = CHUNK_ID_RE.match(doc.id or '')
+    if match is None:
+        return None
+    return match['essay'], int(match['seq'])
+
+def merge_text(first, second, max_overlap):
+    # The splitter repeats the tail of a chunk at the head of the next one.
+    # Only overlaps that start and end on a word boundary count, so a
+    # chance match of a few letters is not swallowed.
+    for size in range(min(len(first), len(second), max_overlap), 0, -1):
+        if (first.endswith(second[:size])
+                and (size == len(first) or first[-size - 1].isspace())
+                and (size == len(second) or second[size].isspace())):
+            return first + second[size:]
+    return first + ' ' + second
+
+# Turns ranked retrieval results into the prompt context: picks chunks by
+# maximal marginal relevance within a token budget, using the vectors already
+# stored in the FAISS index, then stitches neighbouring chunks of the same
+# essay back together so their overlap is only sent once.
+class ContextBuilder:
+    def __init__(self, vectorstore, token_budget, max_chunks, mmr_lambda=0.7, max_overlap=200):
+        self.vectorstore = vectorstore
+        self.token_budget = token_budget
+        self.max_chunks = max_chunks
+        self.mmr_lambda = mmr_lambda
+        self.max_overlap = max_overlap
+        self._positions = None
+
+    def positions(self, docs):
+        docstore = self.vectorstore.docstore
+        if isinstance(docstore, ChunkDocstore):
+            return [docstore.store.position(doc.id) for doc in docs]
+        if self._positions is None:
+            self._positions = {doc_id: position for position, doc_id in self.vectorstore.index_to_docstore_id.items()}
+        return [self._positions.get(doc.id) for doc in docs]
+
+    def chunk_vectors(self, docs):
+        if hasattr(self.vectorstore, 'chunk_vectors'):
+            # A ShardedVectorStore looks each chunk up in its own shard.
+            vectors = self.vectorstore.chunk_vectors(docs)
+            if vectors is None:
+                return None
+        else:
+            positions = self.positions(docs)
+            if None in positions:
+                return None
+            vectors = reconstruct_vectors(self.vectorstore.index, positions)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def select(self, docs, query_vector, token_budget=None):
+        costs = [estimate_tokens(doc.page_content) for doc in docs]
+        vectors = self.chunk_vectors(docs) if query_vector is not None and len(docs) > 1 else None
+        if vectors is not None:
+            query = np.asarray(query_vector, dtype=np.float32)
+            relevance = vectors @ (query / (np.linalg.norm(query) or 1.0))
+            similarity = vectors @ vectors.T
+
+        selected = []
+        remaining = self.token_budget if token_budget is None else token_budget
+        candidates = list(range(len(docs)))
+        while candidates and len(selected) < self.max_chunks:
+            if vectors is None:
+                # No query vector (keyword-only retrieval): keep rank order.
+                best = candidates[0]
+            else:
+                redundancy = similarity[np.ix_(candidates, selected)].max(axis=1) if selected else 0.0
+                scores = self.mmr_lambda * relevance[candidates] - (1 - self.mmr_lambda) * redundancy
+                best = candidates[int(np.argmax(scores))]
+            candidates.remove(best)
+            if costs[best] <= remaining:
+                selected.append(best)
+                remaining -= costs[best]
+        return selected
+
+    def merge(self, docs):
+        # Grouped per essay in order of each essay's best-ranked chunk.
+        groups = {}
+        for doc in docs:
+            position = chunk_position(doc)
+            key = position[0] if position else doc.id or id(doc)
+            groups.setdefault(key, []).append((position[1] if position else None, doc.page_content))
+
+        passages = []
+        seen = set()
+        for chunks in groups.values():
+            if all(seq is not None for seq, _ in chunks):
+                chunks.sort()
+            previous_seq, text = chunks[0]
+            for seq, content in chunks[1:]:
+                if seq is not None and previous_seq is not None and seq == previous_seq + 1:
+                    text = merge_text(text, content, self.max_overlap)
+                else:
+                    passages.append(text)
+                    text = content
+                previous_seq = seq
+            passages.append(text)
+        return [passage for passage in passages if not (passage in seen or seen.add(passage))]
+
+    def build(self, results, query_vector=None, token_budget=None):
+        docs = [doc for doc, _ in results]
+        selected = [results[i] for i in self.select(docs, query_vector, token_budget)]
+        text = "\n\n".join(self.merge([doc for doc, _ in selected]))
+
+        # Measured against what used to be sent: the raw top chunks joined.
+        naive = "\n\n".join(doc.page_content for doc in docs[:self.max_chunks])
+        tokens = estimate_tokens(text) if text else 0
+        return {
+            'text': text,
+            'results': selected,
+            'tokens': tokens,
+            'tokens_saved': max(0, (estimate_tokens(naive) if naive else 0) - tokens)
+        }
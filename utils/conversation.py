@@ -0,0 +1,126 @@
+import json
+import re
+from collections import deque
+from utils.text import estimate_tokens, tokenize
+import config
+
+FOLLOW_UP_RE = re.compile(r"^\s*(?:and|but|also|so|then|ok(?:ay)?|what about|how about|what if|same for)\b[\s,]*", re.I)
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+REWRITE_PROMPT = """Rewrite the follow-up question so it can be understood without the conversation.
+Keep it short and reply with the rewritten question only.
+
+{conversation}
+
+Follow-up question: {question}
+Standalone question:"""
+
+def first_sentence(text, max_chars):
+    sentence = SENTENCE_RE.split(text.strip(), 1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rsplit(' ', 1)[0] + '…'
+
+# What a chat session remembers: the last few turns, compacted (answers
+# clipped, sources reduced to titles), plus a one-line-per-turn summary of
+# older ones. Older summary lines are dropped once the summary is full, so
+# memory and the conversation block in the prompt stay the same size however
+# long the session runs.
+class ConversationMemory:
+    def __init__(self, max_turns=config.MEMORY_MAX_TURNS, max_tokens=config.MEMORY_TOKEN_BUDGET,
+                 max_bytes=config.MEMORY_MAX_BYTES, answer_chars=config.MEMORY_ANSWER_CHARS,
+                 summary_chars=config.MEMORY_SUMMARY_CHARS, standalone_terms=config.MEMORY_STANDALONE_TERMS):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.max_bytes = max_bytes
+        self.answer_chars = answer_chars
+        self.summary_chars = summary_chars
+        self.standalone_terms = standalone_terms
+        self.turns = deque()
+        self.summary = deque()
+
+    @classmethod
+    def from_history(cls, history, **kwargs):
+        # history: [{'question': ..., 'answer': ...}, ...], oldest first.
+        memory = cls(**kwargs)
+        for turn in history:
+            memory.add_turn(str(turn.get('question', '')), str(turn.get('answer', '')))
+        return memory
+
+    def __len__(self):
+        return len(self.turns) + len(self.summary)
+
+    def clear(self):
+        self.turns.clear()
+        self.summary.clear()
+
+    def add_turn(self, question, answer, query=None, sources=()):
+        answer = answer.strip()
+        if len(answer) > self.answer_chars:
+            answer = answer[:self.answer_chars].rsplit(' ', 1)[0] + '…'
+        self.turns.append({
+            'question': question,
+            'query': query or question,
+            'answer': answer,
+            'sources': [source['title'] for source in sources][:3]
+        })
+        while self.turns and (len(self.turns) > self.max_turns or self.over_budget()):
+            self.fold(self.turns.popleft())
+
+    def fold(self, turn):
+        self.summary.append(f"- {turn['query']} → {first_sentence(turn['answer'], 160)}")
+        while self.summary and sum(len(line) + 1 for line in self.summary) > self.summary_chars:
+            self.summary.popleft()
+
+    def over_budget(self):
+        return (estimate_tokens(self.context_text()) > self.max_tokens
+                or len(json.dumps([list(self.turns), list(self.summary)]).encode('utf-8')) > self.max_bytes)
+
+    def context_text(self):
+        parts = []
+        if self.summary:
+            parts.append("Earlier in the conversation:\n" + '\n'.join(self.summary))
+        for turn in self.turns:
+            parts.append(f"User: {turn['question']}\nAssistant: {turn['answer']}")
+        return '\n\n'.join(parts)
+
+    @property
+    def last_query(self):
+        return self.turns[-1]['query'] if self.turns else None
+
+    def classify(self, question):
+        # Returns (kind, standalone query or None):
+        #   'standalone'  retrieve with the question as asked
+        #   'heuristic'   rewritten here by attaching it to the previous query
+        #   'ambiguous'   needs the model to resolve what it refers to
+        previous = self.last_query
+        if previous is None:
+            return 'standalone', question
+
+        terms = tokenize(question)
+        match = FOLLOW_UP_RE.match(question)
+        rest = question[match.end():].strip() if match else ''
+        if rest and len(tokenize(rest)) < self.standalone_terms:
+            # "What about for B2B?" -> "<previous question> for B2B?"; a full
+            # question after "So" or "Also" stands on its own.
+            return 'heuristic', f"{previous.rstrip(' ?.!')} {rest}"
+        if not terms:
+            # "Why?", "Can you explain more?": nothing to resolve, it is about
+            # the previous question as a whole.
+            return 'heuristic', f"{previous.rstrip(' ?.!')} {question}"
+        if len(terms) >= self.standalone_terms:
+            # Enough content words to retrieve on, even if "it" or "that"
+            # appears ("How do I know that my idea is good?").
+            return 'standalone', question
+        # "Is that true?", "How long does it take?": too little to go on.
+        return 'ambiguous', None
+
+    def rewrite_prompt(self, question):
+        last = self.turns[-1]
+        conversation = f"User: {last['question']}\nAssistant: {first_sentence(last['answer'], 300)}"
+        return REWRITE_PROMPT.format(conversation=conversation, question=question)
+
+    def fallback_query(self, question):
+        return f"{self.last_query.rstrip(' ?.!')} {question}"
+
+    def clean_rewrite(self, text, question):
+        lines = [line.strip().strip('"') for line in str(text).splitlines() if line.strip()]
+        return lines[0] if lines else self.fallback_query(question)
@@ -0,0 +1,79 @@
+import re
+import zlib
+from collections import defaultdict
+import numpy as np
+
+WORD_RE = re.compile(r"\w+")
+HASH_MASK = np.uint64(0xFFFFFFFF)
+
+def shingles(text, size=5):
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+# Near-duplicate detection with MinHash signatures over word shingles and
+# LSH banding: two chunks become candidates when any band of their
+# signatures matches, and count as duplicates when the share of equal
+# signature values (their estimated Jaccard similarity) reaches the
+# threshold. Shingles are hashed with crc32 so signatures are the same in
+# every process.
+class NearDuplicateFilter:
+    def __init__(self, threshold=0.85, num_perm=64, bands=16, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2 ** 32, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2 ** 32, num_perm, dtype=np.uint64)
+        self.buckets = [defaultdict(list) for _ in range(bands)]
+        self.signatures = []
+        self.owners = []
+        self.seen = 0
+        self.dropped = 0
+
+    def signature(self, text):
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(text, self.shingle_size)),
+            dtype=np.uint64
+        )
+        # (a * x + b) mod 2^32 for every permutation and shingle, then the
+        # minimum per permutation.
+        return ((np.outer(self.a, hashes) + self.b[:, None]) & HASH_MASK).min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, text, owner=None):
+        # Remembers the text without checking it, for chunks already indexed.
+        signature = self.signature(text)
+        self._insert(signature, self.band_keys(signature), owner)
+
+    def _insert(self, signature, keys, owner):
+        row = len(self.signatures)
+        self.signatures.append(signature)
+        self.owners.append(owner)
+        for bucket, key in zip(self.buckets, keys):
+            bucket[key].append(row)
+
+    def find(self, text, owner=None):
+        # The row of a near-duplicate seen before (whose owner is
+        # self.owners[row]); otherwise the text is remembered under `owner`
+        # and None returned.
+        self.seen += 1
+        signature = self.signature(text)
+        keys = self.band_keys(signature)
+        candidates = {row for bucket, key in zip(self.buckets, keys) for row in bucket.get(key, ())}
+        for row in sorted(candidates):
+            if np.mean(self.signatures[row] == signature) >= self.threshold:
+                self.dropped += 1
+                return row
+        self._insert(signature, keys, owner)
+        return None
+
+    def is_duplicate(self, text, owner=None):
+        return self.find(text, owner) is not None
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+import numpy as np
+
+# Disk layout, one directory per embedding model:
+#   vectors.f32  raw float32 rows, appended in insertion order
+#   keys.txt     one sha256(model, text) hex digest per line, line n == row n
+#   meta.json    model name and vector dimension
+# Vectors are read back through a memory map, so the cache costs one dict
+# entry per key in RAM regardless of how many vectors it holds. Every batch
+# is appended as soon as it arrives, so an interrupted build picks up where
+# it stopped. Safe to share between threads.
+class EmbeddingCache:
+    def __init__(self, cache_dir, model_name):
+        self.model_name = model_name
+        self.cache_dir = Path(cache_dir) / model_name.replace('/', '_')
+        self.vectors_path = self.cache_dir / 'vectors.f32'
+        self.keys_path = self.cache_dir / 'keys.txt'
+        self.meta_path = self.cache_dir / 'meta.json'
+        self.hits = 0
+        self.misses = 0
+        self._rows = None
+        self._count = 0
+        self._dim = None
+        self._mmap = None
+        self._lock = threading.RLock()
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def _load(self):
+        with self._lock:
+            if self._rows is None:
+                self._read()
+
+    def _read(self):
+        self._rows = {}
+        if not self.meta_path.exists():
+            return
+
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            self._dim = json.load(f)['dim']
+        with open(self.keys_path, 'r', encoding='utf-8') as f:
+            keys = f.read().split()
+
+        # A crash between the two appends can leave one file longer than the
+        # other; cut both back to the rows they agree on before appending.
+        row_bytes = self._dim * 4
+        count = min(len(keys), os.path.getsize(self.vectors_path) // row_bytes)
+        if count * row_bytes != os.path.getsize(self.vectors_path):
+            os.truncate(self.vectors_path, count * row_bytes)
+        if count != len(keys):
+            with open(self.keys_path, 'w', encoding='utf-8') as f:
+                f.write(''.join(f"{key}\n" for key in keys[:count]))
+
+        self._rows = {key: row for row, key in enumerate(keys[:count])}
+        self._count = count
+
+    def __len__(self):
+        self._load()
+        return len(self._rows)
+
+    def __contains__(self, key):
+        self._load()
+        return key in self._rows
+
+    def get(self, key):
+        self._load()
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            if self._mmap is None or row >= len(self._mmap):
+                self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode='r').reshape(-1, self._dim)
+            return self._mmap[row]
+
+    def add(self, keys, vectors):
+        self._load()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'model': self.model_name, 'dim': self._dim}, f)
+
+            with open(self.vectors_path, 'ab') as f:
+                vectors.tofile(f)
+            with open(self.keys_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(f"{key}\n" for key in keys))
+
+            for key in keys:
+                self._rows[key] = self._count
+                self._count += 1
+
+    def embed_documents(self, texts, embed_batch, batch_size=100):
+        # embed_batch(texts) -> vectors does the remote call, with whatever
+        # rate limiting and retries the caller wants around it.
+        keys = [self.key(text) for text in texts]
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in missing and key not in self:
+                missing[key] = text
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+
+        pending = list(missing.items())
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i:i + batch_size]
+            vectors = embed_batch([text for _, text in batch])
+            self.add([key for key, _ in batch], vectors)
+
+        if not keys:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+        return np.stack([self.get(key) for key in keys])
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
@@ -0,0 +1,94 @@
+import threading
+import faiss
+import numpy as np
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+
+# k-means wants roughly this many training points per centroid.
+POINTS_PER_CENTROID = 39
+
+_direct_map_lock = threading.Lock()
+
+def describe_index(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivf_pq'
+    if isinstance(index, faiss.IndexIVFFlat):
+        return 'ivf_flat'
+    return 'flat'
+
+def supports_remove(index):
+    # HNSW cannot remove at all, and IVF remove_ids keeps the old sequential
+    # ids, which breaks the position based docstore mapping LangChain keeps.
+    return describe_index(index) == 'flat'
+
+def min_train_size(index_type, nlist, pq_bits=8):
+    if index_type in ('flat', 'hnsw'):
+        return 0
+    size = nlist * POINTS_PER_CENTROID
+    if index_type == 'ivf_pq':
+        size = max(size, 2 ** pq_bits * POINTS_PER_CENTROID)
+    return size
+
+def create_index(dim, index_type, nlist, hnsw_m, pq_m, pq_bits):
+    if index_type == 'flat':
+        return faiss.IndexFlatL2(dim)
+    if index_type == 'hnsw':
+        return faiss.IndexHNSWFlat(dim, hnsw_m)
+
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == 'ivf_flat':
+        return faiss.IndexIVFFlat(quantizer, dim, nlist)
+    if index_type == 'ivf_pq':
+        if dim % pq_m:
+            raise ValueError(f"FAISS_PQ_M={pq_m} must divide the embedding dimension {dim}")
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_bits)
+    raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    # Only the downcast view exposes nprobe/efSearch, but the caller's object
+    # is returned: it holds the Python reference that keeps an IVF quantizer
+    # alive.
+    concrete = faiss.downcast_index(index)
+    if nprobe is not None and isinstance(concrete, faiss.IndexIVF):
+        concrete.nprobe = nprobe
+    if ef_search is not None and isinstance(concrete, faiss.IndexHNSW):
+        concrete.hnsw.efSearch = ef_search
+    return index
+
+def index_memory_bytes(index):
+    return int(faiss.serialize_index(index).nbytes)
+
+def iter_vectors(index, batch_size=10000):
+    for start in range(0, index.ntotal, batch_size):
+        yield index.reconstruct_n(start, min(batch_size, index.ntotal - start))
+
+def reconstruct_vectors(index, positions):
+    positions = np.asarray(positions, dtype=np.int64)
+    concrete = faiss.downcast_index(index)
+    if isinstance(concrete, faiss.IndexIVF):
+        # IVF lists are keyed by cell, reconstructing by position needs a
+        # direct map (one int64 per vector), built on first use.
+        with _direct_map_lock:
+            if concrete.direct_map.type == faiss.DirectMap.NoMap:
+                concrete.make_direct_map()
+    return index.reconstruct_batch(positions)
+
+def build_index(source, index_type, nlist=256, hnsw_m=32, pq_m=16, pq_bits=8,
+                nprobe=16, ef_search=64, train_size=50000, seed=0):
+    # `source` is a flat index holding the vectors in docstore order. The
+    # new index receives them in the same order, so positions (and with them
+    # LangChain's index_to_docstore_id mapping) stay valid.
+    index = create_index(source.d, index_type, nlist, hnsw_m, pq_m, pq_bits)
+
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(source.ntotal, size=min(train_size, source.ntotal), replace=False)
+        index.train(source.reconstruct_batch(np.sort(sample)))
+
+    for vectors in iter_vectors(source):
+        index.add(vectors)
+
+    return set_search_params(index, nprobe=nprobe, ef_search=ef_search)
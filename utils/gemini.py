@@ -0,0 +1,54 @@
+import sys
+import config
+
+# langchain_google_genai pulls in the Google API client libraries, the
+# slowest import in the app, so it is imported when the first client is
+# created rather than by every module that might create one.
+
+def chat_model(model, temperature, google_api_key):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature, google_api_key=google_api_key)
+
+def embedding_model(google_api_key):
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model=config.EMBEDDING_MODEL, google_api_key=google_api_key)
+
+def is_gemini_embeddings(embeddings):
+    # Gemini embeddings cannot exist before their module is imported.
+    genai = sys.modules.get('langchain_google_genai')
+    return genai is not None and isinstance(embeddings, genai.GoogleGenerativeAIEmbeddings)
+
+class RetryableGeminiError(Exception):
+    pass
+
+def is_transient_error(error):
+    # Quota (429), server (5xx) and transport errors are worth retrying; bad
+    # requests, auth failures and blocked prompts fail the same way every
+    # time. The clients wrap API errors in their own, so causes count too.
+    transient = (ConnectionError, TimeoutError)
+    api = sys.modules.get('google.api_core.exceptions')
+    if api is not None:
+        transient += (api.TooManyRequests, api.ServerError, api.RetryError)
+    requests = sys.modules.get('requests')
+    if requests is not None:
+        transient += (requests.ConnectionError, requests.Timeout)
+    httpx = sys.modules.get('httpx')
+    if httpx is not None:
+        transient += (httpx.TransportError,)
+    while error is not None:
+        if isinstance(error, transient):
+            return True
+        error = error.__cause__
+    return False
+
+# For retry_with_backoff(..., retry_on=(RetryableGeminiError,)), the way
+# EssayCrawler.fetch marks its retryable responses.
+def retryable(func):
+    def call():
+        try:
+            return func()
+        except Exception as e:
+            if is_transient_error(e):
+                raise RetryableGeminiError(str(e)) from e
+            raise
+    return call
@@ -0,0 +1,126 @@
+import argparse
+import json
+import time
+from pathlib import Path
+import faiss
+import numpy as np
+from utils.faiss_index import (
+    INDEX_TYPES, POINTS_PER_CENTROID, build_index, describe_index, index_memory_bytes, min_train_size, set_search_params
+)
+import config
+
+NPROBE_SWEEP = [1, 4, 8, 16, 32, 64]
+EF_SEARCH_SWEEP = [16, 32, 64, 128, 256]
+
+def load_flat_index(path):
+    index = faiss.read_index(str(Path(path) / 'index.faiss'))
+    if describe_index(index) != 'flat':
+        raise SystemExit("The tuner needs exact ground truth; build the knowledge base with FAISS_INDEX_TYPE = \"flat\" first")
+    return index
+
+def sample_queries(flat, num_queries, noise, seed=0):
+    # Stored vectors plus a little noise stand in for real questions: they
+    # land in populated regions of the space without being exact matches.
+    rng = np.random.default_rng(seed)
+    ids = np.sort(rng.choice(flat.ntotal, size=min(num_queries, flat.ntotal), replace=False))
+    queries = flat.reconstruct_batch(ids)
+    queries += rng.normal(scale=noise * queries.std(), size=queries.shape).astype(np.float32)
+    return queries
+
+def search_one_by_one(index, queries, k):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids[0])
+    return np.array(results), np.array(latencies)
+
+def recall_at_k(ids, truth):
+    hits = [len(set(row) & set(expected)) for row, expected in zip(ids, truth)]
+    return float(np.mean(hits)) / truth.shape[1]
+
+def evaluate(flat, queries, k, index_types, nlist):
+    truth, flat_latencies = search_one_by_one(flat, queries, k)
+    results = [{
+        'index_type': 'flat',
+        'params': {},
+        'recall_at_k': 1.0,
+        'p50_ms': round(float(np.percentile(flat_latencies, 50)), 3),
+        'p99_ms': round(float(np.percentile(flat_latencies, 99)), 3),
+        'build_s': 0.0,
+        'memory_mb': round(index_memory_bytes(flat) / 1e6, 2)
+    }]
+
+    for index_type in index_types:
+        if index_type == 'flat':
+            continue
+        needed = min_train_size(index_type, nlist, config.FAISS_PQ_BITS)
+        if flat.ntotal < needed:
+            print(f"Skipping {index_type}: needs {needed} vectors to train, have {flat.ntotal}")
+            continue
+
+        start = time.perf_counter()
+        index = build_index(
+            flat,
+            index_type,
+            nlist=nlist,
+            hnsw_m=config.FAISS_HNSW_M,
+            pq_m=config.FAISS_PQ_M,
+            pq_bits=config.FAISS_PQ_BITS,
+            train_size=config.FAISS_TRAIN_SIZE
+        )
+        build_seconds = time.perf_counter() - start
+        memory_mb = round(index_memory_bytes(index) / 1e6, 2)
+
+        if index_type == 'hnsw':
+            sweep = [{'ef_search': ef_search} for ef_search in EF_SEARCH_SWEEP]
+        else:
+            sweep = [{'nprobe': nprobe} for nprobe in NPROBE_SWEEP if nprobe <= nlist]
+
+        for params in sweep:
+            set_search_params(index, **params)
+            ids, latencies = search_one_by_one(index, queries, k)
+            results.append({
+                'index_type': index_type,
+                'params': params,
+                'recall_at_k': round(recall_at_k(ids, truth), 4),
+                'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+                'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+                'build_s': round(build_seconds, 2),
+                'memory_mb': memory_mb
+            })
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FAISS index types against the flat index")
+    parser.add_argument('--path', default=config.VECTORSTORE_PATH)
+    parser.add_argument('--k', type=int, default=config.TOP_K_RESULTS)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('--types', nargs='+', default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    flat = load_flat_index(args.path)
+    queries = sample_queries(flat, args.queries, args.noise)
+    nlist = max(1, min(config.FAISS_NLIST, flat.ntotal // POINTS_PER_CENTROID))
+    print(f"{flat.ntotal} vectors, {len(queries)} queries, k={args.k}, nlist={nlist}")
+
+    results = evaluate(flat, queries, args.k, args.types, nlist)
+
+    print(f"\n{'index':<10} {'params':<18} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'MB':>8}")
+    for row in results:
+        params = ', '.join(f"{key}={value}" for key, value in row['params'].items())
+        print(f"{row['index_type']:<10} {params:<18} {row['recall_at_k']:>9.3f} {row['p50_ms']:>8.3f} "
+              f"{row['p99_ms']:>8.3f} {row['build_s']:>8.2f} {row['memory_mb']:>8.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'ntotal': flat.ntotal, 'k': args.k, 'nlist': nlist, 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Embeds user questions for retrieval. Repeated questions are served from an
+# LRU cache; questions arriving within a few milliseconds of each other are
+# sent to the API together as one embed_documents call.
+class QueryEmbedder:
+    def __init__(self, embeddings, cache_size=2048, batch_window_ms=5, max_batch_size=32, embed_kwargs=None):
+        self.embeddings = embeddings
+        self.cache_size = cache_size
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.embed_kwargs = embed_kwargs or {}
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def _cached(self, text):
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+            return vector
+
+    def submit(self, text):
+        text = text.strip()
+        future = Future()
+        vector = self._cached(text)
+        if vector is not None:
+            future.set_result(vector)
+            return future
+
+        with self._lock:
+            # Identical questions already waiting on the API share one slot.
+            pending = self._inflight.get(text)
+            if pending is not None:
+                self.hits += 1
+                return pending
+            self.misses += 1
+            self._inflight[text] = future
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='query-embedder', daemon=True)
+                self._worker.start()
+
+        self._queue.put(text)
+        return future
+
+    def embed_query(self, text):
+        return self.submit(text).result()
+
+    async def aembed_query(self, text):
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self.api_calls += 1
+                vectors = self.embeddings.embed_documents(batch, **self.embed_kwargs)
+            except Exception as e:
+                with self._lock:
+                    futures = [self._inflight.pop(text) for text in batch]
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                futures = [self._inflight.pop(text) for text in batch]
+                for text, vector in zip(batch, vectors):
+                    self._cache[text] = vector
+                    self._cache.move_to_end(text)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for future, vector in zip(futures, vectors):
+                future.set_result(vector)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'api_calls': self.api_calls,
+            'cached': len(self._cache)
+        }
@@ -0,0 +1,144 @@
+import json
+import re
+from pathlib import Path
+import numpy as np
+from utils.answer_cache import normalize_question
+
+QUESTION_PROMPT = """Write {count} short, distinct questions a startup founder might ask that the essay below answers.
+Write them the way a founder would ask, without naming the essay or its author.
+One question per line, no numbering.
+
+Title: {title}
+
+{content}"""
+
+LIST_MARKER_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s*')
+
+def parse_questions(text, count):
+    questions = {}
+    for line in text.splitlines():
+        question = LIST_MARKER_RE.sub('', line).strip().strip('"')
+        if question.endswith('?'):
+            questions.setdefault(normalize_question(question), question)
+    return list(questions.values())[:count]
+
+def load_essay_questions(path):
+    # Generated questions per essay hash, one JSON line per essay, appended
+    # as they are generated so an interrupted run resumes where it stopped.
+    questions = {}
+    path = Path(path)
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    questions[entry['hash']] = entry['questions']
+    return questions
+
+def append_essay_questions(path, essay_hash, title, questions):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'hash': essay_hash, 'title': title, 'questions': questions}, ensure_ascii=False) + '\n')
+
+# Small dense index of the generated questions, saved next to index.faiss.
+# Rows are grouped by essay: the questions of essay e are
+# rows[offsets[e]:offsets[e + 1]], so the follow-ups for the essays a query
+# retrieved are a couple of slices and one small matrix product.
+class QuestionBank:
+    def __init__(self, questions, essays, offsets, vectors):
+        self.questions = questions
+        self.essays = {essay: i for i, essay in enumerate(essays)}
+        self.offsets = offsets
+        self.vectors = vectors
+        self._normalized = {normalize_question(question) for question in questions}
+
+    @classmethod
+    def build(cls, entries, vectors):
+        # entries: (essay key, questions) in the order the vectors follow.
+        questions = []
+        essays = []
+        offsets = [0]
+        for essay, essay_questions in entries:
+            essays.append(essay)
+            questions.extend(essay_questions)
+            offsets.append(len(questions))
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(questions), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return cls(questions, essays, offsets, vectors / np.where(norms == 0, 1, norms))
+
+    @classmethod
+    def merge(cls, banks):
+        # One bank over several shards; essay keys hash the URL and text, so
+        # they do not collide between shards.
+        questions, essays, offsets, vectors = [], [], [0], []
+        for bank in banks:
+            questions.extend(bank.questions)
+            essays.extend(sorted(bank.essays, key=bank.essays.get))
+            base = offsets[-1]
+            offsets.extend(base + offset for offset in bank.offsets[1:])
+            vectors.append(np.asarray(bank.vectors))
+        return cls(questions, essays, offsets, np.concatenate(vectors))
+
+    def __len__(self):
+        return len(self.questions)
+
+    def save(self, path):
+        path = Path(path)
+        np.save(path / 'questions.npy', self.vectors)
+        essays = sorted(self.essays, key=self.essays.get)
+        with open(path / 'questions.json', 'w', encoding='utf-8') as f:
+            json.dump({'questions': self.questions, 'essays': essays, 'offsets': self.offsets}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        if not (path / 'questions.json').exists():
+            return None
+
+        with open(path / 'questions.json', 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['questions'], data['essays'], data['offsets'], np.load(path / 'questions.npy', mmap_mode='r'))
+
+    def related(self, question, essays, query_vector=None, k=3, max_similarity=0.9):
+        # Candidates are the questions of the retrieved essays, best-ranked
+        # essay first. With a query vector they are ranked by similarity to it
+        # (paraphrases of the question itself are skipped); without one they
+        # are taken round-robin across the essays in rank order.
+        groups = [
+            range(self.offsets[i], self.offsets[i + 1])
+            for i in (self.essays.get(essay) for essay in dict.fromkeys(essays)) if i is not None
+        ]
+        asked = normalize_question(question)
+
+        if query_vector is None:
+            rows = []
+            for rank in range(max(map(len, groups), default=0)):
+                rows.extend(group[rank] for group in groups if rank < len(group))
+            scores = None
+        else:
+            query = np.asarray(query_vector, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+            rows = np.array([row for group in groups for row in group], dtype=np.int64)
+            if len(rows) < k:
+                # Too few questions from the retrieved essays: widen to the
+                # whole bank.
+                rows = np.arange(len(self.questions))
+            scores = np.asarray(self.vectors[rows] @ query)
+            order = np.argsort(-scores)
+            rows, scores = rows[order], scores[order]
+
+        related = []
+        seen = {asked}
+        for i, row in enumerate(rows):
+            if scores is not None and scores[i] >= max_similarity:
+                continue
+            normalized = normalize_question(self.questions[row])
+            if normalized in seen:
+                continue
+            seen.add(normalized)
+            related.append(self.questions[row])
+            if len(related) == k:
+                break
+        return related
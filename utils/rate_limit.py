@@ -0,0 +1,40 @@
+import random
+import threading
+import time
+
+class RateLimiter:
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second if rate_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class HostRateLimiter:
+    def __init__(self, rate_per_second):
+        self.rate_per_second = rate_per_second
+        self._lock = threading.Lock()
+        self._limiters = {}
+
+    def wait(self, host):
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = RateLimiter(self.rate_per_second)
+        limiter.wait()
+
+def retry_with_backoff(func, retries=3, base_delay=1.0, max_delay=30.0, retry_on=(Exception,)):
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except retry_on:
+            if attempt == retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.0))
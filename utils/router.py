@@ -0,0 +1,50 @@
+import re
+
+WORD_RE = re.compile(r"\w+")
+
+# Picks the model for one question once retrieval is done. Most questions
+# are answered well by the fast model: a short question whose best chunk is a
+# close match that clearly stands out from the rest, or one with no context
+# at all, where the answer can only say so. Long or multi-part
+# questions, and retrieval without a clear winner, go to the strong model,
+# optionally with the fast model answering first while it runs.
+class ModelRouter:
+    def __init__(self, strong_model, fast_model, confident_score=0.8, min_spread=0.05, long_question_words=25,
+                 speculative=True):
+        self.strong_model = strong_model
+        self.fast_model = fast_model
+        self.confident_score = confident_score
+        self.min_spread = min_spread
+        self.long_question_words = long_question_words
+        self.speculative = speculative
+
+    def decision(self, model, reason, **signals):
+        return {
+            'model': model,
+            'reason': reason,
+            'speculative': self.speculative and model == self.strong_model,
+            **signals
+        }
+
+    # keyword_match: retrieval stopped at a confident keyword hit, every
+    # query term in a top chunk that clearly leads the rest (see
+    # RAGEngine.is_confident_lexical_hit), so there are no dense scores.
+    def route(self, question, results, keyword_match=False):
+        words = len(WORD_RE.findall(question))
+        if words > self.long_question_words or question.count('?') > 1:
+            return self.decision(self.strong_model, 'long_question', words=words)
+
+        scores = sorted((score for _, score in results if score is not None), reverse=True)
+        if keyword_match and results:
+            return self.decision(self.fast_model, 'keyword_match', words=words)
+        if not scores:
+            # Nothing retrieved, or only partial keyword matches: the answer
+            # can only say so, which the strong model does no better.
+            return self.decision(self.fast_model, 'no_context', words=words)
+
+        # How far the best chunk stands out from the rest of the context.
+        spread = scores[0] - sum(scores[1:]) / len(scores[1:]) if len(scores) > 1 else scores[0]
+        signals = {'words': words, 'top_score': round(scores[0], 3), 'spread': round(spread, 3)}
+        if scores[0] >= self.confident_score and spread >= self.min_spread:
+            return self.decision(self.fast_model, 'clear_match', **signals)
+        return self.decision(self.strong_model, 'ambiguous_retrieval', **signals)
@@ -1,60 +1,230 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
+import importlib.util
 import json
+import re
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urljoin, urlparse
+from utils.rate_limit import HostRateLimiter, retry_with_backoff
+import config
 
-def scrape_pg_essays(max_essays=40):
-    
-    base_url = "http://www.paulgraham.com/"
-    essays_url = base_url + "articles.html"
-    
-    print(f"Fetching essay list from {essays_url}...")
-    response = requests.get(essays_url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    essay_links = []
-    for link in soup.find_all('a'):
-        href = link.get('href')
-        if href and href.endswith('.html') and href != 'articles.html':
-            essay_links.append({
-                'title': link.text.strip(),
-                'url': base_url + href
-            })
-    
-    essay_links = essay_links[:max_essays]
-    
-    essays_data = []
-    for i, essay in enumerate(essay_links, 1):
-        print(f"Scraping {i}/{len(essay_links)}: {essay['title']}")
-        
+# lxml (pinned in requirements.txt) parses several times faster than the
+# pure-Python html.parser, which is only the fallback when it is missing.
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+CONTENT_TAGS = ('p', 'font')
+BLANK_LINES_RE = re.compile(r'\n\s*\n\s*')
+
+class RetryableResponse(Exception):
+    pass
+
+def extract_text(html):
+    # Runs in the extraction worker processes. Essays are laid out with
+    # nested <font> and <p> tags; only the outermost of them is read, so
+    # text inside both is not emitted twice, and <br> and <p> become line
+    # breaks instead of gluing paragraphs together.
+    soup = BeautifulSoup(html, HTML_PARSER)
+    for br in soup.find_all('br'):
+        br.replace_with('\n')
+    for paragraph in soup.find_all('p'):
+        paragraph.insert_before('\n\n')
+
+    blocks = []
+    seen = set()
+    for tag in soup.find_all(CONTENT_TAGS):
+        if tag.find_parent(CONTENT_TAGS) is not None:
+            continue
+        text = BLANK_LINES_RE.sub('\n\n', tag.get_text()).strip()
+        if text and text not in seen:
+            seen.add(text)
+            blocks.append(text)
+    return '\n\n'.join(blocks)
+
+class CrawlState:
+    # Append-only JSONL log of fetched pages; the last line for a URL wins.
+    # Every fetch is written as soon as it completes, so an interrupted
+    # crawl resumes from whatever made it to disk.
+    def __init__(self, path=config.CRAWL_STATE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries = {}
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from an interrupted write
+                    self.entries[entry['url']] = entry
+
+    def get(self, url):
+        return self.entries.get(url)
+
+    def record(self, entry):
+        with self._lock:
+            self.entries[entry['url']] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def compact(self):
+        with self._lock:
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            tmp_path.replace(self.path)
+
+class EssayCrawler:
+    def __init__(self, essays_url=config.PG_ESSAYS_URL, state_path=config.CRAWL_STATE_PATH,
+                 workers=config.SCRAPER_WORKERS, rate_per_second=config.SCRAPER_RATE_PER_SECOND,
+                 retries=config.SCRAPER_RETRIES, max_age=config.CRAWL_MAX_AGE,
+                 extract_workers=config.EXTRACT_WORKERS):
+        self.essays_url = essays_url
+        self.workers = workers
+        self.retries = retries
+        self.max_age = max_age
+        self.extract_workers = extract_workers
+        self.extract_pool = None
+        self.state = CrawlState(state_path)
+        self.rate_limiter = HostRateLimiter(rate_per_second)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url, headers=None):
+        def attempt():
+            self.rate_limiter.wait(urlparse(url).netloc)
+            response = self.session.get(url, headers=headers, timeout=30)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise RetryableResponse(f"HTTP {response.status_code} for {url}")
+            response.raise_for_status()
+            return response
+
+        return retry_with_backoff(
+            attempt,
+            retries=self.retries,
+            retry_on=(RetryableResponse, requests.ConnectionError, requests.Timeout)
+        )
+
+    def list_essays(self):
+        print(f"Fetching essay list from {self.essays_url}...")
+        response = self.fetch(self.essays_url)
+        soup = BeautifulSoup(response.content, HTML_PARSER)
+
+        essay_links = []
+        seen = set()
+        for link in soup.find_all('a'):
+            href = link.get('href')
+            if href and href.endswith('.html'):
+                url = urljoin(self.essays_url, href)
+                if url != self.essays_url and url not in seen:
+                    seen.add(url)
+                    essay_links.append({'title': link.text.strip(), 'url': url})
+
+        return essay_links
+
+    def extract_content(self, html):
+        # The crawler threads only wait on the network; parsing is CPU bound
+        # and goes to a process pool while a crawl is running.
+        if self.extract_pool is None:
+            return extract_text(html)
+        return self.extract_pool.submit(extract_text, html).result()
+
+    def scrape_essay(self, essay):
+        cached = self.state.get(essay['url'])
+        if cached and self.max_age is not None and time.time() - cached['fetched_at'] < self.max_age:
+            return cached, 'cached'
+
+        headers = {}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.fetch(essay['url'], headers=headers)
+        if response.status_code == 304 and cached:
+            entry = dict(cached, title=essay['title'], fetched_at=time.time())
+            status = 'not modified'
+        else:
+            entry = {
+                'url': essay['url'],
+                'title': essay['title'],
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+                'content': self.extract_content(response.content)
+            }
+            status = 'fetched'
+
+        self.state.record(entry)
+        return entry, status
+
+    def crawl(self, max_essays=40):
+        essay_links = self.list_essays()[:max_essays]
+        results = [None] * len(essay_links)
+        counts = {'fetched': 0, 'not modified': 0, 'cached': 0, 'failed': 0}
+        counts_lock = threading.Lock()
+
+        def worker(index):
+            essay = essay_links[index]
+            try:
+                results[index], status = self.scrape_essay(essay)
+            except Exception as e:
+                print(f"Error scraping {essay['title']}: {e}")
+                status = 'failed'
+            with counts_lock:
+                counts[status] += 1
+                done = sum(counts.values())
+            print(f"Scraped {done}/{len(essay_links)} ({status}): {essay['title']}")
+
+        if self.extract_workers > 1:
+            self.extract_pool = ProcessPoolExecutor(max_workers=self.extract_workers)
         try:
-            time.sleep(1)
-            response = requests.get(essay['url'])
-            essay_soup = BeautifulSoup(response.content, 'html.parser')
-            
-            content_tags = essay_soup.find_all(['p', 'font'])
-            content = '\n\n'.join([tag.get_text().strip() for tag in content_tags if tag.get_text().strip()])
-            
-            if len(content) > 200:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(worker, range(len(essay_links))))
+        finally:
+            if self.extract_pool is not None:
+                self.extract_pool.shutdown()
+                self.extract_pool = None
+
+        self.state.compact()
+        print(f"Crawl finished: {counts['fetched']} fetched, {counts['not modified']} not modified, "
+              f"{counts['cached']} reused, {counts['failed']} failed")
+
+        essays_data = []
+        for entry in results:
+            if entry and len(entry['content']) > 200:
                 essays_data.append({
-                    'title': essay['title'],
-                    'url': essay['url'],
-                    'content': content,
+                    'title': entry['title'],
+                    'url': entry['url'],
+                    'content': entry['content'],
                     'source': 'Paul Graham Essays'
                 })
-        except Exception as e:
-            print(f"Error scraping {essay['title']}: {e}")
-            continue
-    
-    return essays_data
 
-def save_essays(essays_data, output_path='data/raw/essays.json'):
+        return essays_data
+
+def scrape_pg_essays(max_essays=40, **crawler_options):
+    return EssayCrawler(**crawler_options).crawl(max_essays)
+
+def save_essays(essays_data, output_path=config.ESSAYS_PATH):
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    
+
+    # One essay per line, so ingestion can stream the corpus instead of
+    # loading it whole; a .json path still gets the old single array.
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(essays_data, f, indent=2, ensure_ascii=False)
-    
+        if not str(output_path).endswith('.jsonl'):
+            json.dump(essays_data, f, indent=2, ensure_ascii=False)
+        else:
+            for essay in essays_data:
+                f.write(json.dumps(essay, ensure_ascii=False) + '\n')
+
     print(f"\nSaved {len(essays_data)} essays to {output_path}")
 
 if __name__ == "__main__":
@@ -0,0 +1,126 @@
+import asyncio
+import heapq
+from functools import partial
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from utils.chunk_store import ChunkDocstore
+from utils.faiss_index import reconstruct_vectors
+
+# One corpus (Paul Graham essays, Startup School transcripts, ...) with its
+# own essays file, index directory and manifest. `source` is the metadata
+# source every chunk in it carries; None for an index opened by path, whose
+# chunks may mix sources.
+class Shard:
+    def __init__(self, name, source, path, vectorstore, lexical_index=None, question_bank=None, signature=None):
+        self.name = name
+        self.source = source
+        self.path = path
+        self.vectorstore = vectorstore
+        self.lexical_index = lexical_index
+        self.question_bank = question_bank
+        self.signature = signature
+
+    def matches(self, sources):
+        return not sources or self.source is None or self.source in sources
+
+def select_shards(shards, sources):
+    return [shard for shard in shards if shard.matches(sources)]
+
+def source_filter(shard, sources):
+    # Only shards of unknown source need their chunks filtered one by one.
+    if sources and shard.source is None:
+        return {'filter': {'source': list(sources)}}
+    return {}
+
+class ShardedDocstore(Docstore):
+    def __init__(self, shards):
+        self.shards = shards
+
+    def search(self, search):
+        for shard in self.shards:
+            doc = shard.vectorstore.docstore.search(search)
+            if isinstance(doc, Document):
+                return doc
+        return f"ID {search} not found."
+
+# Stands in for a single LangChain FAISS store in front of RAGEngine: every
+# search runs on all selected shards in parallel, k per shard, and the hits
+# are merged by score. All shards share the embedding model, so their
+# distances are directly comparable. A source filter selects shards up
+# front, so the other shards are never touched.
+class ShardedVectorStore:
+    def __init__(self, shards, executor=None, shard_k=None):
+        self.shards = shards
+        self.executor = executor
+        self.shard_k = shard_k
+        self.embeddings = shards[0].vectorstore.embeddings
+        self.distance_strategy = shards[0].vectorstore.distance_strategy
+        self.docstore = ShardedDocstore(shards)
+
+    def merge(self, results, k):
+        hits = [hit for shard_hits in results for hit in shard_hits]
+        if self.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+            return heapq.nlargest(k, hits, key=lambda hit: hit[1])
+        return heapq.nsmallest(k, hits, key=lambda hit: hit[1])
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        sources = (filter or {}).get('source')
+        shards = select_shards(self.shards, sources)
+        searches = [
+            partial(shard.vectorstore.similarity_search_with_score_by_vector, embedding,
+                    k=self.shard_k or k, **source_filter(shard, sources), **kwargs)
+            for shard in shards
+        ]
+        if len(searches) <= 1 or self.executor is None:
+            return self.merge([search() for search in searches], k)
+        return self.merge(list(self.executor.map(lambda search: search(), searches)), k)
+
+    async def asimilarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        sources = (filter or {}).get('source')
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(
+                self.executor,
+                partial(shard.vectorstore.similarity_search_with_score_by_vector, embedding,
+                        k=self.shard_k or k, **source_filter(shard, sources), **kwargs)
+            )
+            for shard in select_shards(self.shards, sources)
+        ))
+        return self.merge(results, k)
+
+    def chunk_vectors(self, docs):
+        # Stored vectors of the given chunks, looked up in the shard each
+        # one came from; None if any of them cannot be found.
+        vectors = [None] * len(docs)
+        for shard in self.shards:
+            if not isinstance(shard.vectorstore.docstore, ChunkDocstore):
+                return None
+            store = shard.vectorstore.docstore.store
+            found = [(i, store.position(doc.id)) for i, doc in enumerate(docs) if vectors[i] is None]
+            found = [(i, position) for i, position in found if position is not None]
+            if found:
+                rows = reconstruct_vectors(shard.vectorstore.index, [position for _, position in found])
+                for (i, _), row in zip(found, rows):
+                    vectors[i] = row
+        if any(vector is None for vector in vectors):
+            return None
+        return np.stack(vectors)
+
+# BM25 over every selected shard, merged by score. Each shard keeps its own
+# term statistics, so scores from shards of very different sizes are only
+# roughly comparable; the query-term coverage used for filtering is exact.
+class ShardedLexicalIndex:
+    def __init__(self, shards):
+        self.shards = [shard for shard in shards if shard.lexical_index is not None]
+
+    def search(self, query, k=10, sources=None):
+        hits = []
+        for shard in select_shards(self.shards, sources):
+            shard_hits = shard.lexical_index.search(query, k)
+            if sources and shard.source is None:
+                docstore = shard.vectorstore.docstore
+                shard_hits = [hit for hit in shard_hits if docstore.search(hit['id']).metadata.get('source') in sources]
+            hits.extend(shard_hits)
+        return heapq.nlargest(k, hits, key=lambda hit: hit['score'])
@@ -0,0 +1,41 @@
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Where a cold start goes: wall time per startup stage (imports, index load,
+# model clients, warm-up query) and the modules each stage imported for the
+# first time, grouped by top-level package. Like `python -X importtime`, but
+# per stage and readable from the running process. Stages running on other
+# threads at the same time share their imports.
+class StartupProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        before = set(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            imported = [module for module in list(sys.modules) if module not in before]
+            packages = Counter(module.split('.')[0] for module in imported)
+            with self._lock:
+                self.stages.append({
+                    'stage': name,
+                    'ms': round((end - start) * 1000, 1),
+                    'done_at_ms': round((end - self.started) * 1000, 1),
+                    'modules': len(imported),
+                    'top_packages': ', '.join(package for package, _ in packages.most_common(3))
+                })
+
+    def summary(self):
+        with self._lock:
+            return list(self.stages)
+
+STARTUP = StartupProfile()
@@ -0,0 +1,23 @@
+import re
+
+# Plain-text helpers with no third-party imports, so the chat app can use
+# them before the retrieval stack is loaded.
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that the
+their theirs them themselves then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+def estimate_tokens(text):
+    # Gemini averages about four characters per token on English prose,
+    # close enough for budgeting without a countTokens round trip.
+    return len(text) // 4 + 1
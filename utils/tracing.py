@@ -0,0 +1,205 @@
+import json
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+import config
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+def percentile(values, q):
+    # Linear interpolation between the closest ranks, as numpy.percentile
+    # does; kept in plain Python so the app can read METRICS before numpy
+    # is loaded.
+    values = sorted(values)
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+# One trace per question. Stages are recorded as spans with their offset
+# from the start of the query; `timings` keeps the flat "<stage>_ms" view
+# that RAGEngine has always returned to callers.
+class Trace:
+    def __init__(self, model, question=''):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.model = model
+        self.question_chars = len(question)
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self.timings = {}
+        self.attributes = {}
+        self.status = 'ok'
+
+    def add_span(self, name, start, **attributes):
+        duration = elapsed_ms(start)
+        self.timings[f'{name}_ms'] = duration
+        self.spans.append({
+            'name': name,
+            'start_ms': round((start - self.start) * 1000, 1),
+            'duration_ms': duration,
+            **attributes
+        })
+        return duration
+
+    @contextmanager
+    def span(self, name, **attributes):
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.add_span(name, start, **attributes)
+
+    def finish(self):
+        self.timings.setdefault('total_ms', elapsed_ms(self.start))
+        return self.timings
+
+    @contextmanager
+    def recording(self, metrics=None):
+        # Wraps a stream_query generator: whether it completes, fails or is
+        # closed early by a disconnecting client, the trace is recorded.
+        try:
+            yield self
+        except GeneratorExit:
+            self.status = 'aborted'
+            raise
+        except BaseException as e:
+            self.status = 'error'
+            self.attributes['error'] = repr(e)
+            raise
+        finally:
+            self.finish()
+            record_trace(self, metrics or METRICS)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'timestamp': self.started_at,
+            'model': self.model,
+            'status': self.status,
+            'question_chars': self.question_chars,
+            'timings': self.timings,
+            'spans': self.spans,
+            **self.attributes
+        }
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+STAGES = ('rewrite', 'lexical', 'embed', 'search', 'context', 'related', 'llm_first_token', 'llm_total',
+          'llm_upgrade_first_token', 'llm_upgrade_total', 'total')
+
+# Process-wide counters and histograms in the Prometheus text format, plus
+# a window of recent latencies for the percentiles shown in the app.
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS, window=500):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._queries = defaultdict(int)
+        self._tokens = defaultdict(int)
+        self._histograms = {}
+        self._routes = defaultdict(int)
+        self._route_saved_ms = defaultdict(float)
+        self._recent = defaultdict(lambda: deque(maxlen=window))
+        self._recent_by_model = defaultdict(lambda: deque(maxlen=window))
+
+    def observe(self, trace):
+        outcome = trace.attributes.get('cached') or ('generated' if trace.status == 'ok' else trace.status)
+        with self._lock:
+            self._queries[(trace.model, outcome)] += 1
+            route = trace.attributes.get('route')
+            if route:
+                self._routes[(route['model'], route['reason'], route.get('served', route['model']))] += 1
+                self._route_saved_ms[route.get('served', route['model'])] += route.get('saved_ms', 0.0)
+            # Model spans name the model that ran them: a speculative route
+            # books the fast answer and the strong upgrade separately.
+            span_models = {span['name']: span['model'] for span in trace.spans if span.get('model')}
+            for span in trace.spans:
+                if 'tokens_in' in span:
+                    model = span.get('model') or trace.model
+                    self._tokens[(model, 'in')] += span['tokens_in']
+                    self._tokens[(model, 'out')] += span['tokens_out']
+            for stage in STAGES:
+                value = trace.timings.get(f'{stage}_ms')
+                if value is None:
+                    continue
+                model = span_models.get(stage, trace.model)
+                histogram = self._histograms.setdefault((model, stage), [[0] * (len(self.buckets) + 1), 0.0])
+                histogram[0][bisect_left(self.buckets, value)] += 1
+                histogram[1] += value
+                self._recent[stage].append(value)
+                # An upgrade's first token is that model's first token too,
+                # which is what routing compares against.
+                self._recent_by_model[(model, stage.replace('llm_upgrade_', 'llm_'))].append(value)
+
+    def percentile(self, stage, q, model=None):
+        with self._lock:
+            values = self._recent[stage] if model is None else self._recent_by_model.get((model, stage))
+            if not values:
+                return None
+            return round(float(percentile(values, q)), 1)
+
+    def summary(self):
+        with self._lock:
+            return {
+                stage: {
+                    'count': len(values),
+                    'p50_ms': round(float(percentile(values, 50)), 1),
+                    'p95_ms': round(float(percentile(values, 95)), 1)
+                }
+                for stage, values in self._recent.items() if values
+            }
+
+    def render(self):
+        lines = [
+            '# HELP rag_queries_total Questions answered, by model and outcome.',
+            '# TYPE rag_queries_total counter'
+        ]
+        with self._lock:
+            for (model, outcome), count in sorted(self._queries.items()):
+                lines.append(f'rag_queries_total{{model="{model}",outcome="{outcome}"}} {count}')
+
+            lines += ['# HELP rag_llm_tokens_total Model tokens, by direction.', '# TYPE rag_llm_tokens_total counter']
+            for (model, direction), count in sorted(self._tokens.items()):
+                lines.append(f'rag_llm_tokens_total{{model="{model}",direction="{direction}"}} {count}')
+
+            lines += ['# HELP rag_route_total Routing decisions, by routed model, reason and model served.',
+                      '# TYPE rag_route_total counter']
+            for (model, reason, served), count in sorted(self._routes.items()):
+                lines.append(f'rag_route_total{{model="{model}",reason="{reason}",served="{served}"}} {count}')
+
+            lines += ['# HELP rag_route_saved_seconds_total Time to first token saved by routing, by model served.',
+                      '# TYPE rag_route_saved_seconds_total counter']
+            for served, saved_ms in sorted(self._route_saved_ms.items()):
+                lines.append(f'rag_route_saved_seconds_total{{served="{served}"}} {saved_ms / 1000:.6f}')
+
+            lines += [
+                '# HELP rag_stage_latency_seconds Latency of each query stage.',
+                '# TYPE rag_stage_latency_seconds histogram'
+            ]
+            for (model, stage), (counts, total) in sorted(self._histograms.items()):
+                labels = f'model="{model}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f'rag_stage_latency_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'rag_stage_latency_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f'rag_stage_latency_seconds_sum{{{labels}}} {total / 1000:.6f}')
+                lines.append(f'rag_stage_latency_seconds_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+METRICS = Metrics()
+_log_lock = threading.Lock()
+
+def record_trace(trace, metrics=METRICS, log_path=config.TRACE_LOG_PATH):
+    metrics.observe(trace)
+    if log_path:
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+        with _log_lock:
+            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+            with open(log_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
@@ -0,0 +1,55 @@
+import time
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+# Times the model call and counts its tokens from LangChain's callbacks.
+# Gemini reports usage_metadata; when a model does not, token counts fall
+# back to the same chars/4 estimate the context builder uses. Spans are
+# named after the stage, "llm" for the answer being streamed and
+# "llm_upgrade" for a strong-model answer running alongside it, and carry
+# the model that produced them so metrics book them under it. Kept apart
+# from utils.tracing so the app can read METRICS without importing LangChain.
+class TracingCallbackHandler(BaseCallbackHandler):
+    run_inline = True
+
+    def __init__(self, trace, stage='llm', model=None):
+        self.trace = trace
+        self.stage = stage
+        self.model = model or trace.model
+        self._start = None
+        self._first_token = False
+        self._prompt_chars = 0
+        self._output_chars = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._start = time.perf_counter()
+        self._prompt_chars = sum(len(str(message.content)) for batch in messages for message in batch)
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._start = time.perf_counter()
+        self._prompt_chars = sum(len(prompt) for prompt in prompts)
+
+    def on_llm_new_token(self, token, **kwargs):
+        if token and not self._first_token:
+            self._first_token = True
+            self.trace.add_span(f'{self.stage}_first_token', self._start, model=self.model)
+        self._output_chars += len(token)
+
+    def on_llm_end(self, response, **kwargs):
+        usage = None
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, 'message', None)
+                usage = getattr(message, 'usage_metadata', None) or usage
+
+        tokens_in = usage['input_tokens'] if usage else self._prompt_chars // 4 + 1
+        tokens_out = usage['output_tokens'] if usage else self._output_chars // 4
+        self.trace.attributes['tokens_in'] = self.trace.attributes.get('tokens_in', 0) + tokens_in
+        self.trace.attributes['tokens_out'] = self.trace.attributes.get('tokens_out', 0) + tokens_out
+        if not self._first_token:
+            self.trace.add_span(f'{self.stage}_first_token', self._start, model=self.model)
+        self.trace.add_span(f'{self.stage}_total', self._start, model=self.model, tokens_in=tokens_in,
+                            tokens_out=tokens_out)
+
+    def on_llm_error(self, error, **kwargs):
+        if self._start is not None:
+            self.trace.add_span(f'{self.stage}_total', self._start, model=self.model, error=repr(error))
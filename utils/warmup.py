@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import threading
+from pathlib import Path
+from utils.answer_cache import normalize_question
+import config
+
+RESULT_KEYS = ('answer', 'sources', 'confidence', 'reasoning_steps', 'related_questions')
+
+def load_warmup_questions(top_questions_path=config.TOP_QUESTIONS_PATH, limit=config.WARMUP_MAX_QUESTIONS):
+    questions = list(config.EXAMPLE_QUERIES)
+    path = Path(top_questions_path) if top_questions_path else None
+    if path and path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            questions.extend(line.strip() for line in f if line.strip())
+
+    unique = {}
+    for question in questions:
+        unique.setdefault(normalize_question(question), question)
+    return list(unique.values())[:limit]
+
+# Precomputed answers for a fixed set of questions, keyed by index version,
+# model and normalized question. Unlike AnswerCache nothing here expires or
+# gets evicted; a new index version simply starts a fresh set and only the
+# most recent keep_versions sets are kept on disk. The file is re-read when
+# another process (the offline warm-up job) rewrites it.
+class WarmAnswers:
+    def __init__(self, path=config.WARM_ANSWERS_PATH, keep_versions=2):
+        self.path = Path(path)
+        self.keep_versions = keep_versions
+        self._versions = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._mtime:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._versions = json.load(f)['versions']
+            self._mtime = mtime
+
+    def lookup(self, question, namespace):
+        model, index_version = namespace
+        with self._lock:
+            self._refresh()
+            return self._versions.get(index_version, {}).get(model, {}).get(normalize_question(question))
+
+    def store(self, question, result, namespace):
+        model, index_version = namespace
+        with self._lock:
+            self._refresh()
+            answers = self._versions.setdefault(index_version, {}).setdefault(model, {})
+            answers[normalize_question(question)] = {key: result[key] for key in RESULT_KEYS if key in result}
+
+            # Dicts keep insertion order, so the oldest versions come first.
+            for stale in list(self._versions)[:-self.keep_versions]:
+                del self._versions[stale]
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'versions': self._versions}, f, ensure_ascii=False)
+            tmp_path.replace(self.path)
+            self._mtime = self.path.stat().st_mtime_ns
+
+def warm_up(resources, warm_answers, questions, models=config.WARMUP_MODELS):
+    generated = 0
+    for model in models:
+        engine = resources.get_engine(model)
+        for question in questions:
+            if warm_answers.lookup(question, engine.cache_namespace) is not None:
+                continue
+            result = engine.query(question, record=False)
+            warm_answers.store(question, result, engine.cache_namespace)
+            generated += 1
+            print(f"Warmed [{model}] {question}")
+    return generated
+
+def warm_up_knowledge_base(google_api_key, path=None, questions_path=config.TOP_QUESTIONS_PATH,
+                           models=config.WARMUP_MODELS):
+    # resources imports this module, so it is imported here.
+    from resources import ResourceCache
+
+    resources = ResourceCache(google_api_key, path)
+    generated = warm_up(resources, WarmAnswers(), load_warmup_questions(questions_path), models)
+    print(f"Warm-up done: {generated} answers generated for index version {resources.index_version}")
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Precompute answers for the example and top questions")
+    parser.add_argument('--path', help="a single index directory, by default every shard in config.SHARDS")
+    parser.add_argument('--questions', default=config.TOP_QUESTIONS_PATH, help="file with one question per line")
+    parser.add_argument('--models', nargs='+', default=config.WARMUP_MODELS)
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv('GOOGLE_API_KEY')
+    if not api_key:
+        print("Please set GOOGLE_API_KEY environment variable")
+        exit(1)
+
+    warm_up_knowledge_base(api_key, args.path, args.questions, args.models)
+
+if __name__ == "__main__":
+    main()